@@ -0,0 +1,49 @@
+"""add submitted notebook score table
+
+Revision ID: 08f56e3a46eb
+Revises: e43177bfe90b
+Create Date: 2026-10-18 10:12:45.118204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '08f56e3a46eb'
+down_revision = 'e43177bfe90b'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    """
+    This migration adds the table of materialized submitted notebook scores.
+    The table is left empty: the gradebook fills in the scores of existing
+    submissions the first time it is opened with the score cache enabled.
+    """
+    ctx = op.get_context()
+    con = op.get_bind()
+    if ctx.dialect.has_table(con, 'submitted_notebook_score'):
+        return
+
+    op.create_table(
+        'submitted_notebook_score',
+        sa.Column('notebook_id', sa.String(32),
+                  sa.ForeignKey('submitted_notebook.id', ondelete='CASCADE'),
+                  primary_key=True),
+        sa.Column('score', sa.Float(), nullable=False),
+        sa.Column('max_score', sa.Float(), nullable=False),
+        sa.Column('code_score', sa.Float(), nullable=False),
+        sa.Column('max_code_score', sa.Float(), nullable=False),
+        sa.Column('written_score', sa.Float(), nullable=False),
+        sa.Column('max_written_score', sa.Float(), nullable=False),
+        sa.Column('task_score', sa.Float(), nullable=False),
+        sa.Column('max_task_score', sa.Float(), nullable=False),
+        sa.Column('needs_manual_grade', sa.Boolean(), nullable=False),
+        sa.Column('failed_tests', sa.Boolean(), nullable=False),
+    )
+
+
+def downgrade():
+    op.drop_table('submitted_notebook_score')
@@ -3,6 +3,8 @@ from __future__ import division
 from . import utils
 
 import datetime
+import itertools
+import os
 import subprocess as sp
 
 from sqlalchemy import (create_engine, ForeignKey, Column, String, Text,
@@ -14,20 +16,28 @@ from sqlalchemy.orm.exc import NoResultFound, FlushError
 from sqlalchemy.ext.associationproxy import association_proxy
 from sqlalchemy.exc import IntegrityError, StatementError
 from sqlalchemy.sql import and_, or_
-from sqlalchemy import select, func, exists, case, literal_column, union_all
+from sqlalchemy import select, func, exists, case, literal_column, insert, update, delete, event, bindparam
 from sqlalchemy.ext.declarative import declared_attr
+from sqlalchemy.engine import Engine, make_url
 
 from tornado.log import app_log
 
 from uuid import uuid4
 from .dbutil import _temp_alembic_ini
-from typing import List, Any, Optional, Union
+from typing import List, Any, Optional, Union, Dict, Iterable
 from .auth import Authenticator
 
 
 Base = declarative_base()
 
 
+def _group_by_columns(rows):
+    """Splits the dictionaries ``rows`` into runs of consecutive rows with the
+    same keys, and yields the keys and rows of each run."""
+    for columns, group in itertools.groupby(rows, key=lambda x: tuple(sorted(x))):
+        yield columns, list(group)
+
+
 def new_uuid() -> str:
     return uuid4().hex
 
@@ -918,6 +928,51 @@ class Course(Base):
     def __repr__(self):
         return "Course<{}>".format(self.id)
 
+
+class SubmittedNotebookScore(Base):
+    """Materialized scores of a submitted notebook, aggregated over its
+    grades. The rows are kept up to date by the
+    :class:`~nbgrader.api.Gradebook` whenever grades, graded cells or
+    submissions change, and are read instead of the individual grades by
+    gradebooks created with ``score_cache=True``.
+
+    Only the bulk listing methods of the gradebook read this table: the score
+    attributes and ``to_dict()`` methods of the models are always computed
+    from the grades, and the maximum scores of assignments and notebooks,
+    which do not depend on the number of submissions, are not
+    materialized."""
+
+    __tablename__ = "submitted_notebook_score"
+
+    #: Unique id of the :class:`~nbgrader.api.SubmittedNotebook`
+    notebook_id = Column(
+        String(32), ForeignKey('submitted_notebook.id', ondelete='CASCADE'), primary_key=True)
+
+    #: The overall score and maximum score of the submitted notebook
+    score = Column(Float(), nullable=False, default=0.0)
+    max_score = Column(Float(), nullable=False, default=0.0)
+
+    #: The score and maximum score of the autograded code cells
+    code_score = Column(Float(), nullable=False, default=0.0)
+    max_code_score = Column(Float(), nullable=False, default=0.0)
+
+    #: The score and maximum score of the manually graded markdown cells
+    written_score = Column(Float(), nullable=False, default=0.0)
+    max_written_score = Column(Float(), nullable=False, default=0.0)
+
+    #: The score and maximum score of the task cells
+    task_score = Column(Float(), nullable=False, default=0.0)
+    max_task_score = Column(Float(), nullable=False, default=0.0)
+
+    #: Whether any of the grades needs to be assigned manually
+    needs_manual_grade = Column(Boolean, nullable=False, default=False)
+
+    #: Whether any of the autograder tests failed
+    failed_tests = Column(Boolean, nullable=False, default=False)
+
+    def __repr__(self):
+        return "SubmittedNotebookScore<{}>".format(self.notebook_id)
+
 ## Needs manual grade
 
 SubmittedNotebook.needs_manual_grade = column_property(
@@ -1207,9 +1262,10 @@ Assignment.max_task_score = column_property(
     .scalar_subquery(), deferred=True)
 
 SubmittedAssignment.max_task_score = column_property(
-    select(func.coalesce(Assignment.max_task_score, 0.0))
-    .scalar_subquery()
-)
+    select(Assignment.max_task_score)
+    .where(Assignment.id == SubmittedAssignment.assignment_id)
+    .correlate_except(Assignment)
+    .scalar_subquery(), deferred=True)
 
 # Number of submissions
 
@@ -1269,6 +1325,177 @@ SubmittedAssignment.late_submission_penalty = column_property(
 
 
 
+# Materialized scores
+
+def _select_submitted_notebook_scores():
+    """Returns a query computing the rows of
+    :class:`~nbgrader.api.SubmittedNotebookScore` from the grades, with one
+    row for each submitted notebook that has any grades."""
+    grade_cells = GradeCell.__table__
+    task_cells = TaskCell.__table__
+
+    def _sum(condition, value):
+        return func.coalesce(func.sum(case((condition, value), else_=literal_column("0.0"))), 0.0)
+
+    def _any(condition):
+        return func.max(case((condition, 1), else_=0)) == 1
+
+    is_code = grade_cells.c.cell_type == "code"
+    is_written = grade_cells.c.cell_type == "markdown"
+    is_task = task_cells.c.cell_type == "markdown"
+    code_score = _sum(is_code, Grade.score)
+    written_score = _sum(is_written, Grade.score)
+    task_score = _sum(is_task, Grade.score)
+    max_code_score = _sum(is_code, grade_cells.c.max_score)
+    max_written_score = _sum(is_written, grade_cells.c.max_score)
+    max_task_score = _sum(is_task, task_cells.c.max_score)
+
+    return select(
+        Grade.notebook_id.label("notebook_id"),
+        (code_score + written_score + task_score).label("score"),
+        (max_code_score + max_written_score + max_task_score).label("max_score"),
+        code_score.label("code_score"),
+        max_code_score.label("max_code_score"),
+        written_score.label("written_score"),
+        max_written_score.label("max_written_score"),
+        task_score.label("task_score"),
+        max_task_score.label("max_task_score"),
+        _any(Grade.needs_manual_grade).label("needs_manual_grade"),
+        _any(and_(is_code, Grade.auto_score < grade_cells.c.max_score)).label("failed_tests")
+    ).select_from(Grade)\
+     .outerjoin(grade_cells, Grade.cell_id == grade_cells.c.id)\
+     .outerjoin(task_cells, Grade.cell_id == task_cells.c.id)\
+     .group_by(Grade.notebook_id)
+
+
+def _insert_submitted_notebook_scores(scores):
+    columns = [
+        "notebook_id", "score", "max_score", "code_score", "max_code_score",
+        "written_score", "max_written_score", "task_score", "max_task_score",
+        "needs_manual_grade", "failed_tests"
+    ]
+    return insert(SubmittedNotebookScore).from_select(columns, scores)
+
+
+def _collect_stale_scores(session, flush_context, instances):
+    # remember which objects affecting the materialized scores are about to be
+    # flushed; their ids are only all known once the flush is done
+    stale = session.info.setdefault(
+        'stale_scores', {'grades': [], 'cells': [], 'deleted': False})
+    for obj in itertools.chain(session.new, session.dirty, session.deleted):
+        if isinstance(obj, Grade):
+            if obj in session.new or obj in session.deleted or session.is_modified(obj):
+                stale['grades'].append(obj)
+        elif isinstance(obj, (GradeCell, TaskCell)):
+            if obj in session.deleted or (obj not in session.new and session.is_modified(obj)):
+                stale['cells'].append(obj)
+        elif obj in session.deleted and isinstance(
+                obj, (SubmittedNotebook, SubmittedAssignment, Student, Notebook, Assignment)):
+            stale['deleted'] = True
+
+
+def _update_stale_scores(session, flush_context):
+    stale = session.info.pop('stale_scores', None)
+    if stale is None:
+        return
+
+    connection = session.connection()
+    notebook_ids = {grade.notebook_id for grade in stale['grades']}
+    cell_ids = [cell.id for cell in stale['cells']]
+    for i in range(0, len(cell_ids), 500):
+        notebook_ids.update(connection.execute(
+            select(Grade.notebook_id).where(Grade.cell_id.in_(cell_ids[i:i + 500])).distinct()
+        ).scalars())
+    notebook_ids.discard(None)
+
+    notebook_ids = list(notebook_ids)
+    for i in range(0, len(notebook_ids), 500):
+        chunk = notebook_ids[i:i + 500]
+        connection.execute(
+            delete(SubmittedNotebookScore).where(SubmittedNotebookScore.notebook_id.in_(chunk)))
+        connection.execute(_insert_submitted_notebook_scores(
+            _select_submitted_notebook_scores().where(Grade.notebook_id.in_(chunk))))
+
+    if stale['deleted']:
+        connection.execute(
+            delete(SubmittedNotebookScore).where(
+                SubmittedNotebookScore.notebook_id.not_in(select(SubmittedNotebook.id))))
+
+
+# Engines are shared by all the gradebooks in a process that connect to the
+# same database, keyed by the database identity (see _database_identity), and
+# the schema and course of each database are only checked on first use. There
+# is one engine per database, which lives until dispose_engines() is called
+# (converters call it at the end of their run) or the process exits.
+_engines = {}  # type: Dict[str, Any]
+_checked_databases = set()  # type: set
+
+# Databases whose score cache has been filled in, keyed by database identity.
+_score_cache_databases = set()  # type: set
+
+
+def _database_identity(db_url: str) -> Optional[tuple]:
+    """Returns a key identifying the database at ``db_url``, or None if the
+    database should not be shared (in-memory databases, and SQLite files that
+    do not exist yet). SQLite files are identified by their absolute path and
+    inode, so that a database that is deleted and recreated is treated as a
+    new database.
+
+    """
+    url = make_url(db_url)
+    if url.get_backend_name() != 'sqlite':
+        return (url.render_as_string(hide_password=False),)
+    if not url.database or url.database == ':memory:' or url.database.startswith('file:'):
+        return None
+    path = os.path.abspath(url.database)
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (str(url.set(database=path)), st.st_dev, st.st_ino)
+
+
+def _get_engine(db_url: str) -> Optional[Engine]:
+    """Returns the shared engine for ``db_url``, creating it if necessary,
+    or None if the database should not be shared."""
+    identity = _database_identity(db_url)
+    if identity is None:
+        return None
+    key = identity[0]
+    entry = _engines.get(key)
+    if entry is not None and entry[0] == identity:
+        return entry[1]
+    if entry is not None:
+        entry[1].dispose()
+    engine = create_engine(db_url, echo=False, future=True)
+    _engines[key] = (identity, engine)
+    return engine
+
+
+def dispose_engines() -> None:
+    """Close the connections of the engines shared by gradebooks, and forget
+    which databases have already been checked. Gradebooks that are still
+    open keep working, and open new connections when they need them.
+
+    """
+    for _, engine in _engines.values():
+        engine.dispose()
+    _engines.clear()
+    _checked_databases.clear()
+    _score_cache_databases.clear()
+
+
+def _forget_engines() -> None:
+    # connections must not be shared with a forked child process
+    for _, engine in _engines.values():
+        engine.dispose(close=False)
+    _engines.clear()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_forget_engines)
+
+
 class Gradebook(object):
     """The gradebook object to interface with the database holding
     nbgrader grades.
@@ -1278,7 +1505,8 @@ class Gradebook(object):
     def __init__(self,
                  db_url: str,
                  course_id: str = "default_course",
-                 authenticator: Optional[Authenticator] = None):
+                 authenticator: Optional[Authenticator] = None,
+                 score_cache: bool = False):
         """Initialize the connection to the database.
 
         Parameters
@@ -1291,24 +1519,56 @@ class Gradebook(object):
         authenticator:
             An authenticator instance for communicating with an external
             database.
+        score_cache:
+            Whether to read scores from the materialized
+            :class:`~nbgrader.api.SubmittedNotebookScore` table rather than
+            aggregating the individual grades in
+            :func:`~nbgrader.api.Gradebook.student_dicts`,
+            :func:`~nbgrader.api.Gradebook.submission_dicts` and
+            :func:`~nbgrader.api.Gradebook.notebook_submission_dicts`. The
+            score attributes of the models, and their ``to_dict()`` methods,
+            are not affected.
+
+        """
+        # create the connection to the database, reusing the engine (and its
+        # connection pool) of any other gradebook for the same database
+        self.engine = _get_engine(db_url)
+        self._owns_engine = self.engine is None
+        if self._owns_engine:
+            self.engine = create_engine(db_url, echo=False, future=True)
+        session_factory = sessionmaker(autoflush=True, bind=self.engine, future=True)
+        event.listen(session_factory, 'before_flush', _collect_stale_scores)
+        event.listen(session_factory, 'after_flush', _update_stale_scores)
+        self.db = scoped_session(session_factory)
+
+        identity = _database_identity(db_url)
+        if identity is None or (identity, course_id) not in _checked_databases:
+            # this creates all the tables in the database if they don't already exist
+            db_exists = len(inspect(self.engine).get_table_names()) > 0
+            Base.metadata.create_all(bind=self.engine)
+
+            # set the alembic version if it doesn't exist
+            if not db_exists:
+                alembic_version = get_alembic_version()
+                self.db.execute(text("CREATE TABLE alembic_version (version_num VARCHAR(32) NOT NULL);"))
+                self.db.execute(text("INSERT INTO alembic_version (version_num) VALUES ('{}');".format(alembic_version)))
+                self.db.commit()
 
-        """
-        # create the connection to the database
-        self.engine = create_engine(db_url, echo=False, future=True)
-        self.db = scoped_session(sessionmaker(autoflush=True, bind=self.engine, future=True))
+            self.check_course(course_id=course_id)
 
-        # this creates all the tables in the database if they don't already exist
-        db_exists = len(inspect(self.engine).get_table_names()) > 0
-        Base.metadata.create_all(bind=self.engine)
+            # a new SQLite database only has an identity once it has been created
+            identity = _database_identity(db_url)
+            if identity is not None:
+                _checked_databases.add((identity, course_id))
 
-        # set the alembic version if it doesn't exist
-        if not db_exists:
-            alembic_version = get_alembic_version()
-            self.db.execute(text("CREATE TABLE alembic_version (version_num VARCHAR(32) NOT NULL);"))
-            self.db.execute(text("INSERT INTO alembic_version (version_num) VALUES ('{}');".format(alembic_version)))
-            self.db.commit()
+        # fill in the scores of submissions graded before the score cache
+        # existed
+        self.score_cache = score_cache
+        if score_cache and (identity is None or identity not in _score_cache_databases):
+            self.update_score_cache()
+            if identity is not None:
+                _score_cache_databases.add(identity)
 
-        self.check_course(course_id=course_id)
         self.course_id = course_id
         self.authenticator = authenticator
 
@@ -1328,7 +1588,19 @@ class Gradebook(object):
 
         """
         self.db.remove()
-        self.engine.dispose()
+        if self._owns_engine:
+            self.engine.dispose()
+
+    def update_score_cache(self) -> None:
+        """Compute the materialized scores of any submitted notebooks that are
+        missing from the :class:`~nbgrader.api.SubmittedNotebookScore` table,
+        e.g. because they were graded by an older version of nbgrader.
+
+        """
+        cached = select(SubmittedNotebookScore.notebook_id)
+        self.db.execute(_insert_submitted_notebook_scores(
+            _select_submitted_notebook_scores().where(Grade.notebook_id.not_in(cached))))
+        self.db.commit()
 
     def check_course(self, course_id: str = "default_course", **kwargs: dict) -> Course:
         """Set the course id
@@ -1463,6 +1735,31 @@ class Gradebook(object):
 
         return student
 
+    def update_or_create_students(self, students: Iterable[dict], chunk_size: int = 1000) -> None:
+        """Update existing students, and create the students that don't exist,
+        in a single transaction: either all of the students are written to the
+        database, or none of them are.
+
+        The existing students are found with one query, and the students are
+        then inserted and updated ``chunk_size`` at a time, so this is much
+        faster than calling :func:`update_or_create_student` for each student.
+
+        Parameters
+        ----------
+        students:
+            The students, each a dictionary of keyword arguments for the
+            :class:`~nbgrader.api.Student` object, including its ``id``
+        chunk_size:
+            The number of students written to the database at once
+
+        """
+        def add_to_course(chunk):
+            if self.authenticator:
+                self.authenticator.add_students_to_course(
+                    [x["id"] for x in chunk], self.course_id)
+
+        self._bulk_update_or_create(Student, "id", students, chunk_size, add_to_course)
+
     def remove_student(self, student_id):
         """Deletes an existing student from the gradebook, including any
         submissions the might be associated with that student.
@@ -1587,6 +1884,73 @@ class Gradebook(object):
 
         return assignment
 
+    def update_or_create_assignments(self, assignments: Iterable[dict], chunk_size: int = 1000) -> None:
+        """Update existing assignments, and create the assignments that don't
+        exist, in a single transaction. See
+        :func:`update_or_create_students`.
+
+        Parameters
+        ----------
+        assignments:
+            The assignments, each a dictionary of keyword arguments for the
+            :class:`~nbgrader.api.Assignment` object, including its ``name``
+        chunk_size:
+            The number of assignments written to the database at once
+
+        """
+        def parse(assignment):
+            if 'duedate' in assignment:
+                assignment = dict(assignment, duedate=utils.parse_utc(assignment['duedate']))
+            return assignment
+
+        self._bulk_update_or_create(
+            Assignment, "name", map(parse, assignments), chunk_size,
+            defaults={"course_id": self.course_id})
+
+    def _bulk_update_or_create(self, table, key, rows, chunk_size, before_write=None, defaults=None):
+        """Insert the ``rows`` of ``table`` whose ``key`` is not in the table
+        yet, and update the others, in one transaction. Later rows with the
+        same key update the earlier ones."""
+        ids = dict(self.db.execute(select(getattr(table, key), table.id)).all())
+        try:
+            rows = iter(rows)
+            while True:
+                chunk = list(itertools.islice(rows, chunk_size))
+                if not chunk:
+                    break
+                if before_write:
+                    before_write(chunk)
+
+                inserts = []
+                updates = []
+                for row in chunk:
+                    if row[key] in ids:
+                        updates.append(dict(row, id=ids[row[key]]))
+                    else:
+                        row = dict(defaults or {}, **row)
+                        row.setdefault("id", new_uuid())
+                        ids[row[key]] = row["id"]
+                        inserts.append(row)
+
+                # inserted first, so that duplicate rows update them; each run
+                # of rows with the same columns is one executemany
+                for columns, group in _group_by_columns(inserts):
+                    self.db.execute(insert(table.__table__), group)
+                for columns, group in _group_by_columns(updates):
+                    values = {x: bindparam("_" + x) for x in columns if x != "id"}
+                    if not values:
+                        continue
+                    stmt = update(table.__table__)\
+                        .where(table.__table__.c.id == bindparam("_id"))\
+                        .values(values)
+                    self.db.execute(stmt, [{"_" + k: v for k, v in x.items()} for x in group])
+
+            self.db.commit()
+        except (IntegrityError, FlushError, StatementError) as e:
+            app_log.exception("Rolling back session due to database error %s" % e)
+            self.db.rollback()
+            raise InvalidEntry(*e.args)
+
     def remove_assignment(self, name):
         """Deletes an existing assignment from the gradebook, including any
         submissions the might be associated with that assignment.
@@ -2611,6 +2975,46 @@ class Gradebook(object):
 
         return grade
 
+    def find_submission_notebook_grades(self, notebook: str, assignment: str, student: str) -> Dict[str, Grade]:
+        """Find all the grades in a notebook in a student's submission for a
+        given assignment, using a single query.
+
+        Parameters
+        ----------
+        notebook:
+            the name of a notebook
+        assignment:
+            the name of an assignment
+        student:
+            the unique id of a student
+
+        Returns
+        -------
+        grades:
+            a dictionary mapping the name of each grade or task cell to its
+            grade. As in :func:`find_grade`, grade cells take precedence over
+            task cells with the same name.
+
+        """
+        rows = self.db.query(BaseCell.name, BaseCell.type, Grade)\
+            .join(BaseCell, BaseCell.id == Grade.cell_id)\
+            .join(SubmittedNotebook, SubmittedNotebook.id == Grade.notebook_id)\
+            .join(Notebook, Notebook.id == SubmittedNotebook.notebook_id)\
+            .join(SubmittedAssignment, SubmittedAssignment.id == SubmittedNotebook.assignment_id)\
+            .join(Assignment, Assignment.id == SubmittedAssignment.assignment_id)\
+            .join(Student, Student.id == SubmittedAssignment.student_id)\
+            .filter(
+                Notebook.name == notebook,
+                Assignment.name == assignment,
+                Student.id == student)\
+            .all()
+
+        grades = {}
+        for name, cell_type, grade in rows:
+            if name not in grades or cell_type == 'GradeCell':
+                grades[name] = grade
+        return grades
+
     def find_comment(self, solution_cell: str, notebook: str, assignment: str, student: str) -> Comment:
         """Find a particular comment in a notebook in a student's submission
         for a given assignment.
@@ -2667,6 +3071,46 @@ class Gradebook(object):
 
         return comment
 
+    def find_submission_notebook_comments(self, notebook: str, assignment: str, student: str) -> Dict[str, Comment]:
+        """Find all the comments in a notebook in a student's submission for
+        a given assignment, using a single query.
+
+        Parameters
+        ----------
+        notebook:
+            the name of a notebook
+        assignment:
+            the name of an assignment
+        student:
+            the unique id of a student
+
+        Returns
+        -------
+        comments:
+            a dictionary mapping the name of each solution or task cell to
+            its comment. As in :func:`find_comment`, solution cells take
+            precedence over task cells with the same name.
+
+        """
+        rows = self.db.query(BaseCell.name, BaseCell.type, Comment)\
+            .join(BaseCell, BaseCell.id == Comment.cell_id)\
+            .join(SubmittedNotebook, SubmittedNotebook.id == Comment.notebook_id)\
+            .join(Notebook, Notebook.id == SubmittedNotebook.notebook_id)\
+            .join(SubmittedAssignment, SubmittedAssignment.id == SubmittedNotebook.assignment_id)\
+            .join(Assignment, Assignment.id == SubmittedAssignment.assignment_id)\
+            .join(Student, Student.id == SubmittedAssignment.student_id)\
+            .filter(
+                Notebook.name == notebook,
+                Assignment.name == assignment,
+                Student.id == student)\
+            .all()
+
+        comments = {}
+        for name, cell_type, comment in rows:
+            if name not in comments or cell_type == 'SolutionCell':
+                comments[name] = comment
+        return comments
+
     def find_comment_by_id(self, comment_id):
         """Find a comment by its unique id.
 
@@ -2951,12 +3395,21 @@ class Gradebook(object):
 
         if len(self.assignments) > 0 and total_score > 0:
             # subquery the scores
-            scores = self.db.query(
-                Student.id,
-                func.sum(Grade.score).label("score")
-            ).join(SubmittedAssignment).join(SubmittedNotebook).join(Grade)\
-             .group_by(Student.id)\
-             .subquery()
+            if self.score_cache:
+                scores = self.db.query(
+                    Student.id,
+                    func.sum(SubmittedNotebookScore.score).label("score")
+                ).join(SubmittedAssignment).join(SubmittedNotebook)\
+                 .join(SubmittedNotebookScore, SubmittedNotebookScore.notebook_id == SubmittedNotebook.id)\
+                 .group_by(Student.id)\
+                 .subquery()
+            else:
+                scores = self.db.query(
+                    Student.id,
+                    func.sum(Grade.score).label("score")
+                ).join(SubmittedAssignment).join(SubmittedNotebook).join(Grade)\
+                 .group_by(Student.id)\
+                 .subquery()
 
             # full query
             _scores = func.coalesce(scores.c.score, 0.0)
@@ -2977,6 +3430,16 @@ class Gradebook(object):
             students = [s.to_dict() for s in self.students]
             return students
 
+    def _submitted_notebook_scores(self, submitted_notebooks):
+        """Returns the scores of the submitted notebooks whose ids are selected
+        by ``submitted_notebooks``, either from the score cache or aggregated
+        from the grades in a single pass."""
+        if self.score_cache:
+            return SubmittedNotebookScore.__table__
+        return _select_submitted_notebook_scores()\
+            .where(Grade.notebook_id.in_(submitted_notebooks))\
+            .subquery()
+
     def submission_dicts(self, assignment_id):
         """Returns a list of dictionaries containing submission data. Equivalent
         to calling :func:`~nbgrader.api.SubmittedAssignment.to_dict` for each
@@ -2994,133 +3457,37 @@ class Gradebook(object):
             A list of dictionaries, one per submitted assignment
 
         """
-        # subquery the code scores
-        code_scores = self.db.query(
-            SubmittedAssignment.id.label("id"),
-            func.sum(Grade.score).label("code_score"),
-            func.sum(GradeCell.max_score).label("max_code_score"),
-        ).select_from(SubmittedAssignment
-        ).join(SubmittedNotebook).join(Notebook).join(Assignment).join(Student).join(Grade).join(GradeCell)\
-         .filter(GradeCell.cell_type == "code")\
-         .group_by(SubmittedAssignment.id)\
-         .subquery()
-
-        # subquery for the written scores
-        written_scores = self.db.query(
-            SubmittedAssignment.id.label("id"),
-            func.sum(Grade.score).label("written_score"),
-            func.sum(GradeCell.max_score).label("max_written_score"),
-        ).select_from(SubmittedAssignment
-        ).join(SubmittedNotebook).join(Notebook).join(Assignment).join(Student).join(Grade).join(GradeCell)\
-         .filter(GradeCell.cell_type == "markdown")\
-         .group_by(SubmittedAssignment.id)\
-         .subquery()
-
-        # subquery for the task scores
-        task_scores = self.db.query(
-            SubmittedAssignment.id.label("id"),
-            func.sum(Grade.score).label("task_score"),
-            func.sum(TaskCell.max_score).label("max_task_score"),
-        ).select_from(SubmittedAssignment
-        ).join(SubmittedNotebook).join(Notebook).join(Assignment).join(Student).join(Grade).join(TaskCell)\
-         .filter(TaskCell.cell_type == "markdown")\
-         .group_by(SubmittedAssignment.id)\
-         .subquery()
-
-        # subquery for needing manual grading
-        manual_grade = self.db.query(
-            SubmittedAssignment.id,
-            exists().where(Grade.needs_manual_grade).label("needs_manual_grade")
-        ).select_from(SubmittedAssignment
-        ).join(SubmittedNotebook).join(Assignment).join(Notebook)\
-         .filter(
-             SubmittedNotebook.assignment_id == SubmittedAssignment.id,
-             Grade.notebook_id == SubmittedNotebook.id,
-             Grade.needs_manual_grade)\
-         .group_by(SubmittedAssignment.id)\
-         .subquery()
-
-        all_scores = union_all(
-            self.db.query(
-                SubmittedAssignment.id.label('id'),
-                func.sum(Grade.score).label("score"),
-                func.sum(GradeCell.max_score).label("max_score"),
-            ).select_from(SubmittedAssignment
-            ).join(SubmittedNotebook).join(Grade).join(GradeCell)
-            .filter(GradeCell.cell_type == "code")
-            .group_by(SubmittedAssignment.id),
-            # subquery for the written scores
-            self.db.query(
-                SubmittedAssignment.id.label('id'),
-                func.sum(Grade.score).label("score"),
-                func.sum(GradeCell.max_score).label("max_score"),
-            ).select_from(SubmittedAssignment
-            ).join(SubmittedNotebook).join(Grade).join(GradeCell)\
-            .filter(GradeCell.cell_type == "markdown")\
-            .group_by(SubmittedAssignment.id),
-
-            self.db.query(
-                SubmittedAssignment.id.label('id'),
-                func.sum(Grade.score).label("score"),
-                func.sum(TaskCell.max_score).label("max_score"),
-            ).select_from(SubmittedAssignment
-            ).join(SubmittedNotebook).join(Grade).join(TaskCell)\
-            .filter(TaskCell.cell_type == "markdown")\
-            .group_by(SubmittedAssignment.id)
-        ).subquery()
-
-        total_scores = self.db.query(
-            func.sum(all_scores.c.score).label("score"),
-            func.sum(all_scores.c.max_score).label("max_score"),
-            all_scores.c.id.label("id"),
-        ).group_by(all_scores.c.id)\
-         .subquery()
-
-        # full query
-        _manual_grade = func.coalesce(manual_grade.c.needs_manual_grade, False)
+        keys = [
+            "id", "name", "timestamp", "first_name", "last_name", "student",
+            "score", "max_score", "code_score", "max_code_score",
+            "written_score", "max_written_score",
+            "task_score", "max_task_score",
+            "needs_manual_grade"
+        ]
+
+        scores = self._submitted_notebook_scores(
+            select(SubmittedNotebook.id)
+            .join(SubmittedAssignment).join(Assignment)
+            .where(Assignment.name == assignment_id))
         assignments = self.db.query(
             SubmittedAssignment.id, Assignment.name,
             SubmittedAssignment.timestamp, Student.first_name, Student.last_name,
             Student.id,
-            func.coalesce(total_scores.c.score, 0.0),
-            func.coalesce(total_scores.c.max_score, 0.0),
-            func.coalesce(code_scores.c.code_score, 0.0),
-            func.coalesce(code_scores.c.max_code_score, 0.0),
-            func.coalesce(written_scores.c.written_score, 0.0),
-            func.coalesce(written_scores.c.max_written_score, 0.0),
-            func.coalesce(task_scores.c.task_score, 0.0),
-            func.coalesce(task_scores.c.max_task_score, 0.0),
-            _manual_grade
+            func.sum(scores.c.score), func.sum(scores.c.max_score),
+            func.sum(scores.c.code_score), func.sum(scores.c.max_code_score),
+            func.sum(scores.c.written_score), func.sum(scores.c.max_written_score),
+            func.sum(scores.c.task_score), func.sum(scores.c.max_task_score),
+            func.max(case((scores.c.needs_manual_grade, 1), else_=0)) == 1
         ).select_from(SubmittedAssignment
-        ).join(SubmittedNotebook).join(Assignment).join(Student).join(Grade)\
-         .outerjoin(code_scores, SubmittedAssignment.id == code_scores.c.id)\
-         .outerjoin(written_scores, SubmittedAssignment.id == written_scores.c.id)\
-         .outerjoin(task_scores, SubmittedAssignment.id == task_scores.c.id)\
-         .outerjoin(manual_grade, SubmittedAssignment.id == manual_grade.c.id)\
-         .outerjoin(total_scores, SubmittedAssignment.id == total_scores.c.id)\
-         .filter(and_(
-             Assignment.name == assignment_id,
-             Student.id == SubmittedAssignment.student_id,
-             SubmittedAssignment.id == SubmittedNotebook.assignment_id,
-             SubmittedNotebook.id == Grade.notebook_id,
-             SubmittedAssignment.id == total_scores.c.id))\
+        ).join(Assignment).join(Student).join(SubmittedNotebook)\
+         .join(scores, scores.c.notebook_id == SubmittedNotebook.id)\
+         .filter(Assignment.name == assignment_id)\
          .group_by(
              SubmittedAssignment.id, Assignment.name,
              SubmittedAssignment.timestamp, Student.first_name, Student.last_name,
-             Student.id, code_scores.c.code_score, code_scores.c.max_code_score,
-             written_scores.c.written_score, written_scores.c.max_written_score,
-             task_scores.c.task_score, task_scores.c.max_task_score,
-             total_scores.c.score, total_scores.c.max_score,
-             _manual_grade)\
+             Student.id)\
          .all()
 
-        keys = [
-            "id", "name", "timestamp", "first_name", "last_name", "student",
-            "score", "max_score", "code_score", "max_code_score",
-            "written_score", "max_written_score",
-            "task_score", "max_task_score",
-            "needs_manual_grade"
-        ]
         return [dict(zip(keys, x)) for x in assignments]
 
     def notebook_submission_dicts(self, notebook_id, assignment_id):
@@ -3142,149 +3509,6 @@ class Gradebook(object):
             A list of dictionaries, one per submitted notebook
 
         """
-        # subquery the code scores
-        code_scores = self.db.query(
-            SubmittedNotebook.id,
-            func.sum(Grade.score).label("code_score"),
-            func.sum(GradeCell.max_score).label("max_code_score"),
-        ).select_from(SubmittedNotebook
-        ).join(SubmittedAssignment).join(Notebook).join(Assignment).join(Student).join(Grade).join(GradeCell)\
-         .filter(GradeCell.cell_type == "code")\
-         .group_by(SubmittedNotebook.id)\
-         .subquery()
-
-        # subquery for the written scores
-        written_scores = self.db.query(
-            SubmittedNotebook.id,
-            func.sum(Grade.score).label("written_score"),
-            func.sum(GradeCell.max_score).label("max_written_score"),
-        ).select_from(SubmittedNotebook
-        ).join(SubmittedAssignment).join(Notebook).join(Assignment).join(Student).join(Grade).join(GradeCell)\
-         .filter(GradeCell.cell_type == "markdown")\
-         .group_by(SubmittedNotebook.id)\
-         .subquery()
-        # subquery for the written scores
-        task_scores = self.db.query(
-            SubmittedNotebook.id,
-            func.coalesce(func.sum(Grade.score), 0.0).label("task_score"),
-            func.sum(TaskCell.max_score).label("max_task_score"),
-        ).select_from(SubmittedNotebook
-        ).join(SubmittedAssignment).join(Notebook).join(Assignment).join(Student).join(Grade).join(TaskCell)\
-         .filter(TaskCell.cell_type == "markdown")\
-         .group_by(SubmittedNotebook.id)\
-         .subquery()
-
-        max_scores = self.db.query(
-            SubmittedNotebook.id,
-            func.sum(task_scores.c.max_task_score).label("mmmm"),
-        ).select_from(SubmittedNotebook
-        ).join(SubmittedAssignment).join(task_scores)\
-         .group_by(SubmittedNotebook.id)\
-         .subquery()
-
-        all_scores = union_all(
-            self.db.query(
-                SubmittedNotebook.id.label('id'),
-                func.sum(Grade.score).label("score"),
-                func.sum(GradeCell.max_score).label("max_score"),
-            ).select_from(SubmittedNotebook
-            ).join(Grade).join(GradeCell)
-            .filter(GradeCell.cell_type == "code")
-            .group_by(SubmittedNotebook.id),
-            # subquery for the written scores
-            self.db.query(
-                SubmittedNotebook.id.label('id'),
-                func.sum(Grade.score).label("score"),
-                func.sum(GradeCell.max_score).label("max_score"),
-            ).select_from(SubmittedNotebook
-            ).join(Grade).join(GradeCell)\
-            .filter(GradeCell.cell_type == "markdown")\
-            .group_by(SubmittedNotebook.id),
-
-            self.db.query(
-                SubmittedNotebook.id.label('id'),
-                func.sum(Grade.score).label("score"),
-                func.sum(TaskCell.max_score).label("max_score"),
-            ).select_from(SubmittedNotebook
-            ).join(Grade).join(TaskCell)\
-            .filter(TaskCell.cell_type == "markdown")\
-            .group_by(SubmittedNotebook.id)
-        ).subquery()
-
-        total_scores = self.db.query(
-            func.sum(all_scores.c.score).label("score"),
-            func.sum(all_scores.c.max_score).label("max_score"),
-            all_scores.c.id.label("id"),
-        )\
-            .group_by(all_scores.c.id)\
-            .subquery()
-
-        # subquery for needing manual grading
-
-        manual_grade = self.db.query(
-            SubmittedNotebook.id,
-            exists().where(Grade.needs_manual_grade).label("needs_manual_grade")
-        ).select_from(SubmittedNotebook
-        ).join(SubmittedAssignment).join(Assignment).join(Notebook)\
-         .filter(
-             Grade.notebook_id == SubmittedNotebook.id,
-             Grade.needs_manual_grade)\
-         .group_by(SubmittedNotebook.id)\
-         .subquery()
-
-        # subquery for failed tests
-        failed_tests = self.db.query(
-            SubmittedNotebook.id,
-            exists().where(Grade.failed_tests).label("failed_tests")
-        ).select_from(SubmittedNotebook
-        ).join(SubmittedAssignment).join(Assignment).join(Notebook)\
-         .filter(
-             Grade.notebook_id == SubmittedNotebook.id,
-             Grade.failed_tests)\
-         .group_by(SubmittedNotebook.id)\
-         .subquery()
-
-        # full query
-        _manual_grade = func.coalesce(manual_grade.c.needs_manual_grade, False)
-        _failed_tests = func.coalesce(failed_tests.c.failed_tests, False)
-        submissions = self.db.query(
-            SubmittedNotebook.id, Notebook.name,
-            Student.id, Student.first_name, Student.last_name,
-            func.coalesce(total_scores.c.score, 0.0),
-            func.coalesce(total_scores.c.max_score, 0.0),
-            func.coalesce(code_scores.c.code_score, 0.0),
-            func.coalesce(code_scores.c.max_code_score, 0.0),
-            func.coalesce(written_scores.c.written_score, 0.0),
-            func.coalesce(written_scores.c.max_written_score, 0.0),
-            func.coalesce(task_scores.c.task_score, 0.0),
-            func.coalesce(task_scores.c.max_task_score, 0.0),
-            _manual_grade, _failed_tests, SubmittedNotebook.flagged
-        ).select_from(SubmittedNotebook
-        ).join(SubmittedAssignment).join(Notebook).join(Assignment).join(Student).join(Grade)\
-         .outerjoin(code_scores, SubmittedNotebook.id == code_scores.c.id)\
-         .outerjoin(written_scores, SubmittedNotebook.id == written_scores.c.id)\
-         .outerjoin(task_scores, SubmittedNotebook.id == task_scores.c.id)\
-         .outerjoin(total_scores, SubmittedNotebook.id == total_scores.c.id)\
-         .outerjoin(manual_grade, SubmittedNotebook.id == manual_grade.c.id)\
-         .outerjoin(failed_tests, SubmittedNotebook.id == failed_tests.c.id)\
-         .filter(and_(
-             Notebook.name == notebook_id,
-             Assignment.name == assignment_id,
-             Student.id == SubmittedAssignment.student_id,
-             SubmittedAssignment.id == SubmittedNotebook.assignment_id,
-             SubmittedNotebook.id == Grade.notebook_id,
-             SubmittedNotebook.id == total_scores.c.id,
-         )
-        ).group_by(
-             SubmittedNotebook.id, Notebook.name,
-             Student.id, Student.first_name, Student.last_name,
-             code_scores.c.code_score, code_scores.c.max_code_score,
-             written_scores.c.written_score, written_scores.c.max_written_score,
-             task_scores.c.task_score, task_scores.c.max_task_score,
-             total_scores.c.score, total_scores.c.max_score,
-             _manual_grade, _failed_tests, SubmittedNotebook.flagged)\
-         .all()
-
         keys = [
             "id", "name", "student", "first_name", "last_name",
             "score", "max_score",
@@ -3294,4 +3518,27 @@ class Gradebook(object):
             "needs_manual_grade",
             "failed_tests", "flagged"
         ]
+
+        scores = self._submitted_notebook_scores(
+            select(SubmittedNotebook.id)
+            .join(Notebook).join(Assignment)
+            .where(and_(
+                Notebook.name == notebook_id,
+                Assignment.name == assignment_id)))
+        submissions = self.db.query(
+            SubmittedNotebook.id, Notebook.name,
+            Student.id, Student.first_name, Student.last_name,
+            scores.c.score, scores.c.max_score,
+            scores.c.code_score, scores.c.max_code_score,
+            scores.c.written_score, scores.c.max_written_score,
+            scores.c.task_score, scores.c.max_task_score,
+            scores.c.needs_manual_grade, scores.c.failed_tests, SubmittedNotebook.flagged
+        ).select_from(SubmittedNotebook
+        ).join(SubmittedAssignment).join(Notebook).join(Assignment).join(Student)\
+         .join(scores, scores.c.notebook_id == SubmittedNotebook.id)\
+         .filter(and_(
+             Notebook.name == notebook_id,
+             Assignment.name == assignment_id))\
+         .all()
+
         return [dict(zip(keys, x)) for x in submissions]
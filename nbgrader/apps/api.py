@@ -1,12 +1,14 @@
 import glob
 import re
+import fnmatch
 import sys
 import os
 import logging
 import warnings
+import contextlib
 
 from traitlets.config import LoggingConfigurable, Config, get_config
-from traitlets import Instance, Enum, Unicode, observe
+from traitlets import Instance, Enum, Unicode, Bool, observe
 
 from ..coursedir import CourseDirectory
 from ..converters import GenerateAssignment, Autograde, GenerateFeedback, GenerateSolution
@@ -16,6 +18,12 @@ from ..utils import parse_utc, temp_attrs, capture_log, as_timezone, to_numeric_
 from ..auth import Authenticator
 
 
+def _read_timestamp(path):
+    if os.path.exists(path):
+        with open(path, 'r') as fh:
+            return parse_utc(fh.read().strip())
+
+
 class NbGraderAPI(LoggingConfigurable):
     """A high-level API for using nbgrader."""
 
@@ -40,6 +48,13 @@ class NbGraderAPI(LoggingConfigurable):
         help="Format string for displaying timestamps"
     ).tag(config=True)
 
+    score_cache = Bool(
+        False,
+        help="Read submission scores from the materialized score table of the "
+             "gradebook rather than aggregating the individual grades, when "
+             "listing students and submissions"
+    ).tag(config=True)
+
     @observe('log_level')
     def _log_level_changed(self, change):
         """Adjust the log level when log_level is set."""
@@ -68,6 +83,7 @@ class NbGraderAPI(LoggingConfigurable):
         """
         self.log.setLevel(self.log_level)
         super(NbGraderAPI, self).__init__(**kwargs)
+        self._snapshot = None
 
         if coursedir is None:
             self.coursedir = CourseDirectory(parent=self)
@@ -108,6 +124,43 @@ class NbGraderAPI(LoggingConfigurable):
             self.exchange_root = ''
             self.exchange_missing = True
 
+    @contextlib.contextmanager
+    def snapshot(self):
+        """A context in which the course directory and the exchange are only
+        scanned once: the results of the directory listings, file checks and
+        submission timestamps read by the ``get_*`` methods are reused until
+        the context exits, so that a group of calls (such as those answering
+        one formgrader request) all see the same state of the course, and do
+        not read it again. Changes made to the course within the context are
+        not seen until it exits.
+
+        """
+        if self._snapshot is not None:
+            yield
+            return
+        self._snapshot = {}
+        try:
+            yield
+        finally:
+            self._snapshot = None
+
+    def _memoize(self, fn, *args):
+        if self._snapshot is None:
+            return fn(*args)
+        key = (fn.__name__,) + args
+        if key not in self._snapshot:
+            self._snapshot[key] = fn(*args)
+        return self._snapshot[key]
+
+    def _glob(self, pattern):
+        return self._memoize(glob.glob, pattern)
+
+    def _isdir(self, path):
+        return self._memoize(os.path.isdir, path)
+
+    def _exists(self, path):
+        return self._memoize(os.path.exists, path)
+
     @property
     def exchange_is_functional(self):
         return self.course_id and not self.exchange_missing and sys.platform != 'win32'
@@ -121,7 +174,7 @@ class NbGraderAPI(LoggingConfigurable):
         :func:`~nbgrader.api.Gradebook.close`.
 
         """
-        return Gradebook(self.coursedir.db_url, self.course_id)
+        return Gradebook(self.coursedir.db_url, self.course_id, score_cache=self.score_cache)
 
     def get_source_assignments(self):
         """Get the names of all assignments in the `source` directory.
@@ -132,7 +185,7 @@ class NbGraderAPI(LoggingConfigurable):
             A set of assignment names
 
         """
-        filenames = glob.glob(self.coursedir.format_path(
+        filenames = self._glob(self.coursedir.format_path(
             self.coursedir.source_directory,
             student_id='.',
             assignment_id='*'))
@@ -140,7 +193,7 @@ class NbGraderAPI(LoggingConfigurable):
         assignments = set([])
         for filename in filenames:
             # skip files that aren't directories
-            if not os.path.isdir(filename):
+            if not self._isdir(filename):
                 continue
 
             # parse out the assignment name
@@ -168,16 +221,19 @@ class NbGraderAPI(LoggingConfigurable):
 
         """
         if self.exchange_is_functional:
-            lister = self.exchange.List(
-                coursedir=self.coursedir,
-                authenticator=self.authenticator,
-                parent=self)
-            released = set([x['assignment_id'] for x in lister.start()])
+            released = set(self._memoize(self._list_released))
         else:
             released = set([])
 
         return released
 
+    def _list_released(self):
+        lister = self.exchange.List(
+            coursedir=self.coursedir,
+            authenticator=self.authenticator,
+            parent=self)
+        return [x['assignment_id'] for x in lister.start()]
+
     def get_submitted_students(self, assignment_id):
         """Get the ids of students that have submitted a given assignment
         (determined by whether or not a submission exists in the `submitted`
@@ -194,8 +250,14 @@ class NbGraderAPI(LoggingConfigurable):
             A set of student ids
 
         """
+        if self._snapshot is not None:
+            # the submissions of every assignment are listed once per snapshot
+            return set([
+                student_id for student_id, name in self._memoize(self._list_submitted)
+                if fnmatch.fnmatchcase(name, assignment_id)])
+
         # get the names of all student submissions in the `submitted` directory
-        filenames = glob.glob(self.coursedir.format_path(
+        filenames = self._glob(self.coursedir.format_path(
             self.coursedir.submitted_directory,
             student_id='*',
             assignment_id=assignment_id))
@@ -203,7 +265,7 @@ class NbGraderAPI(LoggingConfigurable):
         students = set([])
         for filename in filenames:
             # skip files that aren't directories
-            if not os.path.isdir(filename):
+            if not self._isdir(filename):
                 continue
 
             # parse out the student id
@@ -221,6 +283,26 @@ class NbGraderAPI(LoggingConfigurable):
 
         return students
 
+    def _list_submitted(self):
+        filenames = glob.glob(self.coursedir.format_path(
+            self.coursedir.submitted_directory,
+            student_id='*',
+            assignment_id='*'))
+        regex = self.coursedir.format_path(
+            self.coursedir.submitted_directory,
+            student_id='(?P<student_id>.*)',
+            assignment_id='(?P<assignment_id>.*)',
+            escape=True)
+
+        submissions = []
+        for filename in filenames:
+            if not os.path.isdir(filename):
+                continue
+            matches = re.match(regex, filename)
+            if matches:
+                submissions.append((matches.group('student_id'), matches.group('assignment_id')))
+        return submissions
+
     def get_submitted_timestamp(self, assignment_id, student_id):
         """Gets the timestamp of a submitted assignment.
 
@@ -244,9 +326,7 @@ class NbGraderAPI(LoggingConfigurable):
             assignment_id))
 
         timestamp_pth = os.path.join(assignment_dir, 'timestamp.txt')
-        if os.path.exists(timestamp_pth):
-            with open(timestamp_pth, 'r') as fh:
-                return parse_utc(fh.read().strip())
+        return self._memoize(_read_timestamp, timestamp_pth)
 
     def get_autograded_students(self, assignment_id):
         """Get the ids of students whose submission for a given assignment
@@ -280,7 +360,7 @@ class NbGraderAPI(LoggingConfigurable):
                 self.coursedir.autograded_directory,
                 student_id=student_id,
                 assignment_id=assignment_id)
-            if not os.path.isdir(filename):
+            if not self._isdir(filename):
                 continue
 
             # get the timestamps and check whether the submitted timestamp is
@@ -320,7 +400,7 @@ class NbGraderAPI(LoggingConfigurable):
             self.coursedir.source_directory,
             student_id='.',
             assignment_id=assignment_id))
-        if not os.path.isdir(sourcedir):
+        if not self._isdir(sourcedir):
             return
 
         # see if there is information about the assignment in the database
@@ -378,7 +458,7 @@ class NbGraderAPI(LoggingConfigurable):
             self.coursedir.release_directory,
             student_id='.',
             assignment_id=assignment_id))
-        if os.path.exists(releasedir):
+        if self._exists(releasedir):
             assignment["release_path"] = os.path.relpath(releasedir, self.coursedir.root)
         else:
             assignment["release_path"] = None
@@ -450,7 +530,7 @@ class NbGraderAPI(LoggingConfigurable):
                     escape=True)
 
                 notebooks = []
-                for filename in glob.glob(os.path.join(sourcedir, "*.ipynb")):
+                for filename in self._glob(os.path.join(sourcedir, "*.ipynb")):
                     regex = re.escape(os.path.sep).join([escaped_sourcedir, "(?P<notebook_id>.*).ipynb"])
                     matches = re.match(regex, filename)
                     notebook_id = matches.groupdict()['notebook_id']
@@ -669,7 +749,7 @@ class NbGraderAPI(LoggingConfigurable):
                     assignment_id=assignment_id)),
                 "{}.ipynb".format(nb.name))
 
-            if os.path.exists(filename):
+            if self._exists(filename):
                 submissions.append(nb)
 
         return sorted(submissions, key=lambda x: x.id)
@@ -814,8 +894,9 @@ class NbGraderAPI(LoggingConfigurable):
         """
         # return just an empty list if the student doesn't exist
         submissions = []
+        students = {x['id']: x for x in self.get_students()}
         for assignment_id in self.get_source_assignments():
-            submission = self.get_submission(assignment_id, student_id)
+            submission = self.get_submission(assignment_id, student_id, students=students)
             submissions.append(submission)
 
         submissions.sort(key=lambda x: x["name"])
@@ -853,7 +934,7 @@ class NbGraderAPI(LoggingConfigurable):
                         assignment_id=assignment_id)),
                     "{}.ipynb".format(notebook.name))
 
-                if os.path.exists(filename):
+                if self._exists(filename):
                     submissions.append(notebook.to_dict())
                 else:
                     submissions.append({
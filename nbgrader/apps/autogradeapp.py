@@ -15,6 +15,7 @@ aliases = {
 }
 aliases.update(nbgrader_aliases)
 aliases.update({
+    'jobs': 'BaseConverter.max_workers',
 })
 
 flags = {}
@@ -84,6 +85,11 @@ class AutogradeApp(NbGrader):
 
             nbgrader autograde "Problem Set 1" --notebook "1*"
 
+        To grade up to 8 submissions at the same time, each in its own
+        worker process:
+
+            nbgrader autograde "Problem Set 1" --jobs 8
+
         By default, student submissions are re-executed and their output cleared.
         For long running notebooks, it can be useful to disable this with the
         '--no-execute' flag:
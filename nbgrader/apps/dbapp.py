@@ -7,11 +7,11 @@ import sys
 import shutil
 
 from textwrap import dedent
-from traitlets import default, Unicode, Bool, List
+from traitlets import default, Unicode, Bool, List, Integer
 from datetime import datetime
 
 from . import NbGrader
-from ..api import Gradebook, MissingEntry, Student, Assignment
+from ..api import Gradebook, MissingEntry, InvalidEntry, Student, Assignment
 from .. import dbutil
 
 aliases = {
@@ -153,6 +153,12 @@ class DbGenericImportApp(DbBaseApp):
         imported via a csv file.
         """).strip())
 
+    chunk_size = Integer(1000, help=dedent(
+        """
+        The number of rows of the csv file that are written to the database
+        at once.
+        """).strip()).tag(config=True)
+
     def db_update_method_name(self):
         """
         Name of the update method used on the Gradebook for this import app.
@@ -167,6 +173,22 @@ class DbGenericImportApp(DbBaseApp):
         """
         raise NotImplementedError
 
+    def db_bulk_update_method_name(self):
+        """
+        Name of the method used on the Gradebook to update or create all of
+        the instances of the csv file in one transaction.
+
+        Arguments
+        ---------
+        instances: iterable of dictionaries
+            Contents for the update from the parsed csv rows, including the
+            self.primary_key of each instance
+        chunk_size: int
+            The number of instances written at once
+
+        """
+        raise NotImplementedError
+
     name = u""
     description = u""
 
@@ -220,32 +242,37 @@ class DbGenericImportApp(DbBaseApp):
         with Gradebook(self.coursedir.db_url, self.course_id, self.authenticator) as gb:
             with open(path, 'r') as fh:
                 reader = csv.DictReader(fh)
-                reader.fieldnames = self._preprocess_keys(reader.fieldnames)
-                for row in reader:
-                    if self.primary_key not in row:
-                        self.fail("Malformatted CSV file: must contain a column for '%s'" % self.primary_key)
-
-                    # make sure all the keys are actually allowed in the database,
-                    # and that any empty strings are parsed as None
-                    instance = {}
-                    for key, val in row.items():
-                        if key not in self.expected_keys:
-                            continue
-                        if val == '':
-                            instance[key] = None
-                        else:
-                            instance[key] = val
-                    instance_primary_key = instance.pop(self.primary_key)
-
-
-                    self.log.info("Creating/updating %s with %s '%s': %s",
-                                  self.table_class.__name__,
-                                  self.primary_key,
-                                  instance_primary_key,
-                                  instance)
-                    db_update_method = getattr(gb, self.db_update_method_name)
-                    db_update_method(instance_primary_key, **instance)
+                reader.fieldnames = self._preprocess_keys(reader.fieldnames or [])
+                if self.primary_key not in reader.fieldnames:
+                    self.fail("Malformatted CSV file: must contain a column for '%s'" % self.primary_key)
+
+                # the rows are read as they are written to the database, a
+                # chunk at a time, in a single transaction
+                db_update_method = getattr(gb, self.db_bulk_update_method_name)
+                try:
+                    db_update_method(self._parse_rows(reader), chunk_size=self.chunk_size)
+                except InvalidEntry as e:
+                    self.fail("Could not import %s: %s", path, e)
+
+    def _parse_rows(self, reader):
+        for row in reader:
+            # make sure all the keys are actually allowed in the database,
+            # and that any empty strings are parsed as None
+            instance = {}
+            for key, val in row.items():
+                if key not in self.expected_keys or key in self.excluded_keys:
+                    continue
+                if val == '':
+                    instance[key] = None
+                else:
+                    instance[key] = val
 
+            self.log.info("Creating/updating %s with %s '%s': %s",
+                          self.table_class.__name__,
+                          self.primary_key,
+                          instance[self.primary_key],
+                          {k: v for k, v in instance.items() if k != self.primary_key})
+            yield instance
 
     def _preprocess_keys(self, keys):
         """
@@ -278,6 +305,10 @@ class DbStudentImportApp(DbGenericImportApp):
     def db_update_method_name(self):
         return "update_or_create_student"
 
+    @property
+    def db_bulk_update_method_name(self):
+        return "update_or_create_students"
+
 
 class DbStudentListApp(DbBaseApp):
 
@@ -402,6 +433,10 @@ class DbAssignmentImportApp(DbGenericImportApp):
     def db_update_method_name(self):
         return "update_or_create_assignment"
 
+    @property
+    def db_bulk_update_method_name(self):
+        return "update_or_create_assignments"
+
 class DbAssignmentListApp(DbBaseApp):
 
     name = u'nbgrader-db-assignment-list'
@@ -1,6 +1,18 @@
-from traitlets import Instance, Type
+import time
+import threading
+
+from collections import OrderedDict
+from traitlets import Instance, Type, Float, Integer
 from traitlets.config import LoggingConfigurable
-from typing import Any, Optional
+from typing import Any, Optional, List
+
+
+# The courses of the students looked up by every authenticator of this
+# process, by plugin class and student id, with the time they were looked up
+# at, least recently used first. Authenticators are created for each request
+# of the server extensions, so the cache outlives them.
+_courses = OrderedDict()
+_courses_lock = threading.Lock()
 
 
 class BaseAuthPlugin(LoggingConfigurable):
@@ -36,6 +48,22 @@ class BaseAuthPlugin(LoggingConfigurable):
         """
         raise NotImplementedError
 
+    def add_students_to_course(self, student_ids: List[str], course_id: str) -> None:
+        """Grants several students access to a given course. Plugins that can
+        do so in one request should override this; by default each student is
+        added with :func:`add_student_to_course`.
+
+        Arguments
+        ---------
+        student_ids:
+            The unique ids of the students.
+        course_id:
+            The unique id of the course.
+
+        """
+        for student_id in student_ids:
+            self.add_student_to_course(student_id, course_id)
+
     def remove_student_from_course(self, student_id: str, course_id: str) -> None:  # pragma: no cover
         """Removes a student's access to a given course.
 
@@ -62,6 +90,9 @@ class NoAuthPlugin(BaseAuthPlugin):
         # courses in the default setting.
         pass
 
+    def add_students_to_course(self, student_ids: List[str], course_id: str) -> None:
+        pass
+
     def remove_student_from_course(self, student_id: str, course_id: str) -> None:
         # Nothing to do, we don't keep track of which students are in which
         # courses in the default setting.
@@ -78,6 +109,20 @@ class Authenticator(LoggingConfigurable):
 
     plugin = Instance(BaseAuthPlugin).tag(config=False)
 
+    cache_ttl = Float(
+        30.0,
+        help=(
+            "The number of seconds the courses of a student are cached for, "
+            "by every authenticator in this process. If 0, the plugin is "
+            "asked every time."
+        )
+    ).tag(config=True)
+
+    cache_size = Integer(
+        1024,
+        help="The maximum number of students whose courses are cached."
+    ).tag(config=True)
+
     def __init__(self, *args: Any, **kwargs: Any) -> None:
         super().__init__(*args, **kwargs)
         self.log.debug("Using authenticator: %s", self.plugin_class.__name__)
@@ -99,7 +144,30 @@ class Authenticator(LoggingConfigurable):
         the list.
 
         """
-        return self.plugin.get_student_courses(student_id)
+        key = (self.plugin_class, student_id)
+        if self.cache_ttl > 0:
+            with _courses_lock:
+                entry = _courses.get(key)
+                if entry is not None and time.monotonic() - entry[0] < self.cache_ttl:
+                    _courses.move_to_end(key)
+                    return None if entry[1] is None else list(entry[1])
+
+        courses = self.plugin.get_student_courses(student_id)
+
+        if self.cache_ttl > 0:
+            with _courses_lock:
+                _courses[key] = (time.monotonic(), None if courses is None else list(courses))
+                _courses.move_to_end(key)
+                while len(_courses) > max(0, self.cache_size):
+                    _courses.popitem(last=False)
+        return courses
+
+    def _invalidate(self, student_ids: List[str]) -> None:
+        """Forget the cached courses of the given students, and of the
+        authenticated user, who may be one of them."""
+        with _courses_lock:
+            for student_id in list(student_ids) + ["*"]:
+                _courses.pop((self.plugin_class, student_id), None)
 
     def has_access(self, student_id: str, course_id: str) -> bool:
         """Checks whether a student has access to a particular course.
@@ -133,6 +201,21 @@ class Authenticator(LoggingConfigurable):
 
         """
         self.plugin.add_student_to_course(student_id, course_id)
+        self._invalidate([student_id])
+
+    def add_students_to_course(self, student_ids: List[str], course_id: str) -> None:
+        """Grants several students access to a given course.
+
+        Arguments
+        ---------
+        student_ids:
+            The unique ids of the students.
+        course_id:
+            The unique id of the course.
+
+        """
+        self.plugin.add_students_to_course(student_ids, course_id)
+        self._invalidate(student_ids)
 
     def remove_student_from_course(self, student_id: str, course_id: str) -> None:
         """Removes a student's access to a given course.
@@ -146,3 +229,4 @@ class Authenticator(LoggingConfigurable):
 
         """
         self.plugin.remove_student_from_course(student_id, course_id)
+        self._invalidate([student_id])
@@ -1,8 +1,11 @@
 import os
+import time
+import threading
 import requests
 
+from traitlets import Float
 from .base import BaseAuthPlugin
-from typing import Optional
+from typing import Optional, List
 
 
 class JupyterhubEnvironmentError(Exception):
@@ -34,6 +37,18 @@ def get_jupyterhub_authorization() -> dict:
     }
 
 
+_sessions = threading.local()
+
+
+def _get_session() -> requests.Session:
+    """Returns the HTTP session of this thread, which keeps its connections
+    to the Hub open between calls."""
+    session = getattr(_sessions, "session", None)
+    if session is None:
+        session = _sessions.session = requests.Session()
+    return session
+
+
 def _query_jupyterhub_api(method: str, api_path: str, post_data: Optional[dict] = None) -> dict:
     """Query Jupyterhub api
 
@@ -58,7 +73,7 @@ def _query_jupyterhub_api(method: str, api_path: str, post_data: Optional[dict]
     user = get_jupyterhub_user()
     auth_header = get_jupyterhub_authorization()
     api_path = api_path.format(authenticated_user=user)
-    req = requests.request(
+    req = _get_session().request(
         url=hub_api_url + api_path,
         method=method,
         headers=auth_header,
@@ -72,7 +87,71 @@ def _query_jupyterhub_api(method: str, api_path: str, post_data: Optional[dict]
 
 class JupyterHubAuthPlugin(BaseAuthPlugin):
 
+    cache_ttl = Float(
+        10.0,
+        help=(
+            "The number of seconds the groups of the Hub, and the courses of "
+            "each student, are cached for. If 0, the Hub is queried every time."
+        )
+    ).tag(config=True)
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._lock = threading.Lock()
+        # the names and members of the groups of the Hub, and when they were listed
+        self._groups = None
+        self._groups_time = 0.0
+        # the courses of each student, and when they were queried
+        self._courses = {}
+
+    def _expired(self, timestamp: float) -> bool:
+        return time.monotonic() - timestamp >= self.cache_ttl
+
+    def _get_groups(self) -> dict:
+        with self._lock:
+            if self._groups is not None and not self._expired(self._groups_time):
+                return self._groups
+        groups = {
+            x['name']: set(x.get('users') or [])
+            for x in _query_jupyterhub_api(method="GET", api_path="/groups")}
+        with self._lock:
+            self._groups = groups
+            self._groups_time = time.monotonic()
+        return groups
+
+    def _update_cache(self, student_ids: List[str], course_id: str, added: bool) -> None:
+        group_name = "nbgrader-{}".format(course_id)
+        with self._lock:
+            if self._groups is not None:
+                members = self._groups.setdefault(group_name, set())
+                if added:
+                    members.update(student_ids)
+                else:
+                    members.difference_update(student_ids)
+            for student_id in student_ids:
+                entry = self._courses.get(student_id)
+                if entry is None:
+                    continue
+                courses = set(entry[1])
+                if added:
+                    courses.add(course_id)
+                else:
+                    courses.discard(course_id)
+                self._courses[student_id] = (entry[0], list(courses))
+
     def get_student_courses(self, student_id: str) -> Optional[list]:
+        with self._lock:
+            entry = self._courses.get(student_id)
+            if entry is not None and not self._expired(entry[0]):
+                return list(entry[1])
+
+        courses = self._query_student_courses(student_id)
+        if self.cache_ttl > 0:
+            with self._lock:
+                self._courses[student_id] = (time.monotonic(), courses)
+        return list(courses)
+
+    def _query_student_courses(self, student_id: str) -> list:
         if student_id == "*":
             student_id = "{authenticated_user}"
         response = None
@@ -94,19 +173,21 @@ class JupyterHubAuthPlugin(BaseAuthPlugin):
         return list(courses)
 
     def add_student_to_course(self, student_id: str, course_id: str) -> None:
+        self.add_students_to_course([student_id], course_id)
+
+    def add_students_to_course(self, student_ids: List[str], course_id: str) -> None:
         if not course_id:
             self.log.error(
                 "Could not add student to course because the course_id has not "
                 "been provided. Has it been set in the nbgrader_config.py?")
             return
+        if not student_ids:
+            return
 
+        students = ", ".join(student_ids)
         try:
             group_name = "nbgrader-{}".format(course_id)
-            jup_groups = _query_jupyterhub_api(
-                method="GET",
-                api_path="/groups",
-            )
-            if group_name not in [x['name'] for x in jup_groups]:
+            if group_name not in self._get_groups():
                 # This could result in a bad request(JupyterhubApiError) if
                 # there is already a group so first we check above if there is a
                 # group
@@ -114,25 +195,27 @@ class JupyterHubAuthPlugin(BaseAuthPlugin):
                     method="POST",
                     api_path="/groups/{name}".format(name=group_name),
                 )
+                self._update_cache([], course_id, added=True)
                 self.log.info("Jupyterhub group: {group_name} created.".format(
                     group_name=group_name))
 
             _query_jupyterhub_api(
                 method="POST",
                 api_path="/groups/{name}/users".format(name=group_name),
-                post_data={"users": [student_id]}
+                post_data={"users": list(student_ids)}
             )
+            self._update_cache(student_ids, course_id, added=True)
             # Saying student could be already here is because the post request
             # returns 200 even if the student_id was already in the group
             self.log.info(
                 "Student {student} added or was already in the Jupyterhub group: {group_name}".format(
-                    student=student_id,
+                    student=students,
                     group_name=group_name))
 
         except JupyterhubApiError as e:
             # We assume user might be using Jupyterhub but something is not working
             err_msg = "Student {student} NOT added to the Jupyterhub group {group_name}: ".format(
-                student=student_id,
+                student=students,
                 group_name=group_name
             )
             self.log.error(err_msg + str(e))
@@ -152,6 +235,7 @@ class JupyterHubAuthPlugin(BaseAuthPlugin):
                 api_path="/groups/{name}/users".format(name=group_name),
                 post_data={"users": [student_id]}
             )
+            self._update_cache([student_id], course_id, added=False)
             self.log.info(
                 "Student {student} was removed or was already not in the Jupyterhub group {group_name}".format(
                     student=student_id, group_name=group_name))
@@ -0,0 +1,10 @@
+"""Performance benchmarks for nbgrader, run with `asv
+<https://asv.readthedocs.io/>`_ from the root of the repository::
+
+    asv run
+
+Each benchmark builds a synthetic course (see
+:mod:`nbgrader.benchmarks.synthetic`) of increasing size, so that scaling
+regressions, such as one database query per student, show up as a change in
+the slope of the timings and query counts.
+"""
@@ -0,0 +1,60 @@
+import os
+
+from traitlets.config import Config
+
+from nbgrader.apps.api import NbGraderAPI
+from nbgrader.coursedir import CourseDirectory
+from nbgrader.benchmarks.bench_gradebook import count_queries
+from nbgrader.benchmarks.synthetic import make_course, assignment_ids, student_ids
+
+N_ASSIGNMENTS = 2
+N_NOTEBOOKS = 2
+N_CELLS = 10
+
+
+class NbGraderAPISuite:
+    params = [10, 100, 500]
+    param_names = ["students"]
+    timeout = 3600
+
+    def setup_cache(self):
+        courses = {}
+        for n_students in self.params:
+            root = os.path.abspath("course{}".format(n_students))
+            exchange = os.path.abspath("exchange{}".format(n_students))
+            os.makedirs(os.path.join(exchange, "course101"))
+            db_url = make_course(root, n_students, N_ASSIGNMENTS, N_NOTEBOOKS, N_CELLS)
+            courses[n_students] = (root, db_url, exchange)
+        return courses
+
+    def setup(self, courses, n_students):
+        root, db_url, exchange = courses[n_students]
+        config = Config()
+        config.CourseDirectory.course_id = "course101"
+        config.CourseDirectory.root = root
+        config.CourseDirectory.db_url = db_url
+        config.Exchange.root = exchange
+        self.api = NbGraderAPI(CourseDirectory(config=config), config=config)
+        self.assignment_id = assignment_ids(N_ASSIGNMENTS)[0]
+        self.student_id = student_ids(n_students)[0]
+
+    def time_get_submissions(self, courses, n_students):
+        self.api.get_submissions(self.assignment_id)
+
+    def time_get_students(self, courses, n_students):
+        self.api.get_students()
+
+    def track_get_submissions_queries(self, courses, n_students):
+        gb = self.api.gradebook
+        with count_queries(gb.engine) as count:
+            self.api.get_submissions(self.assignment_id)
+        gb.close()
+        return count[0]
+    track_get_submissions_queries.unit = "queries"
+
+    def time_get_student_submissions(self, courses, n_students):
+        self.api.get_student_submissions(self.student_id)
+
+    def time_get_student_submissions_snapshot(self, courses, n_students):
+        with self.api.snapshot():
+            self.api.get_student_submissions(self.student_id)
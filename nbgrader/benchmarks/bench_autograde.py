@@ -0,0 +1,47 @@
+import os
+
+from nbformat.v4 import new_output
+
+from nbgrader.api import Gradebook
+from nbgrader.preprocessors import (
+    ClearOutput, DeduplicateIds, OverwriteKernelspec, OverwriteCells, CheckCellMetadata)
+from nbgrader.benchmarks.synthetic import make_notebook, populate_gradebook
+
+
+class SanitizeSuite:
+    """The preprocessors that ``nbgrader autograde`` runs on each submitted
+    notebook before executing it."""
+
+    params = [10, 100, 1000]
+    param_names = ["cells"]
+    timeout = 1800
+
+    def setup_cache(self):
+        db_urls = {}
+        for n_cells in self.params:
+            db_url = "sqlite:///" + os.path.abspath("gradebook{}.db".format(n_cells))
+            with Gradebook(db_url) as gb:
+                populate_gradebook(gb, 1, 1, 1, n_cells)
+            db_urls[n_cells] = db_url
+        return db_urls
+
+    def setup(self, db_urls, n_cells):
+        self.nb = make_notebook(n_cells)
+        for cell in self.nb.cells:
+            if cell.cell_type == "code":
+                cell.outputs = [new_output("stream", name="stdout", text="output\n" * 10)]
+        self.resources = {
+            "nbgrader": {
+                "notebook": "problem00",
+                "assignment": "ps000",
+                "db_url": db_urls[n_cells],
+            }
+        }
+        self.preprocessors = [
+            ClearOutput(), DeduplicateIds(), OverwriteKernelspec(),
+            OverwriteCells(), CheckCellMetadata()]
+
+    def time_sanitize(self, db_urls, n_cells):
+        nb, resources = self.nb, self.resources
+        for preprocessor in self.preprocessors:
+            nb, resources = preprocessor.preprocess(nb, resources)
@@ -0,0 +1,47 @@
+import os
+
+from traitlets.config import Config
+
+from nbgrader.auth import Authenticator
+from nbgrader.coursedir import CourseDirectory
+from nbgrader.exchange.default import ExchangeList
+from nbgrader.benchmarks.synthetic import make_exchange
+
+N_ASSIGNMENTS = 4
+N_NOTEBOOKS = 2
+N_CELLS = 10
+
+
+class ExchangeListSuite:
+    params = ([10, 100, 500], [False, True], [False, True])
+    param_names = ["students", "inbound", "index"]
+    timeout = 1800
+
+    def setup_cache(self):
+        roots = {}
+        for n_students in self.params[0]:
+            root = os.path.abspath("exchange{}".format(n_students))
+            make_exchange(root, "course101", n_students, N_ASSIGNMENTS, N_NOTEBOOKS, N_CELLS)
+            roots[n_students] = root
+        return roots
+
+    def setup(self, roots, n_students, inbound, index):
+        config = Config()
+        config.CourseDirectory.course_id = "course101"
+        config.Exchange.root = roots[n_students]
+        config.Exchange.cache = os.path.abspath("cache{}".format(n_students))
+        config.ExchangeList.inbound = inbound
+        if not index:
+            config.ExchangeList.index_path = ""
+        coursedir = CourseDirectory(config=config)
+        self.lister = ExchangeList(
+            coursedir=coursedir, authenticator=Authenticator(config=config), config=config)
+        self.lister.init_src()
+        self.lister.init_dest()
+        if index:
+            # fill in the index, so that only the listing of an unchanged
+            # exchange is timed
+            self.lister.parse_assignments()
+
+    def time_parse_assignments(self, roots, n_students, inbound, index):
+        self.lister.parse_assignments()
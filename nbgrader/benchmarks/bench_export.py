@@ -0,0 +1,51 @@
+import os
+
+from nbgrader.api import Gradebook
+from nbgrader.plugins import CsvExportPlugin, NdjsonExportPlugin
+from nbgrader.benchmarks.bench_gradebook import count_queries
+from nbgrader.benchmarks.synthetic import make_gradebook
+
+N_ASSIGNMENTS = 10
+N_NOTEBOOKS = 1
+N_CELLS = 10
+
+
+class CsvExportSuite:
+    params = [10, 100, 500]
+    param_names = ["students"]
+    timeout = 3600
+
+    def setup_cache(self):
+        db_urls = {}
+        for n_students in self.params:
+            db_url = "sqlite:///" + os.path.abspath("gradebook{}.db".format(n_students))
+            make_gradebook(db_url, n_students, N_ASSIGNMENTS, N_NOTEBOOKS, N_CELLS)
+            db_urls[n_students] = db_url
+        return db_urls
+
+    def setup(self, db_urls, n_students):
+        self.gb = Gradebook(db_urls[n_students])
+        self.plugin = CsvExportPlugin(to=os.path.abspath("grades{}.csv".format(n_students)))
+
+    def teardown(self, db_urls, n_students):
+        self.gb.close()
+
+    def time_export(self, db_urls, n_students):
+        self.plugin.export(self.gb)
+
+    def track_export_queries(self, db_urls, n_students):
+        with count_queries(self.gb.engine) as count:
+            self.plugin.export(self.gb)
+        return count[0]
+    track_export_queries.unit = "queries"
+
+
+class NdjsonExportSuite(CsvExportSuite):
+
+    def setup(self, db_urls, n_students):
+        self.gb = Gradebook(db_urls[n_students])
+        self.plugin = NdjsonExportPlugin(
+            to=os.path.abspath("grades{}".format(n_students)), batch_size=1000)
+
+    def peakmem_export(self, db_urls, n_students):
+        self.plugin.export(self.gb)
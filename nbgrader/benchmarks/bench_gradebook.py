@@ -0,0 +1,97 @@
+import os
+from contextlib import contextmanager
+
+from sqlalchemy import event
+
+from nbgrader.api import Gradebook
+from nbgrader.benchmarks.synthetic import make_gradebook, assignment_ids, notebook_ids
+
+N_ASSIGNMENTS = 4
+N_NOTEBOOKS = 2
+N_CELLS = 20
+
+
+@contextmanager
+def count_queries(engine):
+    """Count the SQL statements executed on ``engine``."""
+    count = [0]
+
+    def increment(*args):
+        count[0] += 1
+
+    event.listen(engine, "before_cursor_execute", increment)
+    try:
+        yield count
+    finally:
+        event.remove(engine, "before_cursor_execute", increment)
+
+
+def check_dicts(gb):
+    """Check that the dictionaries computed with SQL aggregates match the
+    ones computed object by object. The synthetic scores are multiples of
+    one half, so the sums are exact and can be compared directly."""
+    for assignment in gb.assignments:
+        expected = sorted([x.to_dict() for x in assignment.submissions], key=lambda x: x["id"])
+        actual = sorted(gb.submission_dicts(assignment.name), key=lambda x: x["id"])
+        for x in actual:
+            # to_dict() serializes the timestamp
+            x["timestamp"] = x["timestamp"].isoformat()
+        assert actual == expected, "submission_dicts({}) is inconsistent".format(assignment.name)
+        for notebook in assignment.notebooks:
+            expected = sorted([x.to_dict() for x in notebook.submissions], key=lambda x: x["id"])
+            actual = sorted(gb.notebook_submission_dicts(notebook.name, assignment.name), key=lambda x: x["id"])
+            assert actual == expected, "notebook_submission_dicts({}, {}) is inconsistent".format(
+                notebook.name, assignment.name)
+
+
+class GradebookSuite:
+    params = [10, 100, 500]
+    param_names = ["students"]
+    timeout = 3600
+
+    def setup_cache(self):
+        db_urls = {}
+        for n_students in self.params:
+            db_url = "sqlite:///" + os.path.abspath("gradebook{}.db".format(n_students))
+            make_gradebook(db_url, n_students, N_ASSIGNMENTS, N_NOTEBOOKS, N_CELLS)
+            with Gradebook(db_url, score_cache=True) as gb:
+                check_dicts(gb)
+            db_urls[n_students] = db_url
+        return db_urls
+
+    def setup(self, db_urls, n_students):
+        self.gb = Gradebook(db_urls[n_students])
+        self.cached_gb = Gradebook(db_urls[n_students], score_cache=True)
+        self.assignment_id = assignment_ids(N_ASSIGNMENTS)[0]
+        self.notebook_id = notebook_ids(N_NOTEBOOKS)[0]
+
+    def teardown(self, db_urls, n_students):
+        self.gb.close()
+        self.cached_gb.close()
+
+    def time_open(self, db_urls, n_students):
+        Gradebook(db_urls[n_students]).close()
+
+    def time_submission_dicts(self, db_urls, n_students):
+        self.gb.submission_dicts(self.assignment_id)
+
+    def time_submission_dicts_score_cache(self, db_urls, n_students):
+        self.cached_gb.submission_dicts(self.assignment_id)
+
+    def time_notebook_submission_dicts(self, db_urls, n_students):
+        self.gb.notebook_submission_dicts(self.notebook_id, self.assignment_id)
+
+    def time_student_dicts(self, db_urls, n_students):
+        self.gb.student_dicts()
+
+    def track_submission_dicts_queries(self, db_urls, n_students):
+        with count_queries(self.gb.engine) as count:
+            self.gb.submission_dicts(self.assignment_id)
+        return count[0]
+    track_submission_dicts_queries.unit = "queries"
+
+    def track_student_dicts_queries(self, db_urls, n_students):
+        with count_queries(self.gb.engine) as count:
+            self.gb.student_dicts()
+        return count[0]
+    track_student_dicts_queries.unit = "queries"
@@ -0,0 +1,14 @@
+from nbgrader.utils import compute_checksum
+from nbgrader.benchmarks.synthetic import make_notebook
+
+
+class ChecksumSuite:
+    params = [100, 1000]
+    param_names = ["cells"]
+
+    def setup(self, n_cells):
+        self.cells = make_notebook(n_cells).cells
+
+    def time_compute_checksum(self, n_cells):
+        for cell in self.cells:
+            compute_checksum(cell)
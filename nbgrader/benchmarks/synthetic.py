@@ -0,0 +1,193 @@
+"""Generators for synthetic courses of arbitrary size, used by the
+benchmarks. A course is described by its number of students, assignments,
+notebooks per assignment and cells per notebook."""
+
+import datetime
+import os
+import random
+
+from nbformat import write
+from nbformat.v4 import new_code_cell, new_markdown_cell, new_notebook
+
+from nbgrader.api import Gradebook
+from nbgrader.nbgraderformat import SCHEMA_VERSION
+from nbgrader.utils import compute_checksum
+
+
+def student_ids(n_students):
+    return ["student{:05d}".format(i) for i in range(n_students)]
+
+
+def assignment_ids(n_assignments):
+    return ["ps{:03d}".format(i) for i in range(n_assignments)]
+
+
+def notebook_ids(n_notebooks):
+    return ["problem{:02d}".format(i) for i in range(n_notebooks)]
+
+
+def submission_timestamp(assignment_index, student_index):
+    base = datetime.datetime(2024, 1, 1, 12, 0, 0)
+    return base + datetime.timedelta(days=7 * assignment_index, seconds=student_index)
+
+
+def make_cell(source, cell_type, grade_id, grade=False, solution=False,
+              task=False, locked=False, points=0):
+    if cell_type == "markdown":
+        cell = new_markdown_cell(source=source)
+    else:
+        cell = new_code_cell(source=source)
+
+    cell.metadata.nbgrader = {
+        "grade": grade,
+        "solution": solution,
+        "task": task,
+        "locked": locked,
+        "grade_id": grade_id,
+        "schema_version": SCHEMA_VERSION,
+    }
+    if grade or task:
+        cell.metadata.nbgrader["points"] = points
+    cell.metadata.nbgrader["checksum"] = compute_checksum(cell)
+    return cell
+
+
+def make_notebook(n_cells):
+    """Make a notebook with ``n_cells`` nbgrader cells, cycling through
+    autograded answers, autograder tests, manually graded answers, tasks and
+    read-only cells."""
+    cells = []
+    for i in range(n_cells):
+        kind = i % 5
+        if kind == 0:
+            cell = make_cell(
+                "def answer{0}():\n    ### BEGIN SOLUTION\n    return {0}\n    ### END SOLUTION".format(i),
+                "code", "answer{}".format(i), solution=True)
+        elif kind == 1:
+            cell = make_cell(
+                "assert answer{0}() == {0}".format(i - 1),
+                "code", "test{}".format(i), grade=True, locked=True, points=1)
+        elif kind == 2:
+            cell = make_cell(
+                "Explain your answer.",
+                "markdown", "written{}".format(i), grade=True, solution=True, points=2)
+        elif kind == 3:
+            cell = make_cell(
+                "Describe a plot of the results.",
+                "markdown", "task{}".format(i), task=True, locked=True, points=3)
+        else:
+            cell = make_cell(
+                "Instructions for part {}".format(i),
+                "markdown", "instructions{}".format(i), locked=True)
+        cells.append(cell)
+
+    nb = new_notebook(cells=cells)
+    nb.metadata.kernelspec = {"name": "python3", "display_name": "Python 3", "language": "python"}
+    return nb
+
+
+def populate_gradebook(gb, n_students, n_assignments, n_notebooks, n_cells, seed=0):
+    """Add the assignments, students and graded submissions of a synthetic
+    course to the gradebook ``gb``. Every student submits every assignment,
+    with random scores in multiples of one half, so that totals do not
+    depend on the order in which the database adds them up."""
+    rng = random.Random(seed)
+    nb = make_notebook(n_cells)
+    students = student_ids(n_students)
+
+    for student_id in students:
+        gb.add_student(student_id, first_name=student_id.title(), last_name="Synthetic")
+
+    for a, assignment_id in enumerate(assignment_ids(n_assignments)):
+        gb.add_assignment(assignment_id, duedate=submission_timestamp(a, n_students // 2))
+        for notebook_id in notebook_ids(n_notebooks):
+            gb.add_notebook(notebook_id, assignment_id)
+            for cell in nb.cells:
+                meta = cell.metadata.nbgrader
+                grade_id = meta["grade_id"]
+                if meta.get("grade"):
+                    gb.add_grade_cell(
+                        grade_id, notebook_id, assignment_id,
+                        max_score=meta["points"], cell_type=cell.cell_type)
+                if meta.get("solution"):
+                    gb.add_solution_cell(grade_id, notebook_id, assignment_id)
+                if meta.get("task"):
+                    gb.add_task_cell(
+                        grade_id, notebook_id, assignment_id,
+                        max_score=meta["points"], cell_type=cell.cell_type)
+                gb.add_source_cell(
+                    grade_id, notebook_id, assignment_id,
+                    cell_type=cell.cell_type, locked=meta.get("locked", False),
+                    source=cell.source, checksum=meta.get("checksum"))
+
+        for s, student_id in enumerate(students):
+            submission = gb.add_submission(
+                assignment_id, student_id, timestamp=submission_timestamp(a, s))
+            for notebook in submission.notebooks:
+                for grade in notebook.grades:
+                    if grade.cell.type == "GradeCell" and grade.cell.cell_type == "code":
+                        grade.auto_score = rng.choice([0, grade.max_score])
+                        grade.needs_manual_grade = False
+                    elif rng.random() < 0.8:
+                        grade.manual_score = rng.randint(0, int(2 * grade.max_score)) / 2
+                        grade.needs_manual_grade = False
+        gb.db.commit()
+
+
+def make_gradebook(db_url, n_students, n_assignments, n_notebooks, n_cells, seed=0):
+    """Create a gradebook database at ``db_url`` for a synthetic course."""
+    with Gradebook(db_url) as gb:
+        populate_gradebook(gb, n_students, n_assignments, n_notebooks, n_cells, seed=seed)
+
+
+def _write_submission(path, nb, notebooks, timestamp):
+    os.makedirs(path)
+    for notebook_id in notebooks:
+        with open(os.path.join(path, "{}.ipynb".format(notebook_id)), "w") as fh:
+            write(nb, fh)
+    with open(os.path.join(path, "timestamp.txt"), "w") as fh:
+        fh.write(timestamp.isoformat())
+
+
+def make_course(root, n_students, n_assignments, n_notebooks, n_cells, seed=0):
+    """Create the course directory and gradebook of a synthetic course in
+    ``root``, with every submission both submitted and autograded. Returns
+    the URL of the gradebook database."""
+    nb = make_notebook(n_cells)
+    notebooks = notebook_ids(n_notebooks)
+    for a, assignment_id in enumerate(assignment_ids(n_assignments)):
+        source = os.path.join(root, "source", assignment_id)
+        os.makedirs(source)
+        for notebook_id in notebooks:
+            with open(os.path.join(source, "{}.ipynb".format(notebook_id)), "w") as fh:
+                write(nb, fh)
+        for s, student_id in enumerate(student_ids(n_students)):
+            timestamp = submission_timestamp(a, s)
+            for directory in ("submitted", "autograded"):
+                _write_submission(
+                    os.path.join(root, directory, student_id, assignment_id),
+                    nb, notebooks, timestamp)
+
+    db_url = "sqlite:///" + os.path.join(root, "gradebook.db")
+    make_gradebook(db_url, n_students, n_assignments, n_notebooks, n_cells, seed=seed)
+    return db_url
+
+
+def make_exchange(root, course_id, n_students, n_assignments, n_notebooks, n_cells):
+    """Create the released assignments and the inbound submissions of a
+    synthetic course in the exchange directory ``root``."""
+    nb = make_notebook(n_cells)
+    notebooks = notebook_ids(n_notebooks)
+    for a, assignment_id in enumerate(assignment_ids(n_assignments)):
+        outbound = os.path.join(root, course_id, "outbound", assignment_id)
+        os.makedirs(outbound)
+        for notebook_id in notebooks:
+            with open(os.path.join(outbound, "{}.ipynb".format(notebook_id)), "w") as fh:
+                write(nb, fh)
+        for s, student_id in enumerate(student_ids(n_students)):
+            timestamp = submission_timestamp(a, s)
+            submission = "{}+{}+{}+{:08x}".format(
+                student_id, assignment_id, timestamp.isoformat(), s)
+            _write_submission(
+                os.path.join(root, course_id, "inbound", submission),
+                nb, notebooks, timestamp)
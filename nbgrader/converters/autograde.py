@@ -1,16 +1,16 @@
 import os
-import shutil
 
 from textwrap import dedent
 from traitlets import Bool, List, Dict
 
+from nbconvert.exporters import Exporter
 from nbconvert.preprocessors import ClearMetadataPreprocessor
 
 from .base import BaseConverter, NbGraderException
 from ..preprocessors import (
     AssignLatePenalties, ClearOutput, DeduplicateIds, OverwriteCells, SaveAutoGrades,
     Execute, LimitOutput, OverwriteKernelspec, CheckCellMetadata, IgnorePattern)
-from ..api import Gradebook, MissingEntry
+from ..api import MissingEntry
 from .. import utils
 
 
@@ -81,11 +81,11 @@ class Autograde(BaseConverter):
             if 'id' in student:
                 del student['id']
             self.log.info("Creating/updating student with ID '%s': %s", student_id, student)
-            with Gradebook(self.coursedir.db_url, self.coursedir.course_id) as gb:
+            with self.open_gradebook() as gb:
                 gb.update_or_create_student(student_id, **student)
 
         else:
-            with Gradebook(self.coursedir.db_url, self.coursedir.course_id) as gb:
+            with self.open_gradebook() as gb:
                 try:
                     gb.find_student(student_id)
                 except MissingEntry:
@@ -94,7 +94,7 @@ class Autograde(BaseConverter):
                     raise NbGraderException(msg)
 
         # make sure the assignment exists
-        with Gradebook(self.coursedir.db_url, self.coursedir.course_id) as gb:
+        with self.open_gradebook() as gb:
             try:
                 gb.find_assignment(assignment_id)
             except MissingEntry:
@@ -105,7 +105,7 @@ class Autograde(BaseConverter):
         # try to read in a timestamp from file
         src_path = self._format_source(assignment_id, student_id)
         timestamp = self.coursedir.get_existing_timestamp(src_path)
-        with Gradebook(self.coursedir.db_url, self.coursedir.course_id) as gb:
+        with self.open_gradebook() as gb:
             if timestamp:
                 submission = gb.update_or_create_submission(
                     assignment_id, student_id, timestamp=timestamp)
@@ -130,14 +130,14 @@ class Autograde(BaseConverter):
             dest = os.path.join(dest_path, os.path.relpath(filename, source_path))
             if not os.path.exists(os.path.dirname(dest)):
                 os.makedirs(os.path.dirname(dest))
-            if os.path.exists(dest):
+            if os.path.lexists(dest):
                 os.remove(dest)
             self.log.info("Copying %s -> %s", filename, dest)
-            shutil.copy(filename, dest)
+            self.stage_file(filename, dest)
 
         # ignore notebooks that aren't in the database
         notebooks = []
-        with Gradebook(self.coursedir.db_url, self.coursedir.course_id) as gb:
+        with self.open_gradebook() as gb:
             for notebook in self.notebooks:
                 notebook_id = os.path.splitext(os.path.basename(notebook))[0]
                 try:
@@ -155,7 +155,7 @@ class Autograde(BaseConverter):
 
         # check for missing notebooks and give them a score of zero if they
         # do not exist
-        with Gradebook(self.coursedir.db_url, self.coursedir.course_id) as gb:
+        with self.open_gradebook() as gb:
             assignment = gb.find_assignment(assignment_id)
             for notebook in assignment.notebooks:
                 path = os.path.join(self.coursedir.format_path(
@@ -171,28 +171,56 @@ class Autograde(BaseConverter):
                         grade.needs_manual_grade = False
                     gb.db.commit()
 
+    def start(self) -> None:
+        # the sanitized notebook is handed straight to the autograde
+        # preprocessors, so it is never serialized in between
+        self._sanitize_exporter = Exporter(parent=self, config=self.config)
+        super(Autograde, self).start()
+
     def _init_preprocessors(self) -> None:
-        self.exporter._preprocessors = []
         if self._sanitizing:
+            exporter = self._sanitize_exporter
             preprocessors = self.sanitize_preprocessors
         else:
+            exporter = self.exporter
             preprocessors = self.autograde_preprocessors
 
+        exporter._preprocessors = []
         for pp in preprocessors:
-            self.exporter.register_preprocessor(pp)
+            exporter.register_preprocessor(pp)
 
     def convert_single_notebook(self, notebook_filename: str) -> None:
+        """
+        Sanitize and then autograde a single notebook.
+
+        The notebook is read once from the submitted directory, and written
+        once (after it has been executed and graded) to the autograded
+        directory.
+        """
         self.log.info("Sanitizing %s", notebook_filename)
         self._sanitizing = True
         self._init_preprocessors()
-        super(Autograde, self).convert_single_notebook(notebook_filename)
+        resources = self.init_single_notebook_resources(notebook_filename)
+        nb, resources = self._sanitize_exporter.from_filename(notebook_filename, resources=resources)
 
-        notebook_filename = os.path.join(self.writer.build_directory, os.path.basename(notebook_filename))
-        self.log.info("Autograding %s", notebook_filename)
         self._sanitizing = False
-        self._init_preprocessors()
         try:
+            dest_path = self._format_dest(resources['nbgrader']['assignment'], resources['nbgrader']['student'])
+            notebook_filename = os.path.join(dest_path, os.path.basename(notebook_filename))
+            self.log.info("Autograding %s", notebook_filename)
+            self._init_preprocessors()
+
+            # the notebook is executed in the directory it will be written to
+            if not os.path.exists(dest_path):
+                os.makedirs(dest_path)
+            resources = self.init_single_notebook_resources(notebook_filename)
+            resources['metadata'] = {
+                'name': os.path.splitext(os.path.basename(notebook_filename))[0],
+                'path': dest_path
+            }
+
             with utils.setenv(NBGRADER_EXECUTION='autograde'):
-                super(Autograde, self).convert_single_notebook(notebook_filename)
+                output, resources = self.exporter.from_notebook_node(nb, resources=resources)
+            self.write_single_notebook(output, resources)
         finally:
             self._sanitizing = True
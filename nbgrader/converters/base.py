@@ -1,22 +1,28 @@
 import os
 import glob
 import re
-import shutil
 import sqlalchemy
 import traceback
 import importlib
+import contextlib
+import multiprocessing
+import multiprocessing.util
+
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 
 from rapidfuzz import fuzz
 from traitlets.config import LoggingConfigurable, Config
-from traitlets import Bool, List, Dict, Integer, Instance, Type, Any
-from traitlets import default, validate
+from traitlets import Bool, List, Dict, Integer, Instance, Type, Any, Enum
+from traitlets import default, validate, TraitError
 from textwrap import dedent
 from nbconvert.exporters import Exporter, NotebookExporter
 from nbconvert.writers import FilesWriter
 
+from ..api import Gradebook, dispose_engines
 from ..coursedir import CourseDirectory
-from ..utils import find_all_files, rmtree, remove
-from ..preprocessors.execute import UnresponsiveKernelError
+from ..utils import find_all_files, rmtree, remove, stage_file
+from ..preprocessors.execute import UnresponsiveKernelError, shutdown_kernel_pools
 from ..nbgraderformat import SchemaTooOldError, SchemaTooNewError
 import typing
 from nbconvert.exporters.exporter import ResourcesDict
@@ -26,6 +32,72 @@ class NbGraderException(Exception):
     pass
 
 
+class _SharedLock(object):
+    """Wraps a process-shared lock so that it survives the deep copy that
+    nbconvert makes of the resources dictionary before preprocessing."""
+
+    def __init__(self, lock: typing.Any) -> None:
+        self._lock = lock
+
+    def __enter__(self) -> bool:
+        return self._lock.__enter__()
+
+    def __exit__(self, *args: typing.Any) -> None:
+        self._lock.__exit__(*args)
+
+    def __deepcopy__(self, memo: dict) -> "_SharedLock":
+        return self
+
+
+class _GradebookHandle(object):
+    """A gradebook that is opened the first time it is needed, and then
+    shared by a converter and its preprocessors until the end of the run.
+    Like :class:`_SharedLock`, it survives the deep copy of the resources."""
+
+    def __init__(self, db_url: str, course_id: str) -> None:
+        self.db_url = db_url
+        self.course_id = course_id
+        self._gradebook = None
+
+    def get(self) -> Gradebook:
+        if self._gradebook is None:
+            self._gradebook = Gradebook(self.db_url, self.course_id)
+        return self._gradebook
+
+    def close(self) -> None:
+        if self._gradebook is not None:
+            self._gradebook.close()
+            self._gradebook = None
+
+    def __deepcopy__(self, memo: dict) -> "_GradebookHandle":
+        return self
+
+
+# The converter that forked worker processes operate on. It is set by the
+# parent right before the worker pool is created, so that workers inherit it
+# through fork rather than having to pickle it.
+_worker_converter = None
+
+# Queue on which workers report each submission they start converting, so
+# that the parent knows which submissions were interrupted if a worker dies.
+_worker_started = None
+
+
+def _init_worker() -> None:
+    # each worker opens its own connection to the gradebook and starts its own
+    # spare kernels, which must be closed when the worker exits
+    multiprocessing.util.Finalize(None, dispose_engines, exitpriority=9)
+    multiprocessing.util.Finalize(None, _worker_converter._gradebook.close, exitpriority=10)
+    multiprocessing.util.Finalize(None, shutdown_kernel_pools, exitpriority=10)
+
+
+def _convert_assignment_in_worker(assignment: str) -> typing.List[typing.Tuple[str, str]]:
+    _worker_started.put(assignment)
+    errors = []
+    _worker_converter.convert_single_assignment(assignment, errors)
+    return errors
+
+
 class BaseConverter(LoggingConfigurable):
 
     notebooks = List([])
@@ -71,6 +143,19 @@ class BaseConverter(LoggingConfigurable):
         """)
     )
 
+    max_workers = Integer(
+        1,
+        help=dedent(
+            """
+            The number of submissions to convert concurrently. When greater
+            than one, each submission is processed in its own worker process
+            and access to the gradebook is serialized between workers. This
+            requires the 'fork' multiprocessing start method; if it is not
+            available, submissions are converted one at a time.
+            """
+        )
+    ).tag(config=True)
+
     permissions = Integer(
         help=dedent(
             """
@@ -82,10 +167,34 @@ class BaseConverter(LoggingConfigurable):
         )
     ).tag(config=True)
 
+    staging = Enum(
+        ["copy", "reflink", "hardlink", "symlink"],
+        default_value="copy",
+        help=dedent(
+            """
+            How the files other than notebooks are staged into the output
+            directory: "copy" copies them; "reflink" makes copy-on-write
+            clones, which share their data with the original until either is
+            modified (btrfs and XFS on Linux); "hardlink" makes hardlinks to
+            the original; and "symlink" makes symlinks to it. Files that are
+            hardlinked or symlinked are the original file, so notebooks that
+            write to them change the original, and their permissions are
+            left as they are. If the filesystem does not support the chosen
+            strategy, the files are copied.
+            """
+        )
+    ).tag(config=True)
+
     @default("permissions")
     def _permissions_default(self) -> int:
         return 664 if self.coursedir.groupshared else 444
 
+    @validate('max_workers')
+    def _validate_max_workers(self, proposal):
+        if proposal['value'] < 1:
+            raise TraitError("max_workers must be at least 1")
+        return proposal['value']
+
     @validate('pre_convert_hook')
     def _validate_pre_convert_hook(self, proposal):
         value = proposal['value']
@@ -108,6 +217,12 @@ class BaseConverter(LoggingConfigurable):
 
     coursedir = Instance(CourseDirectory, allow_none=True)
 
+    # Guards access to the gradebook; replaced by a process-shared lock when
+    # submissions are converted in parallel.
+    _gradebook_lock = contextlib.nullcontext()
+
+    _gradebook = None
+
     def __init__(self, coursedir: CourseDirectory = None, **kwargs: typing.Any) -> None:
         self.coursedir = coursedir
         super(BaseConverter, self).__init__(**kwargs)
@@ -120,18 +235,40 @@ class BaseConverter(LoggingConfigurable):
         c.Exporter.default_preprocessors = []
         self.update_config(c)
 
+        # the output files that are links to their source, see stage_file
+        self._linked_files = set()
+
     def start(self) -> None:
         self.init_notebooks()
         self.writer = FilesWriter(parent=self, config=self.config)
         self.exporter = self.exporter_class(parent=self, config=self.config)
         for pp in self.preprocessors:
             self.exporter.register_preprocessor(pp)
+        self._gradebook = _GradebookHandle(self.coursedir.db_url, self.coursedir.course_id)
         currdir = os.getcwd()
         os.chdir(self.coursedir.root)
         try:
             self.convert_notebooks()
         finally:
             os.chdir(currdir)
+            self._gradebook.close()
+            dispose_engines()
+            shutdown_kernel_pools()
+
+    @contextlib.contextmanager
+    def open_gradebook(self) -> typing.Iterator[Gradebook]:
+        """Context manager giving access to the gradebook that is shared by
+        this converter and its preprocessors for the duration of the run.
+        Any transaction that is still open when the context exits is rolled
+        back, as it would be if the gradebook were closed.
+
+        """
+        with self._gradebook_lock:
+            gb = self._gradebook.get()
+            try:
+                yield gb
+            finally:
+                gb.db.rollback()
 
     @default("classes")
     def _classes_default(self):
@@ -208,6 +345,8 @@ class BaseConverter(LoggingConfigurable):
         resources['nbgrader']['assignment'] = gd['assignment_id']
         resources['nbgrader']['notebook'] = gd['notebook_id']
         resources['nbgrader']['db_url'] = self.coursedir.db_url
+        resources['nbgrader']['gradebook_lock'] = self._gradebook_lock
+        resources['nbgrader']['gradebook'] = self._gradebook
 
         return resources
 
@@ -288,6 +427,7 @@ class BaseConverter(LoggingConfigurable):
         """
         source = self._format_source(assignment_id, student_id)
         dest = self._format_dest(assignment_id, student_id)
+        self._linked_files = set()
 
         # detect other files in the source directory
         for filename in find_all_files(source, self.coursedir.ignore + ["*.ipynb"]):
@@ -295,10 +435,19 @@ class BaseConverter(LoggingConfigurable):
             path = os.path.join(dest, os.path.relpath(filename, source))
             if not os.path.exists(os.path.dirname(path)):
                 os.makedirs(os.path.dirname(path))
-            if os.path.exists(path):
+            if os.path.lexists(path):
                 remove(path)
             self.log.info("Copying %s -> %s", filename, path)
-            shutil.copy(filename, path)
+            self.stage_file(filename, path)
+
+    def stage_file(self, src: str, dest: str) -> None:
+        """Stage the file src at dest using the configured staging strategy,
+        recording dest if it was linked to src rather than copied."""
+        strategy = stage_file(src, dest, self.staging, log=self.log)
+        if strategy in ("hardlink", "symlink"):
+            self._linked_files.add(os.path.normpath(dest))
+        else:
+            self._linked_files.discard(os.path.normpath(dest))
 
     def set_permissions(self, assignment_id: str, student_id: str) -> None:
         self.log.info("Setting destination file permissions to %s", self.permissions)
@@ -306,7 +455,10 @@ class BaseConverter(LoggingConfigurable):
         permissions = int(str(self.permissions), 8)
         for dirname, _, filenames in os.walk(dest):
             for filename in filenames:
-                os.chmod(os.path.join(dirname, filename), permissions)
+                path = os.path.join(dirname, filename)
+                # leave the files linked to the originals as they are
+                if path not in self._linked_files:
+                    os.chmod(path, permissions)
             # If groupshared, set dir permissions - see comment below.
             st_mode = os.stat(dirname).st_mode
             if self.coursedir.groupshared and st_mode & 0o2770 != 0o2770:
@@ -344,110 +496,215 @@ class BaseConverter(LoggingConfigurable):
         output, resources = self.exporter.from_filename(notebook_filename, resources=resources)
         self.write_single_notebook(output, resources)
 
-    def convert_notebooks(self) -> None:
-        errors = []
+    def _handle_failure(self, gd: typing.Dict[str, str]) -> None:
+        dest = os.path.normpath(self._format_dest(gd['assignment_id'], gd['student_id']))
+        if self.coursedir.notebook_id == "*":
+            if os.path.exists(dest):
+                self.log.warning("Removing failed assignment: {}".format(dest))
+                rmtree(dest)
+        else:
+            for notebook in self.notebooks:
+                filename = os.path.splitext(os.path.basename(notebook))[0] + self.exporter.file_extension
+                path = os.path.join(dest, filename)
+                if os.path.exists(path):
+                    self.log.warning("Removing failed notebook: {}".format(path))
+                    remove(path)
 
-        def _handle_failure(gd: typing.Dict[str, str]) -> None:
-            dest = os.path.normpath(self._format_dest(gd['assignment_id'], gd['student_id']))
-            if self.coursedir.notebook_id == "*":
-                if os.path.exists(dest):
-                    self.log.warning("Removing failed assignment: {}".format(dest))
-                    rmtree(dest)
-            else:
-                for notebook in self.notebooks:
-                    filename = os.path.splitext(os.path.basename(notebook))[0] + self.exporter.file_extension
-                    path = os.path.join(dest, filename)
-                    if os.path.exists(path):
-                        self.log.warning("Removing failed notebook: {}".format(path))
-                        remove(path)
+    def _parse_assignment_path(self, assignment: str) -> typing.Dict[str, str]:
+        regexp = self._format_source("(?P<assignment_id>.*)", "(?P<student_id>.*)", escape=True)
+        m = re.match(regexp, assignment)
+        if m is None:
+            msg = "Could not match '%s' with regexp '%s'" % (assignment, regexp)
+            self.log.error(msg)
+            raise NbGraderException(msg)
+        return m.groupdict()
 
-        for assignment in sorted(self.assignments.keys()):
-            # initialize the list of notebooks and the exporter
-            self.notebooks = sorted(self.assignments[assignment])
+    def convert_single_assignment(self, assignment: str, errors: typing.List[typing.Tuple[str, str]]) -> None:
+        """
+        Convert all the notebooks of a single assignment (i.e. a single
+        student's submission). If the conversion fails in a way that does not
+        require aborting the whole run, the failure is cleaned up and the
+        ``(assignment_id, student_id)`` pair is appended to ``errors``.
+        """
+        # initialize the list of notebooks and the exporter
+        self.notebooks = sorted(self.assignments[assignment])
 
-            # parse out the assignment and student ids
-            regexp = self._format_source("(?P<assignment_id>.*)", "(?P<student_id>.*)", escape=True)
-            m = re.match(regexp, assignment)
-            if m is None:
-                msg = "Could not match '%s' with regexp '%s'" % (assignment, regexp)
-                self.log.error(msg)
-                raise NbGraderException(msg)
-            gd = m.groupdict()
+        # parse out the assignment and student ids
+        gd = self._parse_assignment_path(assignment)
 
-            try:
-                # determine whether we actually even want to process this submission
-                should_process = self.init_destination(gd['assignment_id'], gd['student_id'])
-                if not should_process:
-                    continue
+        try:
+            # determine whether we actually even want to process this submission
+            should_process = self.init_destination(gd['assignment_id'], gd['student_id'])
+            if not should_process:
+                return
+
+            self.run_pre_convert_hook()
+
+            # initialize the destination
+            self.init_assignment(gd['assignment_id'], gd['student_id'])
+
+            # convert all the notebooks
+            for notebook_filename in self.notebooks:
+                self.convert_single_notebook(notebook_filename)
+
+            # set assignment permissions
+            self.set_permissions(gd['assignment_id'], gd['student_id'])
+            self.run_post_convert_hook()
+
+        except UnresponsiveKernelError:
+            self.log.error(
+                "While processing assignment %s, the kernel became "
+                "unresponsive and we could not interrupt it. This probably "
+                "means that the students' code has an infinite loop that "
+                "consumes a lot of memory or something similar. nbgrader "
+                "doesn't know how to deal with this problem, so you will "
+                "have to manually edit the students' code (for example, to "
+                "just throw an error rather than enter an infinite loop), or "
+                "limit the resources of the kernel with Execute.max_memory "
+                "and Execute.max_cpu_time. ",
+                assignment)
+            errors.append((gd['assignment_id'], gd['student_id']))
+            self._handle_failure(gd)
+
+        except sqlalchemy.exc.OperationalError:
+            self._handle_failure(gd)
+            self.log.error(traceback.format_exc())
+            msg = (
+                "There was an error accessing the nbgrader database. This "
+                "may occur if you recently upgraded nbgrader. To resolve "
+                "the issue, first BACK UP your database and then run the "
+                "command `nbgrader db upgrade`."
+            )
+            self.log.error(msg)
+            raise NbGraderException(msg)
 
-                self.run_pre_convert_hook()
+        except SchemaTooOldError:
+            self._handle_failure(gd)
+            msg = (
+                "One or more notebooks in the assignment use an old version \n"
+                "of the nbgrader metadata format. Please **back up your class files \n"
+                "directory** and then update the metadata using:\n\nnbgrader update .\n"
+            )
+            self.log.error(msg)
+            raise NbGraderException(msg)
 
-                # initialize the destination
-                self.init_assignment(gd['assignment_id'], gd['student_id'])
+        except SchemaTooNewError:
+            self._handle_failure(gd)
+            msg = (
+                "One or more notebooks in the assignment use an newer version \n"
+                "of the nbgrader metadata format. Please update your version of \n"
+                "nbgrader to the latest version to be able to use this notebook.\n"
+            )
+            self.log.error(msg)
+            raise NbGraderException(msg)
 
-                # convert all the notebooks
-                for notebook_filename in self.notebooks:
-                    self.convert_single_notebook(notebook_filename)
+        except KeyboardInterrupt:
+            self._handle_failure(gd)
+            self.log.error("Canceled")
+            raise
 
-                # set assignment permissions
-                self.set_permissions(gd['assignment_id'], gd['student_id'])
-                self.run_post_convert_hook()
+        except Exception:
+            self.log.error("There was an error processing assignment: %s", assignment)
+            self.log.error(traceback.format_exc())
+            errors.append((gd['assignment_id'], gd['student_id']))
+            self._handle_failure(gd)
 
-            except UnresponsiveKernelError:
-                self.log.error(
-                    "While processing assignment %s, the kernel became "
-                    "unresponsive and we could not interrupt it. This probably "
-                    "means that the students' code has an infinite loop that "
-                    "consumes a lot of memory or something similar. nbgrader "
-                    "doesn't know how to deal with this problem, so you will "
-                    "have to manually edit the students' code (for example, to "
-                    "just throw an error rather than enter an infinite loop). ",
-                    assignment)
-                errors.append((gd['assignment_id'], gd['student_id']))
-                _handle_failure(gd)
-
-            except sqlalchemy.exc.OperationalError:
-                _handle_failure(gd)
-                self.log.error(traceback.format_exc())
-                msg = (
-                    "There was an error accessing the nbgrader database. This "
-                    "may occur if you recently upgraded nbgrader. To resolve "
-                    "the issue, first BACK UP your database and then run the "
-                    "command `nbgrader db upgrade`."
-                )
-                self.log.error(msg)
-                raise NbGraderException(msg)
-
-            except SchemaTooOldError:
-                _handle_failure(gd)
-                msg = (
-                    "One or more notebooks in the assignment use an old version \n"
-                    "of the nbgrader metadata format. Please **back up your class files \n"
-                    "directory** and then update the metadata using:\n\nnbgrader update .\n"
-                )
-                self.log.error(msg)
-                raise NbGraderException(msg)
-
-            except SchemaTooNewError:
-                _handle_failure(gd)
-                msg = (
-                    "One or more notebooks in the assignment use an newer version \n"
-                    "of the nbgrader metadata format. Please update your version of \n"
-                    "nbgrader to the latest version to be able to use this notebook.\n"
-                )
-                self.log.error(msg)
-                raise NbGraderException(msg)
-
-            except KeyboardInterrupt:
-                _handle_failure(gd)
-                self.log.error("Canceled")
-                raise
+    def _convert_in_pool(self, ctx: typing.Any, assignments: typing.List[str], max_workers: int,
+                         errors: typing.List[typing.Tuple[str, str]]) -> typing.Tuple[typing.List[str], typing.List[str]]:
+        """
+        Convert ``assignments`` in a new pool of ``max_workers`` worker
+        processes. If a worker process dies, the pool stops all of its
+        workers, so the submissions that were not converted are returned:
+        first those that had started converting, then those that had not.
+        """
+        global _worker_started
 
-            except Exception:
-                self.log.error("There was an error processing assignment: %s", assignment)
-                self.log.error(traceback.format_exc())
-                errors.append((gd['assignment_id'], gd['student_id']))
-                _handle_failure(gd)
+        # a fresh lock, in case a worker of a previous pool died holding it
+        self._gradebook_lock = _SharedLock(ctx.Lock())
+        _worker_started = ctx.SimpleQueue()
+
+        unfinished = []
+        executor = ProcessPoolExecutor(
+            max_workers=max_workers, mp_context=ctx, initializer=_init_worker)
+        try:
+            futures = [
+                (assignment, executor.submit(_convert_assignment_in_worker, assignment))
+                for assignment in assignments]
+            for assignment, future in futures:
+                try:
+                    errors.extend(future.result())
+                except BrokenProcessPool:
+                    unfinished.append(assignment)
+        except BaseException:
+            executor.shutdown(wait=True, cancel_futures=True)
+            raise
+        else:
+            executor.shutdown(wait=True)
+
+        started = set()
+        while not _worker_started.empty():
+            started.add(_worker_started.get())
+        _worker_started.close()
+        _worker_started = None
+
+        interrupted = [x for x in unfinished if x in started]
+        not_started = [x for x in unfinished if x not in started]
+        return interrupted, not_started
+
+    def _convert_assignments_parallel(self, errors: typing.List[typing.Tuple[str, str]]) -> None:
+        global _worker_converter
+
+        ctx = multiprocessing.get_context("fork")
+        _worker_converter = self
+
+        # database connections must not be shared with the forked workers
+        self._gradebook.close()
+
+        self.log.info("Converting submissions using %d worker processes", self.max_workers)
+        try:
+            pending = sorted(self.assignments.keys())
+            while len(pending) > 0:
+                interrupted, not_started = self._convert_in_pool(ctx, pending, self.max_workers, errors)
+                if len(interrupted) == 0 and len(not_started) > 0:
+                    msg = "The worker processes died before converting any submission."
+                    self.log.error(msg)
+                    raise NbGraderException(msg)
+
+                # It is not known which of the interrupted submissions made
+                # its worker die, so convert each of them again on its own.
+                for assignment in interrupted:
+                    gd = self._parse_assignment_path(assignment)
+                    self.notebooks = sorted(self.assignments[assignment])
+                    self.log.warning("Converting interrupted assignment again: %s", assignment)
+                    self._handle_failure(gd)
+                    died, not_run = self._convert_in_pool(ctx, [assignment], 1, errors)
+                    if len(died) > 0 or len(not_run) > 0:
+                        self.log.error(
+                            "The worker process died while processing assignment: %s", assignment)
+                        errors.append((gd['assignment_id'], gd['student_id']))
+                        self._handle_failure(gd)
+
+                pending = not_started
+        finally:
+            _worker_converter = None
+            self._gradebook_lock = contextlib.nullcontext()
+
+    def convert_notebooks(self) -> None:
+        errors = []
+
+        if self.max_workers > 1 and "fork" not in multiprocessing.get_all_start_methods():
+            self.log.warning(
+                "Converting submissions in parallel is not supported on this "
+                "platform, so they will be converted one at a time.")
+            parallel = False
+        else:
+            parallel = self.max_workers > 1 and len(self.assignments) > 1
+
+        if parallel:
+            self._convert_assignments_parallel(errors)
+        else:
+            for assignment in sorted(self.assignments.keys()):
+                self.convert_single_assignment(assignment, errors)
 
         if len(errors) > 0:
             for assignment_id, student_id in errors:
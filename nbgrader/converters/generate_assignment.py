@@ -4,7 +4,7 @@ from textwrap import dedent
 
 from traitlets import List, Bool, default
 
-from ..api import Gradebook, MissingEntry
+from ..api import MissingEntry
 from .base import BaseConverter, NbGraderException
 from ..preprocessors import (
     IncludeHeaderFooter,
@@ -91,7 +91,7 @@ class GenerateAssignment(BaseConverter):
         super(GenerateAssignment, self).__init__(coursedir=coursedir, **kwargs)
 
     def _clean_old_notebooks(self, assignment_id: str, student_id: str) -> None:
-        with Gradebook(self.coursedir.db_url, self.coursedir.course_id) as gb:
+        with self.open_gradebook() as gb:
             assignment = gb.find_assignment(assignment_id)
             regexp = re.escape(os.path.sep).join([
                 self._format_source("(?P<assignment_id>.*)", "(?P<student_id>.*)", escape=True),
@@ -139,11 +139,11 @@ class GenerateAssignment(BaseConverter):
                 if 'name' in assignment:
                     del assignment['name']
                 self.log.info("Updating/creating assignment '%s': %s", assignment_id, assignment)
-                with Gradebook(self.coursedir.db_url, self.coursedir.course_id) as gb:
+                with self.open_gradebook() as gb:
                     gb.update_or_create_assignment(assignment_id, **assignment)
 
             else:
-                with Gradebook(self.coursedir.db_url, self.coursedir.course_id) as gb:
+                with self.open_gradebook() as gb:
                     try:
                         gb.find_assignment(assignment_id)
                     except MissingEntry:
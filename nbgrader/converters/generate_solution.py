@@ -4,7 +4,7 @@ from textwrap import dedent
 
 from traitlets import List, Bool, default
 
-from ..api import Gradebook, MissingEntry
+from ..api import MissingEntry
 from .base import BaseConverter, NbGraderException
 from ..preprocessors import (
     IncludeHeaderFooter,
@@ -56,7 +56,7 @@ class GenerateSolution(BaseConverter):
 
     def init_assignment(self, assignment_id: str, student_id: str) -> None:
         super(GenerateSolution, self).init_assignment(assignment_id, student_id)
-        with Gradebook(self.coursedir.db_url, self.coursedir.course_id) as gb:
+        with self.open_gradebook() as gb:
             try:
                 gb.find_assignment(assignment_id)
             except MissingEntry:
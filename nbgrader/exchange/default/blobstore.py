@@ -0,0 +1,99 @@
+import os
+import shutil
+import hashlib
+import tempfile
+
+from nbgrader.utils import hash_file, reflink
+
+
+class BlobStore(object):
+    """A content-addressed store of files, used by the exchange to keep one
+    copy of identical files (such as the datasets released with an
+    assignment) rather than one copy per student.
+
+    Each file is stored once, read-only, under the SHA-256 digest of its
+    contents. Copying a file through the store hardlinks the stored file into
+    place if it is owned by the current user, and otherwise makes a
+    copy-on-write clone of it if the filesystem supports reflinks. Hardlinks
+    are never made to files owned by other users, since their owner could
+    still change them. If neither is possible, the file is copied as usual.
+
+    The directories of the store are world-writable and sticky but not
+    listable, like the inbound directory of a course, so that a stored file
+    can only be found from its contents.
+
+    Parameters
+    ----------
+    root : string
+        The directory of the store.
+    log : logging.Logger
+        The logger to report problems with the store to.
+
+    """
+
+    def __init__(self, root, log):
+        self.root = root
+        self.log = log
+
+    def path(self, digest):
+        return os.path.join(self.root, digest[:2], digest)
+
+    def digest(self, path):
+        """Returns the SHA-256 digest of the contents of the file at path."""
+        return hash_file(path, hashlib.sha256()).hexdigest()
+
+    def _ensure_directory(self, path):
+        if not os.path.isdir(path):
+            os.makedirs(path, exist_ok=True)
+            try:
+                os.chmod(path, 0o1733)
+            except PermissionError:
+                # made at the same time by another user
+                pass
+
+    def add(self, src):
+        """Store the file src, if a file with the same contents is not already
+        stored, and return the path of the stored file."""
+        blob = self.path(self.digest(src))
+        if os.path.isfile(blob):
+            return blob
+
+        self._ensure_directory(self.root)
+        self._ensure_directory(os.path.dirname(blob))
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(blob), prefix=".tmp")
+        os.close(fd)
+        try:
+            shutil.copy2(src, tmp)
+            os.chmod(tmp, 0o444)
+            if not os.path.isfile(blob):
+                os.replace(tmp, blob)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+        return blob
+
+    def copy(self, src, dest):
+        """Copy the file src to dest through the store. Returns True if dest
+        is a hardlink to the stored file, and so shares its access mode with
+        every other copy of it, and False if it is a copy of its own."""
+        try:
+            blob = self.add(src)
+        except OSError as e:
+            self.log.debug("Could not store %s in the blob store: %s", src, e)
+            shutil.copy2(src, dest)
+            return False
+
+        if os.stat(blob).st_uid == os.getuid():
+            try:
+                os.link(blob, dest)
+                return True
+            except OSError as e:
+                self.log.debug("Could not hardlink %s to %s: %s", blob, dest, e)
+
+        try:
+            reflink(blob, dest)
+        except OSError:
+            shutil.copy2(src, dest)
+        else:
+            shutil.copystat(src, dest)
+        return False
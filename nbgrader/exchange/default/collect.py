@@ -3,9 +3,12 @@ import glob
 import shutil
 import sys
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from textwrap import dedent
 import datetime
 
+from traitlets import Integer
+
 from nbgrader.exchange.abc import ExchangeCollect as ABCExchangeCollect
 from .exchange import Exchange
 
@@ -30,6 +33,17 @@ def groupby(l, key=lambda x: x):
 
 class ExchangeCollect(Exchange, ABCExchangeCollect):
 
+    copy_workers = Integer(
+        1,
+        help=dedent(
+            """
+            Number of submissions to copy at the same time. Copying several
+            submissions at once is faster when the exchange is on a network
+            filesystem.
+            """
+        )
+    ).tag(config=True)
+
     def _path_to_record(self, path):
         filename = os.path.split(path)[1]
         # Only split twice on +, giving three components. This allows usernames with +.
@@ -90,55 +104,90 @@ class ExchangeCollect(Exchange, ABCExchangeCollect):
                 self.coursedir.assignment_id,
                 self.coursedir.course_id))
 
-        for rec in self.src_records:
-            student_id = rec['username']
-            src_path = os.path.join(self.inbound_path, rec['filename'])
-
-            # Cross check the student id with the owner of the submitted directory
-            if self.check_owner and pwd is not None: # check disabled under windows
-                try:
-                    owner = pwd.getpwuid(os.stat(src_path).st_uid).pw_name
-                except KeyError:
-                    owner = "unknown id"
-                if student_id != owner:
-                    self.log.warning(dedent(
-                        """
-                        {} claims to be submitted by {} but is owned by {}; cheating attempt?
-                        you may disable this warning by unsetting the option CollectApp.check_owner
-                        """).format(src_path, student_id, owner))
-
-            dest_path = self.coursedir.format_path(self.coursedir.submitted_directory, student_id, self.coursedir.assignment_id)
-            if not os.path.exists(os.path.dirname(dest_path)):
-                os.makedirs(os.path.dirname(dest_path))
-
-            copy = False
-            updating = False
-            if os.path.isdir(dest_path):
-                existing_timestamp = self.coursedir.get_existing_timestamp(dest_path)
-                new_timestamp = rec['timestamp']
-                if self.update and (existing_timestamp is None or new_timestamp > existing_timestamp):
-                    copy = True
-                    updating = True
-                elif self.before_duedate and existing_timestamp != new_timestamp:
-                    copy = True
-                    updating = True
+        if self.copy_workers > 1 and len(self.src_records) > 1:
+            with ThreadPoolExecutor(self.copy_workers) as pool:
+                # consume the results, so that errors are raised here
+                list(pool.map(self._collect_record, self.src_records))
+        else:
+            for rec in self.src_records:
+                self._collect_record(rec)
 
-            else:
+    def _collect_record(self, rec):
+        student_id = rec['username']
+        src_path = os.path.join(self.inbound_path, rec['filename'])
+
+        # Cross check the student id with the owner of the submitted directory
+        if self.check_owner and pwd is not None: # check disabled under windows
+            try:
+                owner = pwd.getpwuid(os.stat(src_path).st_uid).pw_name
+            except KeyError:
+                owner = "unknown id"
+            if student_id != owner:
+                self.log.warning(dedent(
+                    """
+                    {} claims to be submitted by {} but is owned by {}; cheating attempt?
+                    you may disable this warning by unsetting the option CollectApp.check_owner
+                    """).format(src_path, student_id, owner))
+
+        dest_path = self.coursedir.format_path(self.coursedir.submitted_directory, student_id, self.coursedir.assignment_id)
+        os.makedirs(os.path.dirname(dest_path), exist_ok=True)
+
+        copy = False
+        updating = False
+        if os.path.isdir(dest_path):
+            existing_timestamp = self.coursedir.get_existing_timestamp(dest_path)
+            new_timestamp = rec['timestamp']
+            if self.update and (existing_timestamp is None or new_timestamp > existing_timestamp):
                 copy = True
+                updating = True
+            elif self.before_duedate and existing_timestamp != new_timestamp:
+                copy = True
+                updating = True
 
-            if copy:
-                if updating:
-                    self.log.info("Updating submission: {} {}".format(student_id, self.coursedir.assignment_id))
-                    shutil.rmtree(dest_path)
-                else:
-                    self.log.info("Collecting submission: {} {}".format(student_id, self.coursedir.assignment_id))
-                self.do_copy(src_path, dest_path)
+        else:
+            copy = True
+
+        if copy:
+            if updating:
+                self.log.info("Updating submission: {} {}".format(student_id, self.coursedir.assignment_id))
             else:
-                if self.update:
-                    self.log.info("No newer submission to collect: {} {}".format(
-                        student_id, self.coursedir.assignment_id
-                    ))
-                else:
-                    self.log.info("Submission already exists, use --update to update: {} {}".format(
-                        student_id, self.coursedir.assignment_id
-                    ))
+                self.log.info("Collecting submission: {} {}".format(student_id, self.coursedir.assignment_id))
+            self._copy_submission(rec, src_path, dest_path)
+        else:
+            if self.update:
+                self.log.info("No newer submission to collect: {} {}".format(
+                    student_id, self.coursedir.assignment_id
+                ))
+            else:
+                self.log.info("Submission already exists, use --update to update: {} {}".format(
+                    student_id, self.coursedir.assignment_id
+                ))
+
+    def _copy_submission(self, rec, src_path, dest_path):
+        """Copy the submission to a staging directory next to dest_path, and
+        move it into place once it is complete. The staging directory is kept
+        if the copy is interrupted, along with a file recording which
+        submission it is a copy of, so that collecting the same submission
+        again resumes the copy rather than starting it over."""
+        dirname, basename = os.path.split(dest_path)
+        staging_path = os.path.join(dirname, ".{}.partial".format(basename))
+        source_path = staging_path + ".source"
+
+        if os.path.isdir(staging_path):
+            source = None
+            if os.path.isfile(source_path):
+                with open(source_path, "r") as fh:
+                    source = fh.read()
+            if source == rec['filename']:
+                self.log.info("Resuming interrupted copy of {}".format(rec['filename']))
+            else:
+                shutil.rmtree(staging_path)
+
+        with open(source_path, "w") as fh:
+            fh.write(rec['filename'])
+        self.do_copy(src_path, staging_path, resume=True)
+
+        if os.path.isdir(dest_path):
+            shutil.rmtree(dest_path)
+        os.rename(staging_path, dest_path)
+        os.remove(source_path)
@@ -3,6 +3,7 @@ import datetime
 import sys
 import shutil
 import glob
+import stat
 
 from textwrap import dedent
 
@@ -13,7 +14,8 @@ from jupyter_core.paths import jupyter_data_dir
 
 from nbgrader.exchange.abc import Exchange as ABCExchange
 from nbgrader.exchange import ExchangeError
-from nbgrader.utils import check_directory, ignore_patterns, self_owned
+from nbgrader.utils import check_directory, is_ignored_entry, self_owned
+from .blobstore import BlobStore
 
 
 class Exchange(ABCExchange):
@@ -43,6 +45,24 @@ class Exchange(ABCExchange):
         )
     ).tag(config=True)
 
+    blob_store = Bool(
+        False,
+        help=dedent(
+            """
+            Whether to copy files through a content-addressed store in the
+            exchange directory, so that identical files (such as released
+            datasets, or notebooks that were not changed) are stored once and
+            hardlinked, or cloned on filesystems that support reflinks,
+            rather than copied. Hardlinked files share their contents and
+            access mode, so they must not be modified in place.
+            """
+        )
+    ).tag(config=True)
+
+    @property
+    def blobs(self):
+        return BlobStore(os.path.join(self.root, ".blobs"), self.log)
+
     def set_perms(self, dest, fileperms, dirperms):
         all_dirs = []
         for dirname, _, filenames in os.walk(dest):
@@ -84,44 +104,112 @@ class Exchange(ABCExchange):
         return total_size
 
 
-    def do_copy(self, src, dest, log=None):
+    def do_copy(self, src, dest, log=None, resume=False):
         """
         Copy the src dir to the dest dir, omitting excluded
         file/directories, non included files, and too large files, as
         specified by the options coursedir.ignore, coursedir.include
         and coursedir.max_file_size.
+
+        The size check, the ignore rules and the groupshared permissions
+        are all handled in one walk of src. If resume is True, dest may
+        already exist, and the files already copied to it (with the same
+        size and modification time as in src) are not copied again.
         """
-        dir_size = self.get_size(src)
+        plan = [("mkdir", src, dest, None)]
+        dir_size = self._plan_copy(src, dest, plan)
+        plan.append(("copystat", src, dest, os.stat(src)))
         max_dir_size = self.coursedir.max_dir_size
         if dir_size > 1000 * max_dir_size:
             self.log.error("Directory size is too big")
             raise RuntimeError(f"Directory size is too big. Size is {dir_size}, maximum size is {1000 * max_dir_size}")
 
-        shutil.copytree(src, dest,
-                        ignore=ignore_patterns(exclude=self.coursedir.ignore,
-                                               include=self.coursedir.include,
-                                               max_file_size=self.coursedir.max_file_size,
-                                               log=self.log))
-        # copytree copies access mode too - so we must add go+rw back to it if
-        # we are in groupshared.
-        if self.coursedir.groupshared:
-            for dirname, _, filenames in os.walk(dest):
-                # dirs become ug+rwx
-                st_mode = os.stat(dirname).st_mode
-                if st_mode & 0o2770 != 0o2770:
+        blobs = self.blobs if self.blob_store else None
+        errors = []
+        for action, src_path, dest_path, st in plan:
+            if action == "mkdir":
+                os.makedirs(dest_path, exist_ok=resume)
+                continue
+
+            linked = False
+            try:
+                if action == "copystat":
+                    shutil.copystat(src_path, dest_path)
+                elif resume and st is not None and self._is_copied(st, dest_path):
+                    pass
+                elif blobs is not None:
+                    linked = blobs.copy(src_path, dest_path)
+                else:
+                    shutil.copy2(src_path, dest_path)
+            except OSError as why:
+                errors.append((src_path, dest_path, str(why)))
+                continue
+
+            # copy2 and copystat copy the access mode too - so we must add
+            # go+rw back to it if we are in groupshared. Files hardlinked
+            # from the blob store are left read-only.
+            if self.coursedir.groupshared and not linked:
+                st_mode = stat.S_IMODE(st.st_mode)
+                if action == "copystat":
+                    mode, fixed_mode = 0o2770, (st_mode | 0o2770) & 0o2777
+                else:
+                    mode, fixed_mode = 0o660, (st_mode | 0o660) & 0o777
+                if st_mode & mode != mode:
                     try:
-                        os.chmod(dirname, (st_mode|0o2770) & 0o2777)
+                        os.chmod(dest_path, fixed_mode)
                     except PermissionError:
-                        self.log.warning("Could not update permissions of %s to make it groupshared", dirname)
-
-                for filename in filenames:
-                    filename = os.path.join(dirname, filename)
-                    st_mode = os.stat(filename).st_mode
-                    if st_mode & 0o660 != 0o660:
-                        try:
-                            os.chmod(filename, (st_mode|0o660) & 0o777)
-                        except PermissionError:
-                            self.log.warning("Could not update permissions of %s to make it groupshared", filename)
+                        self.log.warning("Could not update permissions of %s to make it groupshared", dest_path)
+
+        if errors:
+            raise shutil.Error(errors)
+
+    def _plan_copy(self, src, dest, plan, copied=True, counted=True):
+        """Walk the directory src, appending the actions needed to copy it to
+        dest to plan. Returns the total size of the files in src, counted
+        like :func:`get_size` does."""
+        size = 0
+        with os.scandir(src) as entries:
+            entries = sorted(entries, key=lambda x: x.name)
+
+        for entry in entries:
+            target = os.path.join(dest, entry.name)
+            ignored = not copied or is_ignored_entry(
+                entry.path, entry.is_file, lambda: entry.stat().st_size,
+                exclude=self.coursedir.ignore, include=self.coursedir.include,
+                max_file_size=self.coursedir.max_file_size, log=self.log)
+
+            if entry.is_dir():
+                # like os.walk, get_size does not follow symlinks to directories
+                counted_dir = counted and not entry.is_symlink()
+                if ignored and not counted_dir:
+                    continue
+                if not ignored:
+                    plan.append(("mkdir", entry.path, target, None))
+                size += self._plan_copy(
+                    entry.path, target, plan, copied=not ignored, counted=counted_dir)
+                if not ignored:
+                    plan.append(("copystat", entry.path, target, entry.stat()))
+            else:
+                if counted and not entry.is_symlink():
+                    size += entry.stat().st_size
+                if not ignored:
+                    try:
+                        st = entry.stat()
+                    except OSError:
+                        # a broken symlink, which fails when it is copied
+                        st = None
+                    plan.append(("copy", entry.path, target, st))
+
+        return size
+
+    def _is_copied(self, st, dest):
+        """Whether the file dest is a complete copy of the file whose stat
+        is st, made by :func:`shutil.copy2`."""
+        try:
+            dest_st = os.stat(dest)
+        except OSError:
+            return False
+        return dest_st.st_size == st.st_size and dest_st.st_mtime_ns == st.st_mtime_ns
 
     def start(self):
         if sys.platform == 'win32':
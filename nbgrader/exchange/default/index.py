@@ -0,0 +1,186 @@
+import os
+import json
+import threading
+
+from nbgrader.utils import hash_file, notebook_hash
+
+
+#: Serializes the use of the indexes shared by the threads of this process
+index_lock = threading.RLock()
+
+# The indexes loaded by this process, by path, with the stat of their file
+# when they were last loaded or saved
+_loaded = {}
+
+
+class ExchangeIndex(object):
+    """A persisted index of the exchange entries seen by ``nbgrader list``.
+
+    Directory listings are keyed by the path and modification time of the
+    directory, and the contents, checksums and notebook hashes of files are
+    keyed by the path, modification time and size of the file. An entry is
+    only recomputed when its ``stat`` changes, so listing an exchange that has
+    not changed only needs one ``stat`` call per entry.
+
+    Parameters
+    ----------
+    path : string
+        The file the index is loaded from and saved to. If empty, the index
+        is only kept in memory.
+    log : logging.Logger
+        The logger to report problems with the index file to.
+
+    """
+
+    version = 1
+
+    @classmethod
+    def load(cls, path, log):
+        """Returns the index saved at ``path``. The index is kept in memory
+        between calls, and is only read again if its file has been changed
+        by another process. If ``path`` is empty, the index is not saved, but
+        is still shared by every call in this process."""
+        with index_lock:
+            index, stat = _loaded.get(path, (None, None))
+            if index is None or (path and _file_stat(path) != stat):
+                index = cls(path, log)
+                _loaded[path] = (index, _file_stat(path))
+            index.log = log
+            return index
+
+    def __init__(self, path, log):
+        self.path = path
+        self.log = log
+        self.dirs = {}
+        self.files = {}
+        self._removed = set()
+        self._dirty = False
+
+        if self.path and os.path.isfile(self.path):
+            try:
+                with open(self.path, "r") as fh:
+                    index = json.load(fh)
+            except (OSError, ValueError):
+                self.log.warning("Could not read the exchange index %s, rebuilding it", self.path)
+            else:
+                if index.get("version") == self.version:
+                    self.dirs = index["dirs"]
+                    self.files = index["files"]
+
+    def _stat(self, path):
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        return [st.st_mtime_ns, st.st_size]
+
+    def _file(self, path):
+        """Returns the entry of the file at ``path``, which is reset if the
+        file has changed, or None if the file does not exist."""
+        stat = self._stat(path)
+        entry = self.files.get(path)
+        if stat is None:
+            if entry is not None:
+                del self.files[path]
+                self._dirty = True
+            return None
+        if entry is None or entry["stat"] != stat:
+            entry = self.files[path] = {"stat": stat}
+            self._dirty = True
+        return entry
+
+    def listdir(self, path):
+        """Returns the names of the entries of the directory ``path``, or an
+        empty list if it does not exist or cannot be read."""
+        stat = self._stat(path)
+        entry = self.dirs.get(path)
+        if entry is not None and entry["mtime"] == (stat and stat[0]):
+            return entry["names"]
+
+        try:
+            names = sorted(os.listdir(path))
+        except OSError:
+            names = None
+
+        if entry is not None:
+            removed = set(entry["names"]).difference(names or [])
+            self._removed.update(os.path.join(path, name) for name in removed)
+            del self.dirs[path]
+            self._dirty = True
+        if names is None:
+            return []
+
+        self.dirs[path] = {"mtime": stat[0], "names": names}
+        self._dirty = True
+        return names
+
+    def read(self, path):
+        """Returns the text of the file at ``path``, or None if it does not
+        exist."""
+        entry = self._file(path)
+        if entry is None:
+            return None
+        if "text" not in entry:
+            with open(path) as fh:
+                entry["text"] = fh.read()
+        return entry["text"]
+
+    def checksum(self, path):
+        """Returns the MD5 checksum of the file at ``path``, or None if it does
+        not exist."""
+        entry = self._file(path)
+        if entry is None:
+            return None
+        if "md5" not in entry:
+            entry["md5"] = hash_file(path).hexdigest()
+        return entry["md5"]
+
+    def notebook_hash(self, path, unique_key=None):
+        """Returns :func:`~nbgrader.utils.notebook_hash` of the notebook at
+        ``path`` with the given ``unique_key``."""
+        entry = self._file(path)
+        if entry is None:
+            return notebook_hash(path, unique_key)
+        hashes = entry.setdefault("hashes", {})
+        key = unique_key or ""
+        if key not in hashes:
+            hashes[key] = notebook_hash(path, unique_key)
+        return hashes[key]
+
+    def save(self):
+        """Write the index back to its file, dropping the entries below the
+        directory entries that have been removed since it was loaded."""
+        if not self.path or not self._dirty:
+            return
+
+        if self._removed:
+            prefixes = tuple(x + os.sep for x in self._removed)
+            removed = lambda k: k in self._removed or k.startswith(prefixes)
+            self.dirs = {k: v for k, v in self.dirs.items() if not removed(k)}
+            self.files = {k: v for k, v in self.files.items() if not removed(k)}
+
+        index = {"version": self.version, "dirs": self.dirs, "files": self.files}
+        tmp_path = "{}.{}.tmp".format(self.path, os.getpid())
+        try:
+            dirname = os.path.dirname(self.path)
+            if dirname and not os.path.isdir(dirname):
+                os.makedirs(dirname)
+            with open(tmp_path, "w") as fh:
+                json.dump(index, fh)
+            os.replace(tmp_path, self.path)
+        except OSError:
+            self.log.warning("Could not write the exchange index %s", self.path)
+        else:
+            self._removed = set()
+            self._dirty = False
+            with index_lock:
+                if _loaded.get(self.path, (None,))[0] is self:
+                    _loaded[self.path] = (self, _file_stat(self.path))
+
+
+def _file_stat(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size, st.st_ino)
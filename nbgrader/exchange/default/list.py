@@ -2,23 +2,52 @@ import os
 import glob
 import shutil
 import re
-import hashlib
+import fnmatch
+
+from traitlets import Unicode, default
 
 from nbgrader.exchange.abc import ExchangeList as ABCExchangeList
 from nbgrader.utils import notebook_hash, make_unique_key
 from .exchange import Exchange
-
-
-def _checksum(path):
-    m = hashlib.md5()
-    m.update(open(path, 'rb').read())
-    return m.hexdigest()
+from .index import ExchangeIndex, index_lock
 
 
 class ExchangeList(ABCExchangeList, Exchange):
 
+    index_path = Unicode(
+        help=(
+            "File in which the directory listings, feedback checksums and "
+            "notebook hashes of the exchange are cached between calls, so that "
+            "only the entries that changed are read again. Defaults to "
+            "list_index.json in the local cache directory. The index is also "
+            "kept in memory, so that repeated listings from the same process "
+            "(such as the assignment list extension) do not read it again. Set "
+            "to an empty string to only keep it in memory."
+        )
+    ).tag(config=True)
+
+    @default("index_path")
+    def _index_path_default(self):
+        return os.path.join(self.cache, "list_index.json")
+
     def init_src(self):
-        pass
+        self.index = ExchangeIndex.load(self.index_path, self.log)
+
+    def start(self):
+        # the index is shared with the other listings made by this process
+        with index_lock:
+            return super(ExchangeList, self).start()
+
+    def _glob(self, pattern):
+        """Like :func:`glob.glob`, except that the last component of the
+        pattern is matched against the cached listing of its directory."""
+        dirname, basename = os.path.split(pattern)
+        paths = []
+        for directory in glob.glob(dirname):
+            for name in self.index.listdir(directory):
+                if not name.startswith('.') and fnmatch.fnmatch(name, basename):
+                    paths.append(os.path.join(directory, name))
+        return paths
 
     def init_dest(self):
         course_id = self.coursedir.course_id if self.coursedir.course_id else '*'
@@ -32,7 +61,7 @@ class ExchangeList(ABCExchangeList, Exchange):
         else:
             pattern = os.path.join(self.root, course_id, 'outbound', '{}'.format(assignment_id))
 
-        self.assignments = sorted(glob.glob(pattern))
+        self.assignments = sorted(self._glob(pattern))
 
     def parse_assignment(self, assignment):
         if self.inbound:
@@ -97,7 +126,7 @@ class ExchangeList(ABCExchangeList, Exchange):
             if self.remove:
                 info['status'] = 'removed'
 
-            notebooks = sorted(glob.glob(os.path.join(info['path'], '*.ipynb')))
+            notebooks = sorted(self._glob(os.path.join(info['path'], '*.ipynb')))
             if not notebooks:
                 self.log.warning("No notebooks found in {}".format(info['path']))
 
@@ -121,24 +150,20 @@ class ExchangeList(ABCExchangeList, Exchange):
                     assignment_dir, 'feedback', info['timestamp'])
                 local_feedback_path = os.path.join(
                     local_feedback_dir, '{0}.html'.format(nb_info['notebook_id']))
-                has_local_feedback = os.path.isfile(local_feedback_path)
-                if has_local_feedback:
-                    local_feedback_checksum = _checksum(local_feedback_path)
-                else:
-                    local_feedback_checksum = None
+                local_feedback_checksum = self.index.checksum(local_feedback_path)
+                has_local_feedback = local_feedback_checksum is not None
 
                 # Also look to see if there is feedback available to fetch.
 
                 # Check if a secret is provided
                 # If not, fall back to using make_unique_key
                 submission_secret_path = os.path.join(path, "submission_secret.txt")
-                if os.path.isfile(submission_secret_path):
-                    with open(submission_secret_path) as fh:
-                        submission_secret = fh.read()
+                submission_secret = self.index.read(submission_secret_path)
+                if submission_secret is not None:
                     nb_hash = notebook_hash(secret=submission_secret, notebook_id=nb_info["notebook_id"])
                     exchange_feedback_path = os.path.join(
                         self.root, info['course_id'], 'feedback', '{0}.html'.format(nb_hash))
-                    has_exchange_feedback = os.path.isfile(exchange_feedback_path)
+                    exchange_feedback_checksum = self.index.checksum(exchange_feedback_path)
                 else:
                     unique_key = make_unique_key(
                         info['course_id'],
@@ -147,21 +172,17 @@ class ExchangeList(ABCExchangeList, Exchange):
                         info['student_id'],
                         info['timestamp'])
                     self.log.debug("Unique key is: {}".format(unique_key))
-                    nb_hash = notebook_hash(notebook, unique_key)
+                    nb_hash = self.index.notebook_hash(notebook, unique_key)
                     exchange_feedback_path = os.path.join(
                         self.root, info['course_id'], 'feedback', '{0}.html'.format(nb_hash))
-                    has_exchange_feedback = os.path.isfile(exchange_feedback_path)
-                    if not has_exchange_feedback:
+                    exchange_feedback_checksum = self.index.checksum(exchange_feedback_path)
+                    if exchange_feedback_checksum is None:
                         # Try looking for legacy feedback.
-                        nb_hash = notebook_hash(notebook)
+                        nb_hash = self.index.notebook_hash(notebook)
                         exchange_feedback_path = os.path.join(
                             self.root, info['course_id'], 'feedback', '{0}.html'.format(nb_hash))
-                        has_exchange_feedback = os.path.isfile(exchange_feedback_path)
-
-                if has_exchange_feedback:
-                    exchange_feedback_checksum = _checksum(exchange_feedback_path)
-                else:
-                    exchange_feedback_checksum = None
+                        exchange_feedback_checksum = self.index.checksum(exchange_feedback_path)
+                has_exchange_feedback = exchange_feedback_checksum is not None
 
                 nb_info['has_local_feedback'] = has_local_feedback
                 nb_info['has_exchange_feedback'] = has_exchange_feedback
@@ -219,6 +240,7 @@ class ExchangeList(ABCExchangeList, Exchange):
                 assignment_submissions.append(info)
             assignments = assignment_submissions
 
+        self.index.save()
         return assignments
 
     def list_files(self):
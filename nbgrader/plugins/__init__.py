@@ -1,12 +1,17 @@
 from .base import BasePlugin
 from .latesubmission import LateSubmissionPlugin
-from .export import ExportPlugin, CsvExportPlugin
+from .export import (
+    ExportPlugin, CsvExportPlugin, TableExportPlugin, NdjsonExportPlugin,
+    ArrowExportPlugin)
 from .zipcollect import ExtractorPlugin, FileNameCollectorPlugin
 
 __all__ = [
+    "ArrowExportPlugin",
     "CsvExportPlugin",
     "ExportPlugin",
     "ExtractorPlugin",
     "FileNameCollectorPlugin",
     "LateSubmissionPlugin",
+    "NdjsonExportPlugin",
+    "TableExportPlugin",
 ]
@@ -1,7 +1,15 @@
-from traitlets import Unicode, List
+import itertools
+import json
+import os
+import typing
+
+from sqlalchemy import and_, case, func, literal_column, select
+from traitlets import Enum, Integer, Unicode, List
 
 from .base import BasePlugin
-from ..api import MissingEntry, Gradebook
+from ..api import (
+    Gradebook, Assignment, Notebook, Student, SubmittedAssignment,
+    SubmittedNotebook, BaseCell, GradeCell, TaskCell, Grade)
 
 
 class ExportPlugin(BasePlugin):
@@ -77,19 +85,35 @@ class CsvExportPlugin(ExportPlugin):
         fh.write(",".join(keys) + "\n")
         fmt = ",".join(["{" + x + "}" for x in keys]) + "\n"
 
-        # Loop over each assignment in the database
-        for assignment in gradebook.assignments:
+        # Query the assignments and students once, rather than looking up
+        # each student's submission of each assignment
+        assignments = gradebook.db.query(
+            Assignment.id, Assignment.name, Assignment.duedate, Assignment.max_score)
+        students = gradebook.db.query(
+            Student.id, Student.last_name, Student.first_name, Student.email)
+        if allassignments:
+            assignments = assignments.filter(Assignment.name.in_(allassignments))
+        if allstudents:
+            students = students.filter(Student.id.in_(allstudents))
+        assignments = assignments.order_by(Assignment.duedate, Assignment.name).all()
+        students = students.order_by(Student.last_name, Student.first_name).all()
 
-            # only continue if assignment is required
-            if allassignments and assignment.name not in allassignments:
-                continue
+        # The submissions come in the same order as the assignments, so each
+        # assignment's submissions are read as the assignment is written out
+        submissions = itertools.groupby(
+            self._query_submissions(gradebook, allassignments, allstudents),
+            key=lambda x: x.assignment_id)
+        next_id, next_submissions = next(submissions, (None, []))
 
-            # Loop over each student in the database
-            for student in gradebook.students:
+        # Loop over each assignment in the database
+        for assignment in assignments:
+            assignment_submissions = {}
+            if next_id == assignment.id:
+                assignment_submissions = {x.student_id: x for x in next_submissions}
+                next_id, next_submissions = next(submissions, (None, []))
 
-                # only continue if student is required
-                if allstudents and student.id not in allstudents:
-                    continue
+            # Loop over each student in the database
+            for student in students:
 
                 # Create a dictionary that will store information 
                 # about this student's submitted assignment
@@ -102,14 +126,10 @@ class CsvExportPlugin(ExportPlugin):
                 score['email'] = student.email
                 score['max_score'] = assignment.max_score
 
-                # Try to find the submission in the database. If it
-                # doesn't exist, the `MissingEntry` exception will be
-                # raised, which means the student didn't submit 
-                # anything, so we assign them a score of zero.
-                try:
-                    submission = gradebook.find_submission(
-                        assignment.name, student.id)
-                except MissingEntry:
+                # If the student has no submission, it means the student
+                # didn't submit anything, so we assign them a score of zero.
+                submission = assignment_submissions.get(student.id)
+                if submission is None:
                     score['timestamp'] = ''
                     score['raw_score'] = 0.0
                     score['late_submission_penalty'] = 0.0
@@ -130,3 +150,340 @@ class CsvExportPlugin(ExportPlugin):
                 fh.write(fmt.format(**score))
 
         fh.close()
+
+    def _query_submissions(self, gradebook: Gradebook, allassignments: typing.List[str],
+                           allstudents: typing.List[str]) -> typing.Iterator[typing.Any]:
+        """Query the raw score and late submission penalty of every submission
+        to the exported assignments, using one aggregate query for all the
+        submissions. The rows are ordered like the assignments."""
+        scores = gradebook.db.query(
+            SubmittedNotebook.assignment_id.label("id"),
+            func.sum(Grade.score).label("score"),
+        ).join(Grade, Grade.notebook_id == SubmittedNotebook.id)\
+         .group_by(SubmittedNotebook.assignment_id)\
+         .subquery()
+
+        penalties = gradebook.db.query(
+            SubmittedNotebook.assignment_id.label("id"),
+            func.sum(SubmittedNotebook.late_submission_penalty).label("late_submission_penalty"),
+        ).group_by(SubmittedNotebook.assignment_id)\
+         .subquery()
+
+        submissions = gradebook.db.query(
+            SubmittedAssignment.assignment_id,
+            SubmittedAssignment.student_id,
+            SubmittedAssignment.timestamp,
+            func.coalesce(scores.c.score, 0.0).label("score"),
+            func.coalesce(penalties.c.late_submission_penalty, 0.0).label("late_submission_penalty"),
+        ).join(Assignment, Assignment.id == SubmittedAssignment.assignment_id)\
+         .outerjoin(scores, scores.c.id == SubmittedAssignment.id)\
+         .outerjoin(penalties, penalties.c.id == SubmittedAssignment.id)
+
+        if allassignments:
+            submissions = submissions.filter(Assignment.name.in_(allassignments))
+        if allstudents:
+            submissions = submissions.filter(SubmittedAssignment.student_id.in_(allstudents))
+
+        return submissions.order_by(Assignment.duedate, Assignment.name)
+
+
+class TableExportPlugin(ExportPlugin):
+    """Base class for exporters that write the grades as three tables: the
+    grade of every cell (``cells``), the totals of every submitted notebook
+    (``notebooks``) and the totals of every submitted assignment
+    (``assignments``). Each table is read from the database and written out
+    in batches of ``batch_size`` rows, so the memory used does not grow with
+    the size of the course.
+
+    The tables are written to the directory given by ``--to``, or to a
+    directory called ``grades`` by default. Subclasses only need to implement
+    :func:`~nbgrader.plugins.export.TableExportPlugin.write_table`.
+
+    """
+
+    batch_size = Integer(
+        10000,
+        help="Number of rows read from the database and written out at a time."
+    ).tag(config=True)
+
+    def export(self, gradebook: Gradebook) -> None:
+        if self.to == "":
+            dest = "grades"
+        else:
+            dest = self.to
+
+        # make sure studentID(s) and assignment(s) are lists of strings
+        allstudents = [str(item) for item in self.student]
+        allassignments = [str(item) for item in self.assignment]
+
+        self.log.info("Exporting grades to %s", dest)
+        if allassignments:
+            self.log.info("Exporting only assignments: %s", allassignments)
+
+        if allstudents:
+            self.log.info("Exporting only students: %s", allstudents)
+
+        if not os.path.exists(dest):
+            os.makedirs(dest)
+
+        tables = [
+            ("cells", self._cell_columns()),
+            ("notebooks", self._notebook_columns(gradebook, allassignments, allstudents)),
+            ("assignments", self._assignment_columns(gradebook, allassignments, allstudents)),
+        ]
+        for name, (columns, query) in tables:
+            if allassignments:
+                query = query.where(Assignment.name.in_(allassignments))
+            if allstudents:
+                query = query.where(SubmittedAssignment.student_id.in_(allstudents))
+
+            result = gradebook.db.execute(
+                query, execution_options={"yield_per": self.batch_size})
+            schema = [(column, column_type) for column, column_type, _ in columns]
+            self.write_table(dest, name, schema, result.partitions())
+
+    def write_table(self, dest: str, name: str,
+                    schema: typing.List[typing.Tuple[str, str]],
+                    batches: typing.Iterator[typing.Sequence[typing.Any]]) -> None:
+        """Write one of the exported tables.
+
+        This method MUST be implemented by subclasses.
+
+        Arguments
+        ---------
+        dest:
+            The directory to write the table to
+        name:
+            The name of the table, one of ``"cells"``, ``"notebooks"`` or
+            ``"assignments"``
+        schema:
+            The ``(name, type)`` of each column, where the type is one of
+            ``"string"``, ``"timestamp"``, ``"float"`` or ``"bool"``
+        batches:
+            The rows of the table, in lists of at most ``batch_size`` rows.
+            Each row is a tuple with one value per column.
+
+        """
+        raise NotImplementedError
+
+    def _cell_columns(self) -> typing.Tuple[list, typing.Any]:
+        grade_cells = GradeCell.__table__
+        task_cells = TaskCell.__table__
+        max_score = func.coalesce(grade_cells.c.max_score, task_cells.c.max_score, 0.0)
+        failed_tests = case(
+            (and_(grade_cells.c.cell_type == "code",
+                  Grade.auto_score < grade_cells.c.max_score), True),
+            else_=False)
+
+        columns = [
+            ("assignment", "string", Assignment.name),
+            ("notebook", "string", Notebook.name),
+            ("student_id", "string", SubmittedAssignment.student_id),
+            ("cell", "string", BaseCell.name),
+            ("cell_kind", "string", BaseCell.type),
+            ("cell_type", "string", func.coalesce(grade_cells.c.cell_type, task_cells.c.cell_type)),
+            ("auto_score", "float", Grade.auto_score),
+            ("manual_score", "float", Grade.manual_score),
+            ("extra_credit", "float", Grade.extra_credit),
+            ("score", "float", Grade.score),
+            ("max_score", "float", max_score),
+            ("needs_manual_grade", "bool", Grade.needs_manual_grade),
+            ("failed_tests", "bool", failed_tests),
+        ]
+
+        query = select(*[expr.label(column) for column, _, expr in columns])\
+            .select_from(Grade)\
+            .join(SubmittedNotebook, Grade.notebook_id == SubmittedNotebook.id)\
+            .join(SubmittedAssignment, SubmittedNotebook.assignment_id == SubmittedAssignment.id)\
+            .join(Notebook, SubmittedNotebook.notebook_id == Notebook.id)\
+            .join(Assignment, SubmittedAssignment.assignment_id == Assignment.id)\
+            .join(BaseCell, Grade.cell_id == BaseCell.id)\
+            .outerjoin(grade_cells, Grade.cell_id == grade_cells.c.id)\
+            .outerjoin(task_cells, Grade.cell_id == task_cells.c.id)\
+            .order_by(
+                Assignment.duedate, Assignment.name, SubmittedAssignment.student_id,
+                Notebook.name, BaseCell.name, BaseCell.type)
+
+        return columns, query
+
+    def _notebook_scores(self, gradebook: Gradebook, allassignments: typing.List[str],
+                         allstudents: typing.List[str]) -> typing.Any:
+        submitted_notebooks = select(SubmittedNotebook.id)\
+            .join(SubmittedAssignment, SubmittedNotebook.assignment_id == SubmittedAssignment.id)\
+            .join(Assignment, SubmittedAssignment.assignment_id == Assignment.id)
+        if allassignments:
+            submitted_notebooks = submitted_notebooks.where(Assignment.name.in_(allassignments))
+        if allstudents:
+            submitted_notebooks = submitted_notebooks.where(
+                SubmittedAssignment.student_id.in_(allstudents))
+        return gradebook._submitted_notebook_scores(submitted_notebooks)
+
+    def _notebook_columns(self, gradebook: Gradebook, allassignments: typing.List[str],
+                          allstudents: typing.List[str]) -> typing.Tuple[list, typing.Any]:
+        scores = self._notebook_scores(gradebook, allassignments, allstudents)
+
+        def _score(column):
+            return func.coalesce(column, 0.0)
+
+        def _flag(column):
+            return case((column, True), else_=False)
+
+        columns = [
+            ("assignment", "string", Assignment.name),
+            ("duedate", "timestamp", Assignment.duedate),
+            ("notebook", "string", Notebook.name),
+            ("student_id", "string", SubmittedAssignment.student_id),
+            ("timestamp", "timestamp", SubmittedAssignment.timestamp),
+            ("score", "float", _score(scores.c.score)),
+            ("max_score", "float", _score(scores.c.max_score)),
+            ("code_score", "float", _score(scores.c.code_score)),
+            ("max_code_score", "float", _score(scores.c.max_code_score)),
+            ("written_score", "float", _score(scores.c.written_score)),
+            ("max_written_score", "float", _score(scores.c.max_written_score)),
+            ("task_score", "float", _score(scores.c.task_score)),
+            ("max_task_score", "float", _score(scores.c.max_task_score)),
+            ("late_submission_penalty", "float", _score(SubmittedNotebook.late_submission_penalty)),
+            ("needs_manual_grade", "bool", _flag(scores.c.needs_manual_grade)),
+            ("failed_tests", "bool", _flag(scores.c.failed_tests)),
+            ("flagged", "bool", SubmittedNotebook.flagged),
+        ]
+
+        query = select(*[expr.label(column) for column, _, expr in columns])\
+            .select_from(SubmittedNotebook)\
+            .join(SubmittedAssignment, SubmittedNotebook.assignment_id == SubmittedAssignment.id)\
+            .join(Notebook, SubmittedNotebook.notebook_id == Notebook.id)\
+            .join(Assignment, SubmittedAssignment.assignment_id == Assignment.id)\
+            .outerjoin(scores, scores.c.notebook_id == SubmittedNotebook.id)\
+            .order_by(
+                Assignment.duedate, Assignment.name, SubmittedAssignment.student_id,
+                Notebook.name)
+
+        return columns, query
+
+    def _assignment_columns(self, gradebook: Gradebook, allassignments: typing.List[str],
+                            allstudents: typing.List[str]) -> typing.Tuple[list, typing.Any]:
+        scores = self._notebook_scores(gradebook, allassignments, allstudents)
+
+        def _sum(column):
+            return func.coalesce(func.sum(column), 0.0)
+
+        raw_score = _sum(scores.c.score)
+        penalty = _sum(SubmittedNotebook.late_submission_penalty)
+        score = case((raw_score > penalty, raw_score - penalty), else_=literal_column("0.0"))
+
+        keys = [
+            ("assignment", "string", Assignment.name),
+            ("duedate", "timestamp", Assignment.duedate),
+            ("student_id", "string", Student.id),
+            ("last_name", "string", Student.last_name),
+            ("first_name", "string", Student.first_name),
+            ("email", "string", Student.email),
+            ("timestamp", "timestamp", SubmittedAssignment.timestamp),
+        ]
+        columns = keys + [
+            ("raw_score", "float", raw_score),
+            ("late_submission_penalty", "float", penalty),
+            ("score", "float", score),
+            ("max_score", "float", _sum(scores.c.max_score)),
+            ("code_score", "float", _sum(scores.c.code_score)),
+            ("max_code_score", "float", _sum(scores.c.max_code_score)),
+            ("written_score", "float", _sum(scores.c.written_score)),
+            ("max_written_score", "float", _sum(scores.c.max_written_score)),
+            ("task_score", "float", _sum(scores.c.task_score)),
+            ("max_task_score", "float", _sum(scores.c.max_task_score)),
+            ("needs_manual_grade", "bool",
+             func.max(case((scores.c.needs_manual_grade, 1), else_=0)) == 1),
+        ]
+
+        query = select(*[expr.label(column) for column, _, expr in columns])\
+            .select_from(SubmittedAssignment)\
+            .join(Assignment, SubmittedAssignment.assignment_id == Assignment.id)\
+            .join(Student, SubmittedAssignment.student_id == Student.id)\
+            .join(SubmittedNotebook, SubmittedNotebook.assignment_id == SubmittedAssignment.id)\
+            .outerjoin(scores, scores.c.notebook_id == SubmittedNotebook.id)\
+            .group_by(SubmittedAssignment.id, *[expr for _, _, expr in keys])\
+            .order_by(Assignment.duedate, Assignment.name, Student.id)
+
+        return columns, query
+
+
+class NdjsonExportPlugin(TableExportPlugin):
+    """Exporter that writes the grades as newline-delimited JSON, with one
+    file per table (``cells.ndjson``, ``notebooks.ndjson`` and
+    ``assignments.ndjson``) and one JSON object per row."""
+
+    def write_table(self, dest: str, name: str,
+                    schema: typing.List[typing.Tuple[str, str]],
+                    batches: typing.Iterator[typing.Sequence[typing.Any]]) -> None:
+        path = os.path.join(dest, "{}.ndjson".format(name))
+        self.log.info("Writing %s", path)
+
+        keys = [column for column, _ in schema]
+        timestamps = [i for i, (_, column_type) in enumerate(schema) if column_type == "timestamp"]
+        with open(path, "w") as fh:
+            for batch in batches:
+                lines = []
+                for row in batch:
+                    row = list(row)
+                    for i in timestamps:
+                        if row[i] is not None:
+                            row[i] = row[i].isoformat()
+                    lines.append(json.dumps(dict(zip(keys, row))) + "\n")
+                fh.write("".join(lines))
+
+
+class ArrowExportPlugin(NdjsonExportPlugin):
+    """Exporter that writes the grades as Parquet or Arrow IPC files, with
+    one file per table and one record batch per ``batch_size`` rows. This
+    requires ``pyarrow``; if it is not installed, the grades are written as
+    newline-delimited JSON instead (see
+    :class:`~nbgrader.plugins.export.NdjsonExportPlugin`)."""
+
+    format = Enum(
+        ["parquet", "arrow"],
+        default_value="parquet",
+        help="The file format to write: Parquet, or the Arrow IPC file format."
+    ).tag(config=True)
+
+    def export(self, gradebook: Gradebook) -> None:
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            self.log.warning("pyarrow is not installed, exporting grades as NDJSON instead")
+            self._pyarrow = False
+        else:
+            self._pyarrow = True
+
+        super(ArrowExportPlugin, self).export(gradebook)
+
+    def write_table(self, dest: str, name: str,
+                    schema: typing.List[typing.Tuple[str, str]],
+                    batches: typing.Iterator[typing.Sequence[typing.Any]]) -> None:
+        if not self._pyarrow:
+            super(ArrowExportPlugin, self).write_table(dest, name, schema, batches)
+            return
+
+        import pyarrow as pa
+        types = {
+            "string": pa.string(),
+            "timestamp": pa.timestamp("us"),
+            "float": pa.float64(),
+            "bool": pa.bool_(),
+        }
+        arrow_schema = pa.schema([(column, types[column_type]) for column, column_type in schema])
+
+        path = os.path.join(dest, "{}.{}".format(name, self.format))
+        self.log.info("Writing %s", path)
+
+        if self.format == "parquet":
+            import pyarrow.parquet as pq
+            writer = pq.ParquetWriter(path, arrow_schema)
+        else:
+            writer = pa.ipc.new_file(path, arrow_schema)
+
+        with writer:
+            for batch in batches:
+                arrays = [
+                    pa.array([row[i] for row in batch], type=field.type)
+                    for i, field in enumerate(arrow_schema)]
+                writer.write_batch(pa.RecordBatch.from_arrays(arrays, schema=arrow_schema))
@@ -1,8 +1,46 @@
+import contextlib
+
 from nbconvert.preprocessors import Preprocessor
+from nbconvert.exporters.exporter import ResourcesDict
 from traitlets import List, Unicode, Bool
+import typing
+
+from ..api import Gradebook
 
 class NbGraderPreprocessor(Preprocessor):
 
     default_language = Unicode('ipython')
     display_data_priority = List(['text/html', 'application/pdf', 'text/latex', 'image/svg+xml', 'image/png', 'image/jpeg', 'text/plain'])
     enabled = Bool(True, help="Whether to use this preprocessor when running nbgrader").tag(config=True)
+
+    def gradebook_lock(self, resources: ResourcesDict) -> typing.ContextManager:
+        """Returns the lock that must be held while accessing the gradebook.
+        When the converter processes several submissions in parallel, this
+        is shared between all of the worker processes; otherwise it does
+        nothing.
+
+        """
+        lock = resources.get('nbgrader', {}).get('gradebook_lock', None)
+        if lock is None:
+            return contextlib.nullcontext()
+        return lock
+
+    @contextlib.contextmanager
+    def open_gradebook(self, resources: ResourcesDict) -> typing.Iterator[Gradebook]:
+        """Context manager giving access to the gradebook while holding the
+        gradebook lock. If the converter shares its gradebook through the
+        resources, that one is used; otherwise a new connection is opened
+        and closed again afterwards.
+
+        """
+        handle = resources.get('nbgrader', {}).get('gradebook', None)
+        with self.gradebook_lock(resources):
+            if handle is None:
+                with Gradebook(resources['nbgrader']['db_url']) as gb:
+                    yield gb
+            else:
+                gb = handle.get()
+                try:
+                    yield gb
+                finally:
+                    gb.db.rollback()
@@ -1,18 +1,255 @@
+import collections
+import os
+import time
+import uuid
+import functools
+import multiprocessing.util
+
+try:
+    import resource
+except ImportError:  # pragma: no cover
+    resource = None
+
 from nbconvert.preprocessors import ExecutePreprocessor, CellExecutionError
-from traitlets import Bool, List, Dict, Integer, validate, TraitError
+from nbclient.exceptions import DeadKernelError
+from nbclient.util import run_sync
+from traitlets import Bool, List, Dict, Integer, Unicode, validate, TraitError
 from textwrap import dedent
 
 from . import NbGraderPreprocessor
+from .limitoutput import LimitOutput, OutputBudget
 from nbconvert.exporters.exporter import ResourcesDict
 from nbformat.notebooknode import NotebookNode
 from jupyter_client.manager import AsyncKernelManager
 from typing import Any, Optional, Tuple
+import typing
 
 
 class UnresponsiveKernelError(Exception):
     pass
 
 
+def _limit_process(rlimits: typing.List[typing.Tuple[int, int, int]], cgroup: str) -> None:
+    """Runs in the kernel process before it starts, to move it into its cgroup
+    and set its resource limits."""
+    if cgroup:
+        with open(os.path.join(cgroup, "cgroup.procs"), "w") as fh:
+            fh.write("0")
+    for limit, soft, hard in rlimits:
+        current = resource.getrlimit(limit)[1]
+        if current != resource.RLIM_INFINITY:
+            soft, hard = min(soft, current), min(hard, current)
+        resource.setrlimit(limit, (soft, hard))
+
+
+def _read(path: str) -> Optional[str]:
+    try:
+        with open(path) as fh:
+            return fh.read()
+    except OSError:
+        return None
+
+
+class KernelLimits(object):
+    """The resource limits of kernel processes, and the resources they have
+    used.
+
+    The limits are set with ``setrlimit`` in the kernel process before it
+    starts. If ``cgroup_parent`` is a cgroup v2 directory that the current
+    user may write to, each kernel is also put into a cgroup of its own below
+    it, which bounds the memory and number of processes of the kernel and of
+    every process it starts, and keeps track of the resources they use.
+
+    Limits of zero are not applied.
+
+    """
+
+    def __init__(self, memory: int = 0, cpu_time: int = 0, open_files: int = 0,
+                 processes: int = 0, cgroup_parent: str = "", log: Any = None) -> None:
+        self.memory = memory
+        self.cpu_time = cpu_time
+        self.open_files = open_files
+        self.processes = processes
+        self.cgroup_parent = cgroup_parent
+        self.log = log
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.memory or self.cpu_time or self.open_files or self.processes)
+
+    @property
+    def key(self) -> typing.Tuple:
+        return (self.memory, self.cpu_time, self.open_files, self.processes, self.cgroup_parent)
+
+    def _rlimits(self) -> typing.List[typing.Tuple[int, int, int]]:
+        rlimits = []
+        if self.memory:
+            rlimits.append((resource.RLIMIT_AS, self.memory, self.memory))
+        if self.cpu_time:
+            # SIGXCPU at the limit, and SIGKILL if that is ignored
+            rlimits.append((resource.RLIMIT_CPU, self.cpu_time, self.cpu_time + 1))
+        if self.open_files:
+            rlimits.append((resource.RLIMIT_NOFILE, self.open_files, self.open_files))
+        if self.processes:
+            rlimits.append((resource.RLIMIT_NPROC, self.processes, self.processes))
+        return rlimits
+
+    def _make_cgroup(self) -> str:
+        if not self.cgroup_parent:
+            return ""
+        cgroup = os.path.join(self.cgroup_parent, "nbgrader-kernel-{}".format(uuid.uuid4().hex))
+        try:
+            os.mkdir(cgroup)
+            if self.memory:
+                with open(os.path.join(cgroup, "memory.max"), "w") as fh:
+                    fh.write(str(self.memory))
+                if os.path.exists(os.path.join(cgroup, "memory.swap.max")):
+                    with open(os.path.join(cgroup, "memory.swap.max"), "w") as fh:
+                        fh.write("0")
+            if self.processes:
+                with open(os.path.join(cgroup, "pids.max"), "w") as fh:
+                    fh.write(str(self.processes))
+        except OSError as e:
+            if self.log:
+                self.log.warning("Could not create the cgroup %s for the kernel: %s", cgroup, e)
+            self._remove_cgroup(cgroup)
+            return ""
+        return cgroup
+
+    def _remove_cgroup(self, cgroup: str) -> None:
+        # stop any process the kernel left behind, since a cgroup can only be
+        # removed once it is empty
+        try:
+            with open(os.path.join(cgroup, "cgroup.kill"), "w") as fh:
+                fh.write("1")
+        except OSError:
+            pass
+        for _ in range(10):
+            try:
+                os.rmdir(cgroup)
+                return
+            except FileNotFoundError:
+                return
+            except OSError:
+                time.sleep(0.1)
+        if self.log:
+            self.log.warning("Could not remove the cgroup %s of the kernel", cgroup)
+
+    def popen_kwargs(self, km: AsyncKernelManager) -> typing.Dict[str, Any]:
+        """The keyword arguments of :meth:`AsyncKernelManager.start_kernel`
+        that start the kernel of ``km`` with these limits."""
+        if not (self.enabled or self.cgroup_parent):
+            return {}
+        if resource is None:
+            if self.log:
+                self.log.warning("Kernel resource limits are not supported on this platform")
+            return {}
+        km.nbgrader_cgroup = self._make_cgroup()
+        return {"preexec_fn": functools.partial(_limit_process, self._rlimits(), km.nbgrader_cgroup)}
+
+    def usage(self, km: AsyncKernelManager) -> typing.Dict[str, Optional[float]]:
+        """The peak memory, in bytes, and CPU time, in seconds, used by the
+        kernel of ``km``, if they are known. This must be called before the
+        kernel is shut down, unless it has a cgroup."""
+        usage = {"max_memory": None, "cpu_time": None}
+        cgroup = getattr(km, "nbgrader_cgroup", "")
+        if cgroup:
+            peak = _read(os.path.join(cgroup, "memory.peak"))
+            if peak:
+                usage["max_memory"] = int(peak)
+            for line in (_read(os.path.join(cgroup, "cpu.stat")) or "").splitlines():
+                if line.startswith("usage_usec "):
+                    usage["cpu_time"] = int(line.split()[1]) / 1e6
+            return usage
+
+        pid = getattr(km.provisioner, "pid", None) if km.provisioner else None
+        if pid is None:
+            return usage
+        for line in (_read("/proc/{}/status".format(pid)) or "").splitlines():
+            if line.startswith("VmHWM:"):
+                usage["max_memory"] = int(line.split()[1]) * 1024
+        stat = _read("/proc/{}/stat".format(pid))
+        if stat:
+            # the fields after the name of the command, which may have spaces
+            fields = stat.rsplit(")", 1)[1].split()
+            ticks = sum(int(x) for x in fields[11:15])
+            usage["cpu_time"] = ticks / os.sysconf("SC_CLK_TCK")
+        return usage
+
+    def release(self, km: AsyncKernelManager) -> None:
+        """Removes the cgroup of the kernel of ``km``, once it has stopped."""
+        cgroup = getattr(km, "nbgrader_cgroup", "")
+        if cgroup:
+            self._remove_cgroup(cgroup)
+            km.nbgrader_cgroup = ""
+
+
+class KernelPool(object):
+    """A set of kernels that have been started ahead of time, so that they
+    have finished booting (and importing any warm-up modules) by the time a
+    notebook needs to be executed. Each kernel is handed out exactly once and
+    is shut down after use, so submissions never share a kernel.
+
+    """
+
+    def __init__(self, kernel_name: str, extra_arguments: typing.List[str], size: int, config: Any = None,
+                 limits: Optional[KernelLimits] = None) -> None:
+        self.kernel_name = kernel_name
+        self.extra_arguments = extra_arguments
+        self.size = size
+        self.config = config
+        self.limits = limits or KernelLimits()
+        self._spares = collections.deque()
+
+    def _start_kernel(self) -> AsyncKernelManager:
+        km = AsyncKernelManager(kernel_name=self.kernel_name, config=self.config)
+        try:
+            run_sync(km.start_kernel)(extra_arguments=self.extra_arguments, **self.limits.popen_kwargs(km))
+        except Exception:
+            self.limits.release(km)
+            raise
+        return km
+
+    def _fill(self) -> None:
+        while len(self._spares) < self.size:
+            self._spares.append(self._start_kernel())
+
+    def acquire(self) -> AsyncKernelManager:
+        """Take a started kernel out of the pool, and refill the pool before
+        returning it. Refilling waits until the replacement kernel process
+        has been launched, but not until it has finished booting."""
+        km = None
+        while km is None and self._spares:
+            km = self._spares.popleft()
+            if not run_sync(km.is_alive)():
+                run_sync(km.cleanup_resources)()
+                self.limits.release(km)
+                km = None
+        if km is None:
+            km = self._start_kernel()
+        self._fill()
+        return km
+
+    def shutdown(self) -> None:
+        while self._spares:
+            km = self._spares.popleft()
+            try:
+                run_sync(km.shutdown_kernel)(now=True)
+            except Exception:
+                pass
+            self.limits.release(km)
+
+
+_kernel_pools = {}  # type: typing.Dict[typing.Tuple, KernelPool]
+
+
+def shutdown_kernel_pools() -> None:
+    """Shut down all spare kernels that have been started by this process."""
+    while _kernel_pools:
+        _, pool = _kernel_pools.popitem()
+        pool.shutdown()
+
+
 class Execute(NbGraderPreprocessor, ExecutePreprocessor):
 
     timeout = Integer(
@@ -68,11 +305,140 @@ class Execute(NbGraderPreprocessor, ExecutePreprocessor):
         """)
     ).tag(config=True)
 
+    kernel_pool_size = Integer(0, help=dedent(
+        """
+        The number of Python kernels to keep started ahead of time. When this
+        is greater than zero, notebooks are executed in a kernel that has
+        already booted, and a replacement is launched each time a kernel is
+        taken from the pool. Every kernel is still only used for a single
+        notebook. Spare kernels are shut down at the end of each ``nbgrader``
+        command. Only applies to IPython kernels.
+        """)
+    ).tag(config=True)
+
+    kernel_pool_imports = List(Unicode(), help=dedent(
+        """
+        Modules to import in pooled kernels while they are waiting to be used
+        (e.g. ``['numpy', 'pandas', 'matplotlib.pyplot']``). This moves the
+        cost of slow imports at the top of a notebook off the critical path.
+        The modules are imported with :func:`importlib.import_module`, so no
+        name is bound in the notebook namespace: a notebook that uses a module
+        without importing it still fails with a ``NameError``.
+        """)
+    ).tag(config=True)
+
+    limit_output = Bool(False, help=dedent(
+        """
+        Apply the limits of the ``LimitOutput`` preprocessor to the outputs of
+        each cell as they are produced, rather than after the notebook has been
+        executed, so that a cell printing without end does not first fill up
+        the memory of the autograder.
+        """)
+    ).tag(config=True)
+
+    max_memory = Integer(0, help=dedent(
+        """
+        The maximum number of bytes of address space of the kernel process
+        (``RLIMIT_AS``), or 0 for no limit. This is more than the memory the
+        kernel actually uses, since it includes every mapped library, so leave
+        plenty of room. With ``cgroup_parent``, this also limits the memory
+        of the kernel and of the processes it starts. Code that goes over the
+        limit gets a ``MemoryError``, or the kernel is killed. Only applies on
+        Unix.
+        """)
+    ).tag(config=True)
+
+    max_cpu_time = Integer(0, help=dedent(
+        """
+        The maximum number of seconds of CPU time of the kernel process
+        (``RLIMIT_CPU``), including the time it takes to start, or 0 for no
+        limit. The kernel is killed when it goes over the limit. Only applies
+        on Unix.
+        """)
+    ).tag(config=True)
+
+    max_open_files = Integer(0, help=dedent(
+        """
+        The maximum number of files the kernel process may have open at once
+        (``RLIMIT_NOFILE``), or 0 for no limit. Only applies on Unix.
+        """)
+    ).tag(config=True)
+
+    max_processes = Integer(0, help=dedent(
+        """
+        The maximum number of processes (``RLIMIT_NPROC``), or 0 for no limit.
+        Note that this counts every process of the user running nbgrader, not
+        only the ones of the kernel, unless ``cgroup_parent`` is set, in which
+        case the processes of each kernel are limited on their own. Only
+        applies on Unix.
+        """)
+    ).tag(config=True)
+
+    cgroup_parent = Unicode("", help=dedent(
+        """
+        A cgroup v2 directory (e.g. a systemd delegated cgroup below
+        ``/sys/fs/cgroup``) that the user running nbgrader may create cgroups
+        in, with the ``memory`` and ``pids`` controllers enabled. If set, each
+        kernel runs in a cgroup of its own below it, which applies
+        ``max_memory`` and ``max_processes`` to the kernel and every process
+        it starts, and records the memory and CPU time they use.
+        """)
+    ).tag(config=True)
+
+    @validate('kernel_pool_size')
+    def _validate_kernel_pool_size(self, proposal):
+        if proposal['value'] < 0:
+            raise TraitError("kernel_pool_size must not be negative")
+        return proposal['value']
+
     def __init__(self, *args, **kwargs):
         # nbconvert < 7.3.1 used the sync version of this, which doesn't work for us.
         kwargs.setdefault('kernel_manager_class', AsyncKernelManager)
         super().__init__(*args, **kwargs)
 
+    @property
+    def limits(self) -> KernelLimits:
+        return KernelLimits(
+            memory=self.max_memory,
+            cpu_time=self.max_cpu_time,
+            open_files=self.max_open_files,
+            processes=self.max_processes,
+            cgroup_parent=self.cgroup_parent,
+            log=self.log)
+
+    def _kernel_error(self, evalue: str) -> NotebookNode:
+        error_output = NotebookNode(output_type='error')
+        error_output.ename = "DeadKernelError"
+        error_output.evalue = evalue
+        error_output.traceback = ["\x1b[0;31mDeadKernelError\x1b[0m: " + evalue]
+        return error_output
+
+    async def async_execute_cell(self, cell, cell_index, execution_count=None, store_history=True):
+        if not self.limits.enabled:
+            return await super().async_execute_cell(
+                cell, cell_index, execution_count=execution_count, store_history=store_history)
+
+        # with resource limits, a kernel that dies is most likely to have
+        # gone over them, which fails the cells that are left rather than
+        # the whole submission
+        if getattr(self, '_kernel_died', False):
+            if cell.cell_type == 'code':
+                cell.outputs = [self._kernel_error("The kernel died before this cell was run")]
+            return cell
+        try:
+            return await super().async_execute_cell(
+                cell, cell_index, execution_count=execution_count, store_history=store_history)
+        except DeadKernelError:
+            self.log.warning("The kernel died while running cell %d, probably because it "
+                             "went over its resource limits", cell_index)
+            self._kernel_died = True
+            cell.outputs.append(self._kernel_error(
+                "The kernel died while running this cell, probably because it "
+                "went over its resource limits"))
+            return cell
+
+    execute_cell = run_sync(async_execute_cell)
+
     def on_cell_executed(self, **kwargs):
         cell = kwargs['cell']
         reply = kwargs['execute_reply']
@@ -92,3 +458,131 @@ class Execute(NbGraderPreprocessor, ExecutePreprocessor):
                     error_output.traceback = ["ERROR: An error occurred while"
                                                 " showtraceback was disabled"]
                 cell.outputs.append(error_output)
+
+    def output(self, outs: typing.List[NotebookNode], msg: typing.Dict, display_id: str, cell_index: int) -> Optional[NotebookNode]:
+        out = super().output(outs, msg, display_id, cell_index)
+        budget = getattr(self, '_output_budget', None)
+        # outputs with a display id may still be updated by their index
+        if budget is None or out is None or display_id or not outs or outs[-1] is not out:
+            return out
+
+        if cell_index != self._output_cell_index:
+            self._output_cell_index = cell_index
+            budget.start_cell()
+        elif len(outs) == 1:
+            # the earlier outputs of the cell were cleared
+            budget.clear_cell()
+        if budget.add(out) is None:
+            outs.pop()
+            return None
+        return out
+
+    def _new_output_budget(self) -> Optional[OutputBudget]:
+        if not self.limit_output:
+            return None
+        limit_output = LimitOutput(parent=self)
+        if not limit_output.enabled:
+            return None
+        return limit_output.new_budget()
+
+    def _get_kernel_pool(self, nb: NotebookNode) -> Optional[KernelPool]:
+        kernel_name = self.kernel_name or nb.metadata.get('kernelspec', {}).get('name', 'python3')
+        if kernel_name not in {'python', 'python2', 'python3'}:
+            return None
+
+        extra_arguments = list(self.extra_arguments)
+        if not any(arg.startswith('--HistoryManager.hist_file') for arg in extra_arguments):
+            extra_arguments.append('--HistoryManager.hist_file={}'.format(self.ipython_hist_file))
+        for module in self.kernel_pool_imports:
+            extra_arguments.append(
+                "--IPKernelApp.exec_lines=import importlib as _nbgrader_importlib; "
+                "_nbgrader_importlib.import_module({!r}); del _nbgrader_importlib".format(module))
+
+        # kernels inherit the environment they were started in, so keep them
+        # apart from kernels started for a different kind of execution
+        key = (kernel_name, tuple(extra_arguments), self.kernel_pool_size, os.environ.get('NBGRADER_EXECUTION'),
+               self.limits.key)
+        if key not in _kernel_pools:
+            if not _kernel_pools:
+                # converters shut the pools down at the end of their run; this
+                # covers any other use of the preprocessor
+                multiprocessing.util.Finalize(None, shutdown_kernel_pools, exitpriority=10)
+            _kernel_pools[key] = KernelPool(
+                kernel_name, extra_arguments, self.kernel_pool_size, config=self.config, limits=self.limits)
+        return _kernel_pools[key]
+
+    async def async_start_new_kernel(self, **kwargs):
+        limits = self.limits
+        kwargs.update(limits.popen_kwargs(self.km))
+        try:
+            await super().async_start_new_kernel(**kwargs)
+        except Exception:
+            limits.release(self.km)
+            raise
+
+    start_new_kernel = run_sync(async_start_new_kernel)
+
+    async def _async_cleanup_kernel(self) -> None:
+        km = self.km
+        if km is not None:
+            self._record_usage(km)
+        try:
+            await super()._async_cleanup_kernel()
+        finally:
+            if km is not None:
+                self.limits.release(km)
+
+    _cleanup_kernel = run_sync(_async_cleanup_kernel)
+
+    def _record_usage(self, km: AsyncKernelManager) -> None:
+        usage = self.limits.usage(km)
+        self._kernel_usage = usage
+        if usage['max_memory'] is not None or usage['cpu_time'] is not None:
+            self.log.info(
+                "The kernel used %s MB of memory at most and %s seconds of CPU time",
+                "?" if usage['max_memory'] is None else "%.1f" % (usage['max_memory'] / 1e6),
+                "?" if usage['cpu_time'] is None else "%.2f" % usage['cpu_time'])
+
+    async def async_start_new_kernel_client(self):
+        kc = await super().async_start_new_kernel_client()
+        if not self.owns_km:
+            # pooled kernels were started before we knew where the notebook
+            # lives, so move them into the notebook's directory
+            path = self.resources.get('metadata', {}).get('path') or None
+            if path:
+                code = "import os as _nbgrader_os; _nbgrader_os.chdir({!r}); del _nbgrader_os".format(
+                    os.path.abspath(path))
+                await self.async_wait_for_reply(kc.execute(code, silent=True, store_history=False))
+        return kc
+
+    start_new_kernel_client = run_sync(async_start_new_kernel_client)
+
+    def preprocess(self, nb: NotebookNode, resources: ResourcesDict = None, km: Optional[AsyncKernelManager] = None) -> Tuple[NotebookNode, ResourcesDict]:
+        self._output_budget = self._new_output_budget()
+        self._output_cell_index = None
+        self._kernel_died = False
+        self._kernel_usage = None
+        nb, resources = self._preprocess(nb, resources, km=km)
+        if self._kernel_usage and any(x is not None for x in self._kernel_usage.values()) and resources is not None:
+            resources.setdefault('nbgrader', {})['kernel_usage'] = self._kernel_usage
+        return nb, resources
+
+    def _preprocess(self, nb: NotebookNode, resources: ResourcesDict = None, km: Optional[AsyncKernelManager] = None) -> Tuple[NotebookNode, ResourcesDict]:
+        pool = None
+        if km is None and self.kernel_pool_size > 0:
+            pool = self._get_kernel_pool(nb)
+        if pool is None:
+            return super().preprocess(nb, resources, km=km)
+
+        km = pool.acquire()
+        try:
+            return super().preprocess(nb, resources, km=km)
+        finally:
+            # we don't own the kernel manager, so nbclient leaves the kernel
+            # running; it must never be reused for another notebook
+            if self.km is not None:
+                self._cleanup_kernel()
+            else:
+                self._record_usage(km)
+                run_sync(km.shutdown_kernel)(now=True)
+                self.limits.release(km)
@@ -1,7 +1,7 @@
 from traitlets import Instance
 from traitlets import Type
 
-from ..api import Gradebook, SubmittedNotebook
+from ..api import SubmittedNotebook
 from ..plugins import BasePlugin
 from ..plugins import LateSubmissionPlugin
 from . import NbGraderPreprocessor
@@ -47,9 +47,7 @@ class AssignLatePenalties(NbGraderPreprocessor):
         self.init_plugin()
 
         # connect to the database
-        self.gradebook = Gradebook(self.db_url)
-
-        with self.gradebook:
+        with self.open_gradebook(resources) as self.gradebook:
             # process the late submissions
             nb, resources = super(AssignLatePenalties, self).preprocess(nb, resources)
             assignment = self.gradebook.find_submission(
@@ -1,9 +1,179 @@
+import json
+
 from . import NbGraderPreprocessor
 
 from traitlets import Integer
 from nbformat.notebooknode import NotebookNode
 from nbconvert.exporters.exporter import ResourcesDict
-from typing import Tuple
+from typing import Any, Optional, Tuple
+
+
+TRUNCATED = "... Output truncated ..."
+
+
+def _text_size(text: str) -> int:
+    """The number of bytes of ``text`` encoded as UTF-8."""
+    if text.isascii():
+        return len(text)
+    return len(text.encode("utf-8"))
+
+
+def _value_size(value: Any) -> int:
+    if isinstance(value, str):
+        return _text_size(value)
+    if isinstance(value, list):
+        return sum(_value_size(x) for x in value)
+    return _text_size(json.dumps(value))
+
+
+def _head_lines(text: str, n: int) -> str:
+    """The first ``n`` lines of ``text``, without the last newline."""
+    end = -1
+    for _ in range(n):
+        end = text.find("\n", end + 1)
+        if end == -1:
+            return text
+    return text[:max(end, 0)]
+
+
+def _head_bytes(text: str, n: int) -> str:
+    """The longest start of ``text`` that is at most ``n`` bytes long."""
+    if text.isascii():
+        return text[:n]
+    return text.encode("utf-8")[:n].decode("utf-8", errors="ignore")
+
+
+def output_size(output: NotebookNode) -> int:
+    """The number of bytes of the contents of the output."""
+    if output.output_type == "stream":
+        return _text_size(output.text)
+    if output.output_type == "error":
+        return _value_size(output.traceback)
+    return sum(_value_size(x) for x in output.get("data", {}).values())
+
+
+class OutputBudget(object):
+    """Limits the lines of stream output of each cell, and the size of the
+    outputs of each cell and of the whole notebook, as the outputs are added
+    one after the other.
+
+    Error outputs are always kept, and counted. The stream outputs and rich
+    outputs that go over a limit are cut short with a marker, and the ones
+    after that are dropped. Since an error on stderr means the cell gets no
+    credit, the first stderr output that is dropped is still replaced by a
+    marker.
+
+    Parameters
+    ----------
+    max_lines : int
+        The maximum number of lines of stream output of a cell, or -1
+    max_bytes : int
+        The maximum number of bytes of output of a cell, or -1
+    max_notebook_bytes : int
+        The maximum number of bytes of output of the notebook, or -1
+
+    """
+
+    def __init__(self, max_lines: int, max_bytes: int, max_notebook_bytes: int) -> None:
+        self.max_lines = max_lines
+        self.max_bytes = max_bytes
+        self.max_notebook_bytes = max_notebook_bytes
+        self.notebook_bytes = 0
+        self.start_cell()
+
+    def start_cell(self) -> None:
+        self.lines = 0
+        self.bytes = 0
+        self.truncated = set()
+
+    def clear_cell(self) -> None:
+        """Forget the outputs of the cell so far, which have been cleared."""
+        self.notebook_bytes -= self.bytes
+        self.start_cell()
+
+    def _remaining(self) -> Optional[int]:
+        remaining = []
+        if self.max_bytes != -1:
+            remaining.append(self.max_bytes - self.bytes)
+        if self.max_notebook_bytes != -1:
+            remaining.append(self.max_notebook_bytes - self.notebook_bytes)
+        return max(min(remaining), 0) if remaining else None
+
+    def _count(self, size: int) -> None:
+        self.bytes += size
+        self.notebook_bytes += size
+
+    def _marker(self, kind: str) -> bool:
+        """Whether a marker should be added for a dropped output of this kind,
+        which is only the case for the first one."""
+        if kind in self.truncated:
+            return False
+        self.truncated.add(kind)
+        return True
+
+    def add(self, output: NotebookNode) -> Optional[NotebookNode]:
+        """Returns the output, cut short if it goes over a limit, or None if
+        it should be dropped."""
+        if output.output_type == "error":
+            self._count(output_size(output))
+            return output
+        if output.output_type == "stream":
+            return self._add_stream(output)
+        return self._add_rich(output)
+
+    def _add_stream(self, output: NotebookNode) -> Optional[NotebookNode]:
+        kind = "stream" if output.name != "stderr" else "stderr"
+        full = self.max_lines != -1 and self.lines >= self.max_lines
+        remaining = self._remaining()
+        if full or remaining == 0 or "stream" in self.truncated:
+            if not self._marker(kind):
+                return None
+            output.text = TRUNCATED
+            self._count(len(TRUNCATED))
+            return output
+
+        text = output.text
+        truncated = False
+        if self.max_lines != -1:
+            lines = text.count("\n") + 1
+            if self.lines + lines > self.max_lines:
+                keep = self.max_lines - self.lines - 1
+                text = _head_lines(text, keep)
+                truncated = True
+                lines = keep + 1
+            self.lines += lines
+
+        if remaining is not None and _text_size(text) > remaining:
+            text = _head_bytes(text, max(remaining - len(TRUNCATED) - 1, 0))
+            truncated = True
+
+        if truncated:
+            text = text + "\n" + TRUNCATED if text else TRUNCATED
+            self.truncated.update(("stream", kind))
+            output.text = text
+        self._count(_text_size(text))
+        return output
+
+    def _add_rich(self, output: NotebookNode) -> Optional[NotebookNode]:
+        data = output.get("data", {})
+        size = output_size(output)
+        remaining = self._remaining()
+        if remaining is None or size <= remaining:
+            self._count(size)
+            return output
+
+        # fall back on the plain text version, which is usually small, so
+        # that e.g. the value of an execute_result is kept
+        text = data.get("text/plain")
+        if text is not None and _value_size(text) <= remaining:
+            output.data = NotebookNode({"text/plain": text})
+        elif self._marker("rich") or output.output_type == "execute_result":
+            output.data = NotebookNode({"text/plain": TRUNCATED})
+        else:
+            return None
+        output.metadata = NotebookNode()
+        self._count(output_size(output))
+        return output
 
 
 class LimitOutput(NbGraderPreprocessor):
@@ -19,26 +189,43 @@ class LimitOutput(NbGraderPreprocessor):
         help="maximum number of traceback lines (-1 means no limit)"
     ).tag(config=True)
 
-    def _limit_stream_output(self, cell: NotebookNode) -> NotebookNode:
-        if self.max_lines == -1 or cell.cell_type != "code":
-            return cell
+    max_bytes = Integer(
+        10 * 1024 * 1024,
+        help=(
+            "maximum number of bytes of output of each cell, counting every "
+            "MIME type of rich outputs such as images and HTML (-1 means no "
+            "limit)"
+        )
+    ).tag(config=True)
 
-        length = 0
-        new_outputs = []
-        for output in cell.outputs:
-            if output.output_type == 'stream':
-                if length == self.max_lines:
-                    continue
+    max_notebook_bytes = Integer(
+        50 * 1024 * 1024,
+        help="maximum number of bytes of output of the notebook (-1 means no limit)"
+    ).tag(config=True)
 
-                text = output.text.split("\n")
-                if (len(text) + length) > self.max_lines:
-                    text = text[:(self.max_lines - length - 1)]
-                    text.append("... Output truncated ...")
+    _budget = None
 
-                length += len(text)
-                output.text = "\n".join(text)
+    def new_budget(self) -> OutputBudget:
+        """Returns the :class:`OutputBudget` of a notebook with the limits of
+        this preprocessor."""
+        return OutputBudget(self.max_lines, self.max_bytes, self.max_notebook_bytes)
 
-            new_outputs.append(output)
+    def preprocess(self, nb: NotebookNode, resources: ResourcesDict) -> Tuple[NotebookNode, ResourcesDict]:
+        self._budget = self.new_budget()
+        return super(LimitOutput, self).preprocess(nb, resources)
+
+    def _limit_output(self, cell: NotebookNode) -> NotebookNode:
+        if cell.cell_type != "code":
+            return cell
+
+        if self._budget is None:
+            self._budget = self.new_budget()
+        self._budget.start_cell()
+        new_outputs = []
+        for output in cell.outputs:
+            output = self._budget.add(output)
+            if output is not None:
+                new_outputs.append(output)
 
         cell.outputs = new_outputs
         return cell
@@ -64,6 +251,6 @@ class LimitOutput(NbGraderPreprocessor):
                         resources: ResourcesDict,
                         cell_index: int
                         ) -> Tuple[NotebookNode, ResourcesDict]:
-        cell = self._limit_stream_output(cell)
         cell = self._limit_traceback(cell)
+        cell = self._limit_output(cell)
         return cell, resources
@@ -1,7 +1,8 @@
 from nbformat.v4.nbbase import validate
+from sqlalchemy.orm import with_polymorphic
 
 from .. import utils
-from ..api import Gradebook, MissingEntry
+from ..api import MissingEntry, BaseCell, GradeCell, SolutionCell, TaskCell
 from . import NbGraderPreprocessor
 from ..nbgraderformat import MetadataValidator
 from nbconvert.exporters.exporter import ResourcesDict
@@ -88,9 +89,8 @@ class OverwriteCells(NbGraderPreprocessor):
         self.db_url = resources['nbgrader']['db_url']
 
         # connect to the database
-        self.gradebook = Gradebook(self.db_url)
-
-        with self.gradebook:
+        with self.open_gradebook(resources) as self.gradebook:
+            self.load_source_cells()
             nb, resources = super(OverwriteCells, self).preprocess(nb, resources)
             if self.add_missing_cells:
                 nb, resources = self.add_missing_grade_cells(nb, resources)
@@ -98,6 +98,31 @@ class OverwriteCells(NbGraderPreprocessor):
 
         return nb, resources
 
+    def load_source_cells(self) -> None:
+        """Load all the source, grade, solution and task cells of the
+        notebook from the database, so that each cell can be looked up without
+        further queries. This takes three queries, however many cells the
+        notebook has: one for the notebook, one for its source cells, and one
+        for its grade, solution and task cells together with the columns of
+        their subclass."""
+        try:
+            source_nb = self.gradebook.find_notebook(self.notebook_id, self.assignment_id)
+        except MissingEntry:
+            source_cells = []
+            base_cells = []
+        else:
+            source_cells = source_nb.source_cells
+            cell_types = with_polymorphic(BaseCell, [GradeCell, SolutionCell, TaskCell])
+            base_cells = self.gradebook.db.query(cell_types)\
+                .filter(cell_types.notebook_id == source_nb.id)\
+                .all()
+
+        self.source_cells = source_cells
+        self.source_cell_idxs = {cell.name: idx for idx, cell in enumerate(source_cells)}
+        self.grade_cells = {cell.name: cell for cell in base_cells if isinstance(cell, GradeCell)}
+        self.solution_cells = {cell.name: cell for cell in base_cells if isinstance(cell, SolutionCell)}
+        self.task_cells = {cell.name: cell for cell in base_cells if isinstance(cell, TaskCell)}
+
     def add_missing_grade_cells(self, nb: NotebookNode, resources: ResourcesDict) -> Tuple[NotebookNode, ResourcesDict]:
         """
         Add missing grade cells back to the notebook.
@@ -105,11 +130,7 @@ class OverwriteCells(NbGraderPreprocessor):
         It is assumed such a cell exists because
         presumably the grade_cell exists to grade some work in the solution cell.
         """
-        source_nb = self.gradebook.find_notebook(self.notebook_id, self.assignment_id)
-        source_cells = source_nb.source_cells
-        source_cell_ids = [cell.name for cell in source_cells]
-        grade_cells = {cell.name: cell for cell in source_nb.grade_cells}
-        solution_cell_ids = [cell.name for cell in source_nb.solution_cells]
+        source_cells = self.source_cells
 
         # track indices of solution and grade cells in the submitted notebook
         submitted_cell_idxs = dict()
@@ -122,21 +143,21 @@ class OverwriteCells(NbGraderPreprocessor):
         # So we keep track of how many we have added so far
         added_count = 0
 
-        for grade_cell_id, grade_cell in grade_cells.items():
+        for grade_cell_id, grade_cell in self.grade_cells.items():
             # If missing, find the previous solution/grade cell, and add the current cell after it.
             if grade_cell_id not in submitted_cell_idxs:
                 self.log.warning(f"Missing grade cell {grade_cell_id} encountered, adding to notebook")
-                source_cell_idx = source_cell_ids.index(grade_cell_id)
+                source_cell_idx = self.source_cell_idxs[grade_cell_id]
                 cell_to_add = source_cells[source_cell_idx]
                 cell_to_add = self.missing_cell_transform(cell_to_add, grade_cell.max_score,
-                                                          is_solution=grade_cell_id in solution_cell_ids)
+                                                          is_solution=grade_cell_id in self.solution_cells)
                 # First cell was deleted, add it to start
                 if source_cell_idx == 0:
                     nb.cells.insert(0, cell_to_add)
                     submitted_cell_idxs[grade_cell_id] = 0
                 # Deleted cell is not the first, add it after the previous solution/grade cell
                 else:
-                    prev_cell_id = source_cell_ids[source_cell_idx - 1]
+                    prev_cell_id = source_cells[source_cell_idx - 1].name
                     prev_cell_idx = submitted_cell_idxs[prev_cell_id] + added_count
                     nb.cells.insert(prev_cell_idx + 1, cell_to_add)  # +1 to add it after
                     submitted_cell_idxs[grade_cell_id] = submitted_cell_idxs[prev_cell_id]
@@ -153,14 +174,11 @@ class OverwriteCells(NbGraderPreprocessor):
         Add missing task cells back to the notebook.
         We can't figure out their original location, so they are added at the end, in their original order.
         """
-        source_nb = self.gradebook.find_notebook(self.notebook_id, self.assignment_id)
-        source_cells = source_nb.source_cells
-        source_cell_ids = [cell.name for cell in source_cells]
-        submitted_ids = [cell["metadata"]["nbgrader"]["grade_id"] for cell in nb.cells if
-                         "nbgrader" in cell["metadata"]]
-        for task_cell in source_nb.task_cells:
+        submitted_ids = {cell["metadata"]["nbgrader"]["grade_id"] for cell in nb.cells if
+                         "nbgrader" in cell["metadata"]}
+        for task_cell in self.task_cells.values():
             if task_cell.name not in submitted_ids:
-                cell_to_add = source_cells[source_cell_ids.index(task_cell.name)]
+                cell_to_add = self.source_cells[self.source_cell_idxs[task_cell.name]]
                 cell_to_add = self.missing_cell_transform(cell_to_add, task_cell.max_score, is_task=True)
                 nb.cells.append(cell_to_add)
 
@@ -195,15 +213,12 @@ class OverwriteCells(NbGraderPreprocessor):
         if grade_id is None:
             return cell, resources
 
-        try:
-            source_cell = self.gradebook.find_source_cell(
-                grade_id,
-                self.notebook_id,
-                self.assignment_id)
-        except MissingEntry:
+        source_cell_idx = self.source_cell_idxs.get(grade_id)
+        if source_cell_idx is None:
             self.log.warning("Cell '{}' does not exist in the database".format(grade_id))
             del cell.metadata.nbgrader['grade_id']
             return cell, resources
+        source_cell = self.source_cells[source_cell_idx]
 
         # check that the cell type hasn't changed
         if cell.cell_type != source_cell.cell_type:
@@ -217,10 +232,10 @@ class OverwriteCells(NbGraderPreprocessor):
 
         # if it's a grade cell, check that the max score hasn't changed
         if utils.is_grade(cell):
-            grade_cell = self.gradebook.find_graded_cell(
-                grade_id,
-                self.notebook_id,
-                self.assignment_id)
+            grade_cell = self.grade_cells.get(grade_id, self.task_cells.get(grade_id))
+            if grade_cell is None:
+                raise MissingEntry("No such grade cell: {}/{}/{}".format(
+                    self.assignment_id, self.notebook_id, grade_id))
             old_points = float(grade_cell.max_score)
             new_points = float(cell.metadata.nbgrader["points"])
 
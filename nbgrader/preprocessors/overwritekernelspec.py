@@ -1,7 +1,6 @@
 import json
 
 from . import NbGraderPreprocessor
-from ..api import Gradebook
 from nbconvert.exporters.exporter import ResourcesDict
 from nbformat.notebooknode import NotebookNode
 from typing import Tuple
@@ -14,9 +13,8 @@ class OverwriteKernelspec(NbGraderPreprocessor):
         # pull information from the resources
         notebook_id = resources['nbgrader']['notebook']
         assignment_id = resources['nbgrader']['assignment']
-        db_url = resources['nbgrader']['db_url']
 
-        with Gradebook(db_url) as gb:
+        with self.open_gradebook(resources) as gb:
             kernelspec = gb.find_notebook(notebook_id, assignment_id).kernelspec
             if kernelspec is not None:
                 kernelspec = json.loads(kernelspec)
@@ -1,5 +1,5 @@
 from .. import utils
-from ..api import Gradebook
+from ..api import MissingEntry
 from . import NbGraderPreprocessor
 from nbconvert.exporters.exporter import ResourcesDict
 from nbformat.notebooknode import NotebookNode
@@ -17,12 +17,20 @@ class SaveAutoGrades(NbGraderPreprocessor):
         self.db_url = resources['nbgrader']['db_url']
 
         # connect to the database
-        self.gradebook = Gradebook(self.db_url)
+        with self.open_gradebook(resources) as self.gradebook:
+            # load all of the grades and comments for this notebook at once,
+            # rather than looking them up cell by cell
+            self.grades = self.gradebook.find_submission_notebook_grades(
+                self.notebook_id, self.assignment_id, self.student_id)
+            self.comments = self.gradebook.find_submission_notebook_comments(
+                self.notebook_id, self.assignment_id, self.student_id)
 
-        with self.gradebook:
             # process the cells
             nb, resources = super(SaveAutoGrades, self).preprocess(nb, resources)
 
+            # save all the changes at once
+            self.gradebook.db.commit()
+
         return nb, resources
 
     def _add_score(self, cell: NotebookNode, resources: ResourcesDict) -> None:
@@ -33,13 +41,11 @@ class SaveAutoGrades(NbGraderPreprocessor):
         that might have been provided by a grader.
 
         """
-        # these are the fields by which we will identify the score
-        # information
-        grade = self.gradebook.find_grade(
-            cell.metadata['nbgrader']['grade_id'],
-            self.notebook_id,
-            self.assignment_id,
-            self.student_id)
+        grade_id = cell.metadata['nbgrader']['grade_id']
+        if grade_id not in self.grades:
+            raise MissingEntry("No such grade: {}/{}/{} for {}".format(
+                self.assignment_id, self.notebook_id, grade_id, self.student_id))
+        grade = self.grades[grade_id]
 
         # determine what the grade is
         auto_score, _ = utils.determine_grade(cell, self.log)
@@ -52,21 +58,17 @@ class SaveAutoGrades(NbGraderPreprocessor):
         else:
             grade.needs_manual_grade = False
 
-        self.gradebook.db.commit()
-
     def _add_comment(self, cell: NotebookNode, resources: ResourcesDict) -> None:
-        comment = self.gradebook.find_comment(
-            cell.metadata['nbgrader']['grade_id'],
-            self.notebook_id,
-            self.assignment_id,
-            self.student_id)
+        grade_id = cell.metadata['nbgrader']['grade_id']
+        if grade_id not in self.comments:
+            raise MissingEntry("No such comment: {}/{}/{} for {}".format(
+                self.assignment_id, self.notebook_id, grade_id, self.student_id))
+        comment = self.comments[grade_id]
         if cell.metadata.nbgrader.get("checksum", None) == utils.compute_checksum(cell) and not utils.is_task(cell):
             comment.auto_comment = "No response."
         else:
             comment.auto_comment = None
 
-        self.gradebook.db.commit()
-
     def preprocess_cell(self,
                         cell: NotebookNode,
                         resources: ResourcesDict,
@@ -1,7 +1,7 @@
 import json
 
 from .. import utils
-from ..api import Gradebook, MissingEntry
+from ..api import MissingEntry
 from . import NbGraderPreprocessor
 from nbformat.notebooknode import NotebookNode
 from nbconvert.exporters.exporter import ResourcesDict
@@ -90,9 +90,7 @@ class SaveCells(NbGraderPreprocessor):
         self.new_source_cells = {}
 
         # connect to the database
-        self.gradebook = Gradebook(self.db_url)
-
-        with self.gradebook:
+        with self.open_gradebook(resources) as self.gradebook:
             nb, resources = super(SaveCells, self).preprocess(nb, resources)
 
             # create the notebook and save it to the database
@@ -1,5 +1,6 @@
 import json
 import os
+import uuid
 
 from tornado import web
 
@@ -15,52 +16,53 @@ class StatusHandler(BaseApiHandler):
 
 
 class GradeCollectionHandler(BaseApiHandler):
-    @web.authenticated
-    @check_xsrf
-    @check_notebook_dir
-    def get(self):
-        submission_id = self.get_argument("submission_id")
+    def _get_grades(self, submission_id):
         try:
             notebook = self.gradebook.find_submission_notebook_by_id(submission_id)
         except MissingEntry:
             raise web.HTTPError(404)
-        self.write(json.dumps([g.to_dict() for g in notebook.grades]))
-
+        return [g.to_dict() for g in notebook.grades]
 
-class CommentCollectionHandler(BaseApiHandler):
     @web.authenticated
     @check_xsrf
     @check_notebook_dir
-    def get(self):
+    async def get(self):
         submission_id = self.get_argument("submission_id")
+        grades = await self.run_in_executor(self._get_grades, submission_id)
+        self.write(json.dumps(grades))
+
+
+class CommentCollectionHandler(BaseApiHandler):
+    def _get_comments(self, submission_id):
         try:
             notebook = self.gradebook.find_submission_notebook_by_id(submission_id)
         except MissingEntry:
             raise web.HTTPError(404)
-        self.write(json.dumps([c.to_dict() for c in notebook.comments]))
-
+        return [c.to_dict() for c in notebook.comments]
 
-class GradeHandler(BaseApiHandler):
     @web.authenticated
     @check_xsrf
     @check_notebook_dir
-    def get(self, grade_id):
+    async def get(self):
+        submission_id = self.get_argument("submission_id")
+        comments = await self.run_in_executor(self._get_comments, submission_id)
+        self.write(json.dumps(comments))
+
+
+class GradeHandler(BaseApiHandler):
+    def _get_grade(self, grade_id):
         try:
             grade = self.gradebook.find_grade_by_id(grade_id)
         except MissingEntry:
             raise web.HTTPError(404)
-        self.write(json.dumps(grade.to_dict()))
+        return grade.to_dict()
 
-    @web.authenticated
-    @check_xsrf
-    @check_notebook_dir
-    def put(self, grade_id):
+    def _update_grade(self, grade_id, data):
         try:
             grade = self.gradebook.find_grade_by_id(grade_id)
         except MissingEntry:
             raise web.HTTPError(404)
 
-        data = self.get_json_body()
         grade.manual_score = data.get("manual_score", None)
         grade.extra_credit = data.get("extra_credit", None)
         if grade.manual_score is None and grade.auto_score is None:
@@ -68,40 +70,60 @@ class GradeHandler(BaseApiHandler):
         else:
             grade.needs_manual_grade = False
         self.gradebook.db.commit()
-        self.write(json.dumps(grade.to_dict()))
+        return grade.to_dict()
 
+    @web.authenticated
+    @check_xsrf
+    @check_notebook_dir
+    async def get(self, grade_id):
+        grade = await self.run_in_executor(self._get_grade, grade_id)
+        self.write(json.dumps(grade))
 
-class CommentHandler(BaseApiHandler):
     @web.authenticated
     @check_xsrf
     @check_notebook_dir
-    def get(self, grade_id):
+    async def put(self, grade_id):
+        data = self.get_json_body()
+        grade = await self.run_in_executor(self._update_grade, grade_id, data)
+        self.write(json.dumps(grade))
+
+
+class CommentHandler(BaseApiHandler):
+    def _get_comment(self, grade_id):
         try:
             comment = self.gradebook.find_comment_by_id(grade_id)
         except MissingEntry:
             raise web.HTTPError(404)
-        self.write(json.dumps(comment.to_dict()))
+        return comment.to_dict()
 
-    @web.authenticated
-    @check_xsrf
-    @check_notebook_dir
-    def put(self, grade_id):
+    def _update_comment(self, grade_id, data):
         try:
             comment = self.gradebook.find_comment_by_id(grade_id)
         except MissingEntry:
             raise web.HTTPError(404)
 
-        data = self.get_json_body()
         comment.manual_comment = data.get("manual_comment", None)
         self.gradebook.db.commit()
-        self.write(json.dumps(comment.to_dict()))
+        return comment.to_dict()
 
+    @web.authenticated
+    @check_xsrf
+    @check_notebook_dir
+    async def get(self, grade_id):
+        comment = await self.run_in_executor(self._get_comment, grade_id)
+        self.write(json.dumps(comment))
 
-class FlagSubmissionHandler(BaseApiHandler):
     @web.authenticated
     @check_xsrf
     @check_notebook_dir
-    def post(self, submission_id):
+    async def put(self, grade_id):
+        data = self.get_json_body()
+        comment = await self.run_in_executor(self._update_comment, grade_id, data)
+        self.write(json.dumps(comment))
+
+
+class FlagSubmissionHandler(BaseApiHandler):
+    def _toggle_flag(self, submission_id):
         try:
             submission = self.gradebook.find_submission_notebook_by_id(submission_id)
         except MissingEntry:
@@ -109,24 +131,38 @@ class FlagSubmissionHandler(BaseApiHandler):
 
         submission.flagged = not submission.flagged
         self.gradebook.db.commit()
-        self.write(json.dumps(submission.to_dict()))
+        return submission.to_dict()
+
+    @web.authenticated
+    @check_xsrf
+    @check_notebook_dir
+    async def post(self, submission_id):
+        submission = await self.run_in_executor(self._toggle_flag, submission_id)
+        self.write(json.dumps(submission))
 
 
 class AssignmentCollectionHandler(BaseApiHandler):
     @web.authenticated
     @check_xsrf
     @check_notebook_dir
-    def get(self):
-        assignments = self.api.get_assignments()
+    async def get(self):
+        assignments = await self.call_api("get_assignments")
         self.write(json.dumps(assignments))
 
 
 class AssignmentHandler(BaseApiHandler):
+    def _update_assignment(self, assignment_id, assignment):
+        self.gradebook.update_or_create_assignment(assignment_id, **assignment)
+        sourcedir = os.path.abspath(self.coursedir.format_path(self.coursedir.source_directory, '.', assignment_id))
+        if not os.path.isdir(sourcedir):
+            os.makedirs(sourcedir)
+        return self.api.get_assignment(assignment_id)
+
     @web.authenticated
     @check_xsrf
     @check_notebook_dir
-    def get(self, assignment_id):
-        assignment = self.api.get_assignment(assignment_id)
+    async def get(self, assignment_id):
+        assignment = await self.call_api("get_assignment", assignment_id)
         if assignment is None:
             raise web.HTTPError(404)
         self.write(json.dumps(assignment))
@@ -134,7 +170,7 @@ class AssignmentHandler(BaseApiHandler):
     @web.authenticated
     @check_xsrf
     @check_notebook_dir
-    def put(self, assignment_id):
+    async def put(self, assignment_id):
         data = self.get_json_body()
         duedate = data.get("duedate_notimezone", None)
         timezone = data.get("duedate_timezone", None)
@@ -142,19 +178,16 @@ class AssignmentHandler(BaseApiHandler):
             duedate = duedate + " " + timezone
         assignment = {"duedate": duedate}
         assignment_id = assignment_id.strip()
-        self.gradebook.update_or_create_assignment(assignment_id, **assignment)
-        sourcedir = os.path.abspath(self.coursedir.format_path(self.coursedir.source_directory, '.', assignment_id))
-        if not os.path.isdir(sourcedir):
-            os.makedirs(sourcedir)
-        self.write(json.dumps(self.api.get_assignment(assignment_id)))
+        assignment = await self.run_in_executor(self._update_assignment, assignment_id, assignment)
+        self.write(json.dumps(assignment))
 
 
 class NotebookCollectionHandler(BaseApiHandler):
     @web.authenticated
     @check_xsrf
     @check_notebook_dir
-    def get(self, assignment_id):
-        notebooks = self.api.get_notebooks(assignment_id)
+    async def get(self, assignment_id):
+        notebooks = await self.call_api("get_notebooks", assignment_id)
         self.write(json.dumps(notebooks))
 
 
@@ -162,8 +195,8 @@ class SubmissionCollectionHandler(BaseApiHandler):
     @web.authenticated
     @check_xsrf
     @check_notebook_dir
-    def get(self, assignment_id):
-        submissions = self.api.get_submissions(assignment_id)
+    async def get(self, assignment_id):
+        submissions = await self.call_api("get_submissions", assignment_id)
         self.write(json.dumps(submissions))
 
 
@@ -171,8 +204,8 @@ class SubmissionHandler(BaseApiHandler):
     @web.authenticated
     @check_xsrf
     @check_notebook_dir
-    def get(self, assignment_id, student_id):
-        submission = self.api.get_submission(assignment_id, student_id)
+    async def get(self, assignment_id, student_id):
+        submission = await self.call_api("get_submission", assignment_id, student_id)
         if submission is None:
             raise web.HTTPError(404)
         self.write(json.dumps(submission))
@@ -182,8 +215,8 @@ class SubmittedNotebookCollectionHandler(BaseApiHandler):
     @web.authenticated
     @check_xsrf
     @check_notebook_dir
-    def get(self, assignment_id, notebook_id):
-        submissions = self.api.get_notebook_submissions(assignment_id, notebook_id)
+    async def get(self, assignment_id, notebook_id):
+        submissions = await self.call_api("get_notebook_submissions", assignment_id, notebook_id)
         self.write(json.dumps(submissions))
 
 
@@ -191,17 +224,21 @@ class StudentCollectionHandler(BaseApiHandler):
     @web.authenticated
     @check_xsrf
     @check_notebook_dir
-    def get(self):
-        students = self.api.get_students()
+    async def get(self):
+        students = await self.call_api("get_students")
         self.write(json.dumps(students))
 
 
 class StudentHandler(BaseApiHandler):
+    def _update_student(self, student_id, student):
+        self.gradebook.update_or_create_student(student_id, **student)
+        return self.api.get_student(student_id)
+
     @web.authenticated
     @check_xsrf
     @check_notebook_dir
-    def get(self, student_id):
-        student = self.api.get_student(student_id)
+    async def get(self, student_id):
+        student = await self.call_api("get_student", student_id)
         if student is None:
             raise web.HTTPError(404)
         self.write(json.dumps(student))
@@ -209,7 +246,7 @@ class StudentHandler(BaseApiHandler):
     @web.authenticated
     @check_xsrf
     @check_notebook_dir
-    def put(self, student_id):
+    async def put(self, student_id):
         data = self.get_json_body()
         student = {
             "last_name": data.get("last_name", None),
@@ -217,16 +254,16 @@ class StudentHandler(BaseApiHandler):
             "email": data.get("email", None),
         }
         student_id = student_id.strip()
-        self.gradebook.update_or_create_student(student_id, **student)
-        self.write(json.dumps(self.api.get_student(student_id)))
+        student = await self.run_in_executor(self._update_student, student_id, student)
+        self.write(json.dumps(student))
 
 
 class StudentSubmissionCollectionHandler(BaseApiHandler):
     @web.authenticated
     @check_xsrf
     @check_notebook_dir
-    def get(self, student_id):
-        submissions = self.api.get_student_submissions(student_id)
+    async def get(self, student_id):
+        submissions = await self.call_api("get_student_submissions", student_id)
         self.write(json.dumps(submissions))
 
 
@@ -234,8 +271,8 @@ class StudentNotebookSubmissionCollectionHandler(BaseApiHandler):
     @web.authenticated
     @check_xsrf
     @check_notebook_dir
-    def get(self, student_id, assignment_id):
-        submissions = self.api.get_student_notebook_submissions(student_id, assignment_id)
+    async def get(self, student_id, assignment_id):
+        submissions = await self.call_api("get_student_notebook_submissions", student_id, assignment_id)
         self.write(json.dumps(submissions))
 
 
@@ -243,72 +280,137 @@ class AssignHandler(BaseApiHandler):
     @web.authenticated
     @check_xsrf
     @check_notebook_dir
-    def post(self, assignment_id):
-        self.write(json.dumps(self.api.generate_assignment(assignment_id)))
+    async def post(self, assignment_id):
+        await self.run_job("generate_assignment", assignment_id)
 
 
 class UnReleaseHandler(BaseApiHandler):
     @web.authenticated
     @check_xsrf
     @check_notebook_dir
-    def post(self, assignment_id):
-        self.write(json.dumps(self.api.unrelease(assignment_id)))
+    async def post(self, assignment_id):
+        await self.run_job("unrelease", assignment_id)
 
 
 class ReleaseHandler(BaseApiHandler):
     @web.authenticated
     @check_xsrf
     @check_notebook_dir
-    def post(self, assignment_id):
-        self.write(json.dumps(self.api.release_assignment(assignment_id)))
+    async def post(self, assignment_id):
+        await self.run_job("release_assignment", assignment_id)
 
 
 class CollectHandler(BaseApiHandler):
     @web.authenticated
     @check_xsrf
     @check_notebook_dir
-    def post(self, assignment_id):
-        self.write(json.dumps(self.api.collect(assignment_id)))
+    async def post(self, assignment_id):
+        await self.run_job("collect", assignment_id)
 
 
 class AutogradeHandler(BaseApiHandler):
     @web.authenticated
     @check_xsrf
     @check_notebook_dir
-    def post(self, assignment_id, student_id):
-        self.write(json.dumps(self.api.autograde(assignment_id, student_id)))
+    async def post(self, assignment_id, student_id):
+        await self.run_job("autograde", assignment_id, student_id)
 
 
 class GenerateAllFeedbackHandler(BaseApiHandler):
     @web.authenticated
     @check_xsrf
     @check_notebook_dir
-    def post(self, assignment_id):
-        self.write(json.dumps(self.api.generate_feedback(assignment_id)))
+    async def post(self, assignment_id):
+        await self.run_job("generate_feedback", assignment_id)
 
 
 class ReleaseAllFeedbackHandler(BaseApiHandler):
     @web.authenticated
     @check_xsrf
     @check_notebook_dir
-    def post(self, assignment_id):
-        self.write(json.dumps(self.api.release_feedback(assignment_id)))
+    async def post(self, assignment_id):
+        await self.run_job("release_feedback", assignment_id)
 
 
 class GenerateFeedbackHandler(BaseApiHandler):
     @web.authenticated
     @check_xsrf
     @check_notebook_dir
-    def post(self, assignment_id, student_id):
-        self.write(json.dumps(self.api.generate_feedback(assignment_id, student_id)))
+    async def post(self, assignment_id, student_id):
+        await self.run_job("generate_feedback", assignment_id, student_id)
 
 
 class ReleaseFeedbackHandler(BaseApiHandler):
     @web.authenticated
     @check_xsrf
     @check_notebook_dir
-    def post(self, assignment_id, student_id):
-        self.write(json.dumps(self.api.release_feedback(assignment_id, student_id)))
+    async def post(self, assignment_id, student_id):
+        await self.run_job("release_feedback", assignment_id, student_id)
+
+
+class AutogradeAllHandler(BaseApiHandler):
+    @web.authenticated
+    @check_xsrf
+    @check_notebook_dir
+    async def post(self, assignment_id):
+        students = await self.call_api("get_submitted_students", assignment_id)
+        group = uuid.uuid4().hex
+        jobs = [
+            self.jobs.submit("autograde", [assignment_id, student_id], self.coursedir.root, group)
+            for student_id in sorted(students)]
+        self.set_status(202)
+        self.write(json.dumps({"group": group, "jobs": [job.to_dict() for job in jobs]}))
+
+
+class JobCollectionHandler(BaseApiHandler):
+    @web.authenticated
+    @check_xsrf
+    @check_notebook_dir
+    def get(self):
+        group = self.get_argument("group", None)
+        self.write(json.dumps([job.to_dict() for job in self.jobs.list(group)]))
+
+
+class JobHandler(BaseApiHandler):
+    def _get_job(self, job_id):
+        job = self.jobs.get(job_id)
+        if job is None:
+            raise web.HTTPError(404)
+        return job
+
+    @web.authenticated
+    @check_xsrf
+    @check_notebook_dir
+    def get(self, job_id):
+        self.write(json.dumps(self._get_job(job_id).to_dict()))
+
+    @web.authenticated
+    @check_xsrf
+    @check_notebook_dir
+    def delete(self, job_id):
+        job = self._get_job(job_id)
+        if not self.jobs.cancel(job):
+            raise web.HTTPError(409, "The job has already finished")
+        self.write(json.dumps(job.to_dict()))
+
+
+class JobLogHandler(BaseApiHandler):
+    @web.authenticated
+    @check_xsrf
+    @check_notebook_dir
+    def get(self, job_id):
+        job = self.jobs.get(job_id)
+        if job is None:
+            raise web.HTTPError(404)
+        # the log is streamed by polling with the offset of the last response
+        offset = int(self.get_argument("offset", "0"))
+        lines = job.log[offset:]
+        self.write(json.dumps({
+            "status": job.status,
+            "progress": job.progress,
+            "log": "".join(lines),
+            "offset": offset + len(lines),
+        }))
 
 
 default_handlers = [
@@ -322,6 +424,7 @@ default_handlers = [
     (r"/formgrader/api/assignment/([^/]+)/collect", CollectHandler),
     (r"/formgrader/api/assignment/([^/]+)/generate_feedback", GenerateAllFeedbackHandler),
     (r"/formgrader/api/assignment/([^/]+)/release_feedback", ReleaseAllFeedbackHandler),
+    (r"/formgrader/api/assignment/([^/]+)/autograde", AutogradeAllHandler),
     (r"/formgrader/api/assignment/([^/]+)/([^/]+)/generate_feedback", GenerateFeedbackHandler),
     (r"/formgrader/api/assignment/([^/]+)/([^/]+)/release_feedback", ReleaseFeedbackHandler),
 
@@ -345,4 +448,8 @@ default_handlers = [
 
     (r"/formgrader/api/student_submissions/([^/]+)", StudentSubmissionCollectionHandler),
     (r"/formgrader/api/student_notebook_submissions/([^/]+)/([^/]+)", StudentNotebookSubmissionCollectionHandler),
+
+    (r"/formgrader/api/jobs", JobCollectionHandler),
+    (r"/formgrader/api/job/([^/]+)", JobHandler),
+    (r"/formgrader/api/job/([^/]+)/log", JobLogHandler),
 ]
@@ -1,13 +1,20 @@
 import os
 import json
+import asyncio
 import functools
+import threading
 
 from tornado import web
+from tornado.ioloop import IOLoop
 from jupyter_server.base.handlers import JupyterHandler
 from jupyter_server.utils import url_path_join, url_is_absolute
 from ...api import Gradebook
 from ...apps.api import NbGraderAPI
 
+# guards the creation of the shared gradebook and the reloading of the
+# configuration, which may happen in several executor threads at once
+_lock = threading.Lock()
+
 
 class BaseHandler(JupyterHandler):
 
@@ -33,11 +40,12 @@ class BaseHandler(JupyterHandler):
 
     @property
     def gradebook(self):
-        gb = self.settings['nbgrader_gradebook']
-        if gb is None:
-            self.log.debug("creating gradebook")
-            gb = Gradebook(self.db_url, self.coursedir.course_id)
-            self.settings['nbgrader_gradebook'] = gb
+        with _lock:
+            gb = self.settings['nbgrader_gradebook']
+            if gb is None:
+                self.log.debug("creating gradebook")
+                gb = Gradebook(self.db_url, self.coursedir.course_id)
+                self.settings['nbgrader_gradebook'] = gb
         return gb
 
     @property
@@ -54,9 +62,10 @@ class BaseHandler(JupyterHandler):
     @property
     def api(self):
         level = self.log.level
-        self.coursedir.parent.load_config_file()
-        api = NbGraderAPI(
-            self.coursedir, self.authenticator, parent=self.coursedir.parent)
+        with _lock:
+            self.coursedir.parent.load_config_file()
+            api = NbGraderAPI(
+                self.coursedir, self.authenticator, parent=self.coursedir.parent)
         api.log_level = level
         return api
 
@@ -105,6 +114,53 @@ class BaseApiHandler(BaseHandler):
             raise web.HTTPError(400, 'Invalid JSON in body of request')
         return model
 
+    @property
+    def executor(self):
+        return self.settings['nbgrader_executor']
+
+    @property
+    def jobs(self):
+        return self.settings['nbgrader_jobs']
+
+    def _call(self, fn, *args):
+        try:
+            return fn(*args)
+        finally:
+            # the gradebook has one session per thread; close this thread's
+            # session so that the next request it serves sees fresh data
+            gb = self.settings['nbgrader_gradebook']
+            if gb is not None:
+                gb.db.remove()
+
+    def _call_api(self, name, *args):
+        api = self.api
+        with api.snapshot():
+            return getattr(api, name)(*args)
+
+    async def run_in_executor(self, fn, *args):
+        """Call ``fn(*args)`` in the executor of the formgrader, rather than
+        on the event loop, and return its result."""
+        return await IOLoop.current().run_in_executor(
+            self.executor, functools.partial(self._call, fn, *args))
+
+    async def call_api(self, name, *args):
+        """Call the method ``name`` of :attr:`api` in the executor of the
+        formgrader and return its result."""
+        return await self.run_in_executor(self._call_api, name, *args)
+
+    async def run_job(self, name, *args):
+        """Queue the method ``name`` of :attr:`api` to be called with ``args``
+        as a background job. If the request has a true ``background``
+        argument, respond with the job right away, so that it can be polled
+        for with the job API; otherwise wait for the job to finish and respond
+        with its result."""
+        job = self.jobs.submit(name, args, self.coursedir.root)
+        if self.get_argument("background", "false").lower() in ("1", "true"):
+            self.set_status(202)
+            self.write(json.dumps(job.to_dict()))
+        else:
+            self.write(json.dumps(await asyncio.wrap_future(job.future)))
+
 
 def check_xsrf(f):
     @functools.wraps(f)
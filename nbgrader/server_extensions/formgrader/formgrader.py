@@ -1,15 +1,18 @@
 # coding: utf-8
 
 import os
+import atexit
+from concurrent.futures import ThreadPoolExecutor
 from textwrap import dedent
 
 from nbconvert.exporters import HTMLExporter
-from traitlets import Bool, default
+from traitlets import Bool, Integer, Unicode, default
 from tornado import web
 from jinja2 import Environment, FileSystemLoader
 from jupyter_server.utils import url_path_join as ujoin
 
 from . import handlers, apihandlers
+from .jobs import JobManager
 from ...apps.baseapp import NbGrader
 
 
@@ -29,6 +32,40 @@ class FormgradeExtension(NbGrader):
         )
     ).tag(config=True)
 
+    max_workers = Integer(
+        4,
+        help=dedent(
+            """
+            The number of threads in which the formgrader API answers requests,
+            so that database queries and filesystem scans do not block the
+            server. Long-running operations, such as autograding, are run as
+            background jobs instead (see `job_workers`).
+            """
+        )
+    ).tag(config=True)
+
+    job_workers = Integer(
+        0,
+        help=dedent(
+            """
+            The number of background jobs, such as autograding or generating
+            feedback for a submission, that may run at once, each in a process
+            of its own. Defaults to the number of CPUs.
+            """
+        )
+    ).tag(config=True)
+
+    jobs_db = Unicode(
+        "",
+        help=dedent(
+            """
+            The SQLite database the queue of background jobs is saved to, so
+            that unfinished jobs are run again when the server restarts.
+            Defaults to formgrader_jobs.db in the course directory.
+            """
+        )
+    ).tag(config=True)
+
     @property
     def root_dir(self):
         return self._root_dir
@@ -88,11 +125,23 @@ class FormgradeExtension(NbGrader):
             nbgrader_db_url=self.coursedir.db_url,
             nbgrader_jinja2_env=jinja_env,
             nbgrader_bad_setup=nbgrader_bad_setup,
+            nbgrader_executor=ThreadPoolExecutor(self.max_workers, thread_name_prefix="formgrader"),
+            nbgrader_jobs=self.init_jobs(),
             initial_config=self.config
         )
 
         webapp.settings.update(tornado_settings)
 
+    def init_jobs(self):
+        jobs = JobManager(
+            self.jobs_db or os.path.join(self.coursedir.root, "formgrader_jobs.db"),
+            self.job_workers or os.cpu_count() or 1,
+            self.log,
+            config_dir=self.config_dir,
+            load_cwd_config=self.load_cwd_config)
+        atexit.register(jobs.shutdown)
+        return jobs
+
     def init_handlers(self, webapp):
         h = []
         h.extend(handlers.default_handlers)
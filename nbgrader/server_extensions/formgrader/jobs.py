@@ -0,0 +1,417 @@
+import os
+import re
+import sys
+import json
+import uuid
+import signal
+import sqlite3
+import contextlib
+import datetime
+import threading
+import subprocess
+
+from concurrent.futures import Future
+
+
+# the line with which a job process reports the result of its operation
+_RESULT_PREFIX = "nbgrader-job-result: "
+
+# the log message of the converters for each notebook they write
+_PROGRESS_MARKER = re.compile(r"\bWriting \d+ bytes to ")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS job (
+    id TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    args TEXT NOT NULL,
+    root TEXT NOT NULL,
+    "group" TEXT,
+    status TEXT NOT NULL,
+    progress INTEGER NOT NULL,
+    log TEXT NOT NULL,
+    result TEXT,
+    queued TEXT NOT NULL,
+    started TEXT,
+    finished TEXT
+)
+"""
+
+_COLUMNS = (
+    "id", "name", "args", "root", "group", "status", "progress", "log",
+    "result", "queued", "started", "finished")
+
+
+def _now():
+    return datetime.datetime.now(datetime.timezone.utc)
+
+
+def _isoformat(timestamp):
+    return timestamp.isoformat() if timestamp is not None else None
+
+
+def _parse(timestamp):
+    return datetime.datetime.fromisoformat(timestamp) if timestamp is not None else None
+
+
+class Job(object):
+    """A long-running formgrader operation, such as autograding a submission
+    or generating feedback, that runs in the background of the server.
+
+    The operation is the method ``name`` of :class:`~nbgrader.apps.api.NbGraderAPI`
+    called with ``args``, whose first argument is the assignment and whose
+    second argument, if any, is the student the operation is about.
+    ``progress`` counts the notebooks written so far.
+
+    """
+
+    def __init__(self, name, args, root, group=None):
+        self.id = uuid.uuid4().hex
+        self.name = name
+        self.args = list(args)
+        self.root = root
+        self.group = group
+        self.status = "queued"
+        self.progress = 0
+        self.log = []
+        self.result = None
+        self.queued = _now()
+        self.started = None
+        self.finished = None
+        self.future = Future()
+        self.process = None
+        self.cancelled = False
+
+    @property
+    def done(self):
+        return self.status in ("done", "failed", "cancelled")
+
+    @property
+    def assignment_id(self):
+        return self.args[0] if self.args else None
+
+    @property
+    def student_id(self):
+        return self.args[1] if len(self.args) > 1 else None
+
+    def conflicts(self, other):
+        """Whether this job and ``other`` may change the same files, and so
+        must not run at the same time."""
+        if self.root != other.root or self.assignment_id != other.assignment_id:
+            return False
+        if self.student_id is None or other.student_id is None:
+            return True
+        return self.student_id == other.student_id
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "name": self.name,
+            "args": self.args,
+            "group": self.group,
+            "status": self.status,
+            "progress": self.progress,
+            "result": self.result,
+            "queued": _isoformat(self.queued),
+            "started": _isoformat(self.started),
+            "finished": _isoformat(self.finished),
+        }
+
+    def to_row(self):
+        return (
+            self.id, self.name, json.dumps(self.args), self.root, self.group,
+            self.status, self.progress, "".join(self.log),
+            json.dumps(self.result) if self.result is not None else None,
+            _isoformat(self.queued), _isoformat(self.started),
+            _isoformat(self.finished))
+
+    @classmethod
+    def from_row(cls, row):
+        row = dict(zip(_COLUMNS, row))
+        job = cls(row["name"], json.loads(row["args"]), row["root"], row["group"])
+        job.id = row["id"]
+        job.status = row["status"]
+        job.progress = row["progress"]
+        job.log = row["log"].splitlines(True)
+        job.result = json.loads(row["result"]) if row["result"] is not None else None
+        job.queued = _parse(row["queued"])
+        job.started = _parse(row["started"])
+        job.finished = _parse(row["finished"])
+        if job.done:
+            job.future.set_result(job.result)
+        return job
+
+
+class JobManager(object):
+    """Runs the long-running formgrader operations in the background of the
+    server, up to ``workers`` of them at once.
+
+    Each job runs ``python -m nbgrader.server_extensions.formgrader.runjob`` in
+    a process of its own, which loads the configuration of the course the
+    same way the formgrader does, and streams its log back to the server as
+    it runs. Since the processes do not share a course directory or a working
+    directory, unrelated jobs run in parallel. Jobs about the same assignment
+    and student, or about the same assignment if either job is about every
+    student, still run one after the other, in the order they were queued.
+
+    Jobs are saved to the SQLite database ``db_path``, so that the jobs that
+    were queued or running when the server stopped are run again when it
+    starts.
+
+    Parameters
+    ----------
+    db_path : string
+        The SQLite database the jobs are saved to. If empty, jobs are only
+        kept in memory.
+    workers : int
+        The number of jobs that may run at once.
+    log : logging.Logger
+        The logger to report failed jobs to.
+    config_dir : string
+        The Jupyter configuration directory the job processes load their
+        configuration from.
+    load_cwd_config : bool
+        Whether the job processes also load the configuration in the current
+        working directory.
+    max_history : int
+        The number of finished jobs to keep, so that their results can be
+        polled for.
+    flush_interval : float
+        How often, in seconds, the log of a running job is saved.
+
+    """
+
+    def __init__(self, db_path, workers, log, config_dir="", load_cwd_config=True,
+                 max_history=1000, flush_interval=1.0):
+        self.db_path = db_path
+        self.log = log
+        self.config_dir = config_dir
+        self.load_cwd_config = load_cwd_config
+        self.max_history = max_history
+        self.flush_interval = flush_interval
+        self.jobs = {}
+        self._cond = threading.Condition()
+        self._stopped = False
+
+        self._init_db()
+        for job in self._load():
+            if not job.done:
+                # the server stopped before the job finished
+                job.status = "queued"
+                job.progress = 0
+                job.log = ["[WARNING] Restarting the job, which was interrupted\n"]
+            self.jobs[job.id] = job
+
+        self._threads = [
+            threading.Thread(target=self._work, name="formgrader-job-{}".format(i), daemon=True)
+            for i in range(max(1, workers))]
+        for thread in self._threads:
+            thread.start()
+
+    @contextlib.contextmanager
+    def _connect(self):
+        db = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            with db:
+                yield db
+        finally:
+            db.close()
+
+    def _init_db(self):
+        if not self.db_path:
+            return
+        try:
+            with self._connect() as db:
+                db.execute(_SCHEMA)
+        except sqlite3.Error:
+            self.log.warning(
+                "Could not open the formgrader jobs database %s, jobs will not be saved",
+                self.db_path, exc_info=True)
+            self.db_path = ""
+
+    def _load(self):
+        if not self.db_path:
+            return []
+        columns = ", ".join('"{}"'.format(x) for x in _COLUMNS)
+        with self._connect() as db:
+            rows = db.execute("SELECT {} FROM job ORDER BY queued".format(columns)).fetchall()
+        return [Job.from_row(row) for row in rows]
+
+    def _execute(self, statement, rows):
+        if not self.db_path or not rows:
+            return
+        try:
+            with self._connect() as db:
+                db.executemany(statement, rows)
+        except sqlite3.Error:
+            self.log.warning("Could not save the formgrader jobs to %s", self.db_path, exc_info=True)
+
+    def _save(self, *jobs):
+        columns = ", ".join('"{}"'.format(x) for x in _COLUMNS)
+        self._execute(
+            "INSERT OR REPLACE INTO job ({}) VALUES ({})".format(columns, ", ".join("?" * len(_COLUMNS))),
+            [job.to_row() for job in jobs])
+
+    def _prune(self):
+        finished = [x for x in self.jobs.values() if x.done]
+        pruned = finished[:max(0, len(finished) - self.max_history)]
+        for job in pruned:
+            del self.jobs[job.id]
+        return pruned
+
+    def submit(self, name, args, root, group=None):
+        """Queue the operation ``name`` with the arguments ``args`` on the
+        course at ``root``, and return the job. ``job.future`` resolves to
+        the result of the operation once the job has finished."""
+        job = Job(name, args, root, group)
+        with self._cond:
+            self.jobs[job.id] = job
+            pruned = self._prune()
+            self._save(job)
+            self._cond.notify_all()
+        self._execute("DELETE FROM job WHERE id = ?", [(x.id,) for x in pruned])
+        return job
+
+    def get(self, job_id):
+        """Returns the job with the given id, or None if there is none."""
+        with self._cond:
+            return self.jobs.get(job_id)
+
+    def list(self, group=None):
+        """Returns the known jobs, or the jobs of ``group``, in the order they
+        were queued."""
+        with self._cond:
+            return [x for x in self.jobs.values() if group is None or x.group == group]
+
+    def cancel(self, job):
+        """Cancel the job, killing its process if it is running. Returns
+        False if the job had already finished."""
+        with self._cond:
+            if job.done:
+                return False
+            job.cancelled = True
+            if job.status == "queued":
+                self._finish(job, "cancelled", None)
+                return True
+            process = job.process
+        if process is not None:
+            self._terminate(process)
+        return True
+
+    def _terminate(self, process):
+        if process.poll() is not None:
+            return
+        # the operation may have started processes of its own, such as
+        # kernels, so stop its whole process group
+        try:
+            os.killpg(process.pid, signal.SIGTERM)
+            process.wait(5)
+        except subprocess.TimeoutExpired:
+            os.killpg(process.pid, signal.SIGKILL)
+        except OSError:
+            pass
+
+    def _next(self):
+        running = [x for x in self.jobs.values() if x.status == "running"]
+        waiting = []
+        for job in self.jobs.values():
+            if job.status != "queued":
+                continue
+            # jobs queued earlier on the same files run first
+            if not any(job.conflicts(x) for x in running + waiting):
+                return job
+            waiting.append(job)
+        return None
+
+    def _work(self):
+        while True:
+            with self._cond:
+                job = self._next()
+                while job is None and not self._stopped:
+                    self._cond.wait()
+                    job = self._next()
+                if self._stopped:
+                    return
+                job.status = "running"
+                job.started = _now()
+                self._save(job)
+
+            try:
+                status, result = self._run(job)
+            except Exception:
+                self.log.error("Job %s (%s) failed", job.id, job.name, exc_info=True)
+                status, result = "failed", None
+
+            with self._cond:
+                if self._stopped:
+                    # leave the job to be restarted with the server
+                    return
+                if job.cancelled:
+                    status = "cancelled"
+                self._finish(job, status, result)
+                self._cond.notify_all()
+
+    def _finish(self, job, status, result):
+        if result is None:
+            error = "Cancelled" if status == "cancelled" else "".join(job.log[-50:])
+            result = {"success": False, "error": error, "log": "".join(job.log)}
+        job.status = status
+        job.result = result
+        job.finished = _now()
+        job.process = None
+        self._save(job)
+        job.future.set_result(result)
+
+    def _command(self, job):
+        spec = {
+            "name": job.name,
+            "args": job.args,
+            "root": job.root,
+            "config_dir": self.config_dir,
+            "load_cwd_config": self.load_cwd_config,
+        }
+        return [sys.executable, "-m", "nbgrader.server_extensions.formgrader.runjob", json.dumps(spec)]
+
+    def _run(self, job):
+        process = subprocess.Popen(
+            self._command(job),
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            universal_newlines=True,
+            start_new_session=True)
+        with self._cond:
+            job.process = process
+            cancelled = job.cancelled or self._stopped
+        if cancelled:
+            self._terminate(process)
+
+        result = None
+        flushed = _now()
+        with process.stdout:
+            for line in process.stdout:
+                if line.startswith(_RESULT_PREFIX):
+                    result = json.loads(line[len(_RESULT_PREFIX):])
+                    continue
+                job.log.append(line)
+                if _PROGRESS_MARKER.search(line):
+                    job.progress += 1
+                if (_now() - flushed).total_seconds() > self.flush_interval:
+                    with self._cond:
+                        self._save(job)
+                    flushed = _now()
+        process.wait()
+
+        if result is None:
+            return "failed", None
+        return ("done" if result.get("success") else "failed"), result
+
+    def shutdown(self):
+        """Stop the workers and the running jobs, which are run again the
+        next time the jobs are loaded."""
+        with self._cond:
+            self._stopped = True
+            running = [x.process for x in self.jobs.values() if x.process is not None]
+            self._cond.notify_all()
+        for process in running:
+            self._terminate(process)
+
@@ -0,0 +1,33 @@
+"""Runs one background job of the formgrader. See
+:class:`~nbgrader.server_extensions.formgrader.jobs.JobManager`."""
+
+import sys
+import json
+
+from ...apps.api import NbGraderAPI
+from ...apps.baseapp import NbGrader
+from .jobs import _RESULT_PREFIX
+
+
+def run(spec):
+    """Run the operation described by ``spec`` in this process, and return
+    its result."""
+    app = NbGrader()
+    app.config_dir = spec["config_dir"]
+    app.load_cwd_config = spec["load_cwd_config"]
+    app.initialize([], root=spec["root"])
+    app.coursedir.root = spec["root"]
+
+    # log to the console of the app, which the job manager streams the
+    # output of
+    api = NbGraderAPI(app.coursedir, parent=app, log=app.log)
+    return getattr(api, spec["name"])(*spec["args"])
+
+
+def main():
+    result = run(json.loads(sys.argv[1]))
+    print(_RESULT_PREFIX + json.dumps(result), flush=True)
+
+
+if __name__ == "__main__":
+    main()
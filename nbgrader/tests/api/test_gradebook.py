@@ -204,6 +204,37 @@ def test_init(gradebook: Gradebook) -> None:
     assert gradebook.assignments == []
 
 
+def test_shared_engine(tmpdir) -> None:
+    db_url = "sqlite:///" + str(tmpdir.join("gradebook.db"))
+    with Gradebook(db_url) as gb1:
+        gb1.add_student('12345')
+    with Gradebook(db_url) as gb2, Gradebook(db_url) as gb3:
+        assert gb2.engine is gb3.engine
+        assert gb2.find_student('12345').id == '12345'
+
+    # a recreated database gets a new engine and schema
+    tmpdir.join("gradebook.db").remove()
+    with Gradebook(db_url) as gb4:
+        assert gb4.engine is not gb2.engine
+        assert gb4.students == []
+
+
+def test_dispose_engines(tmpdir) -> None:
+    db_url = "sqlite:///" + str(tmpdir.join("gradebook.db"))
+    with Gradebook(db_url) as gb1:
+        gb1.add_student('12345')
+        api.dispose_engines()
+        assert api._engines == {}
+        assert api._checked_databases == set()
+
+        # open gradebooks still work after their engine is disposed
+        assert gb1.find_student('12345').id == '12345'
+
+    with Gradebook(db_url) as gb2:
+        assert gb2.engine is not gb1.engine
+        assert gb2.find_student('12345').id == '12345'
+
+
 # Test students
 
 def test_add_student(gradebook):
@@ -269,6 +300,31 @@ def test_update_or_create_student(gradebook):
     assert s2.first_name == 'Alyssa'
 
 
+def test_update_or_create_students(gradebook):
+    s1 = gradebook.update_or_create_student('hacker123', first_name='Alyssa')
+    gradebook.update_or_create_students([
+        {'id': 'hacker123', 'last_name': 'Hacker'},
+        {'id': 'bitdiddle', 'first_name': 'Ben'},
+        {'id': 'bitdiddle', 'last_name': 'Bitdiddle'},
+        {'id': 'reasoner', 'first_name': 'Louis', 'last_name': None},
+    ], chunk_size=2)
+
+    assert sorted(x.id for x in gradebook.students) == ['bitdiddle', 'hacker123', 'reasoner']
+    s2 = gradebook.find_student('hacker123')
+    assert s1 == s2
+    assert (s2.first_name, s2.last_name) == ('Alyssa', 'Hacker')
+    s3 = gradebook.find_student('bitdiddle')
+    assert (s3.first_name, s3.last_name) == ('Ben', 'Bitdiddle')
+
+    # nothing is written if one of the students is invalid
+    with pytest.raises(InvalidEntry):
+        gradebook.update_or_create_students([
+            {'id': 'foo'},
+            {'id': None},
+        ], chunk_size=1)
+    assert len(gradebook.students) == 3
+
+
 # Test assignments
 
 def test_add_assignment(gradebook):
@@ -349,6 +405,21 @@ def test_update_or_create_assignment(gradebook):
     assert a1 == a2
     assert a2.duedate == utils.parse_utc("2015-02-02 14:58:23.948203 America/Los_Angeles")
 
+
+def test_update_or_create_assignments(gradebook):
+    a1 = gradebook.update_or_create_assignment('foo')
+    gradebook.update_or_create_assignments([
+        {'name': 'foo', 'duedate': "2015-02-02 14:58:23.948203 America/Los_Angeles"},
+        {'name': 'bar'},
+    ])
+
+    a2 = gradebook.find_assignment('foo')
+    assert a1 == a2
+    assert a2.duedate == utils.parse_utc("2015-02-02 14:58:23.948203 America/Los_Angeles")
+    a3 = gradebook.find_assignment('bar')
+    assert a3.duedate is None
+    assert a3.course_id == gradebook.course_id
+
 # Test notebooks
 
 
@@ -1171,6 +1242,30 @@ def test_find_comment(assignmentWithSubmissionWithMarks: Gradebook) -> None:
             assignmentWithSubmissionWithMarks.find_comment('asdf', n.name, 'foo', 'hacker123')
 
 
+def test_find_submission_notebook_grades(assignmentWithSubmissionWithMarks):
+    gb = assignmentWithSubmissionWithMarks
+    s = gb.find_submission('foo', 'hacker123')
+    for n in s.notebooks:
+        grades = gb.find_submission_notebook_grades(n.name, 'foo', 'hacker123')
+        assert sorted(grades.keys()) == sorted(g.name for g in n.grades)
+        for name, g1 in grades.items():
+            assert g1 == gb.find_grade(name, n.name, 'foo', 'hacker123')
+
+    assert gb.find_submission_notebook_grades('p1', 'foo', 'louisreasoner') == {}
+
+
+def test_find_submission_notebook_comments(assignmentWithSubmissionWithMarks):
+    gb = assignmentWithSubmissionWithMarks
+    s = gb.find_submission('foo', 'hacker123')
+    for n in s.notebooks:
+        comments = gb.find_submission_notebook_comments(n.name, 'foo', 'hacker123')
+        assert sorted(comments.keys()) == sorted(c.name for c in n.comments)
+        for name, c1 in comments.items():
+            assert c1 == gb.find_comment(name, n.name, 'foo', 'hacker123')
+
+    assert gb.find_submission_notebook_comments('p1', 'foo', 'louisreasoner') == {}
+
+
 def test_find_comment_by_id(assignmentWithSubmissionWithMarks):
     s = assignmentWithSubmissionWithMarks.find_submission('foo', 'hacker123')
     for n in s.notebooks:
@@ -1234,6 +1329,71 @@ def test_student_dicts(assignmentWithSubmissionWithMarks):
     assert a == b
 
 
+def check_score_cache(gb):
+    for assignment in gb.assignments:
+        gb.score_cache = False
+        submissions = sorted(gb.submission_dicts(assignment.name), key=lambda x: x["id"])
+        notebooks = {
+            nb.name: sorted(gb.notebook_submission_dicts(nb.name, assignment.name), key=lambda x: x["id"])
+            for nb in assignment.notebooks}
+        gb.score_cache = True
+        assert sorted(gb.submission_dicts(assignment.name), key=lambda x: x["id"]) == submissions
+        for name, expected in notebooks.items():
+            assert sorted(gb.notebook_submission_dicts(name, assignment.name), key=lambda x: x["id"]) == expected
+    gb.score_cache = False
+    students = sorted(gb.student_dicts(), key=lambda x: x["id"])
+    gb.score_cache = True
+    assert sorted(gb.student_dicts(), key=lambda x: x["id"]) == students
+
+
+def test_score_cache(assignmentWithSubmissionWithMarks):
+    check_score_cache(assignmentWithSubmissionWithMarks)
+
+
+def test_score_cache_multiple_notebooks(FiveNotebooks):
+    check_score_cache(FiveNotebooks)
+
+
+def test_score_cache_updates(assignmentManyStudents):
+    assign = assignmentManyStudents
+    grade = assign.find_grade('grade_code1', 'p1', 'foo', 's1')
+    grade.manual_score = 0.5
+    assign.db.commit()
+    check_score_cache(assign)
+
+    assign.update_or_create_grade_cell('grade_written1', 'p1', 'foo', max_score=5)
+    check_score_cache(assign)
+
+    assign.remove_submission('foo', 's2')
+    check_score_cache(assign)
+    assert assign.db.query(api.SubmittedNotebookScore).count() == 2 * len(assign.students) - 2
+
+
+def test_update_score_cache(assignmentManyStudents):
+    assign = assignmentManyStudents
+    assign.db.query(api.SubmittedNotebookScore).delete()
+    assign.db.commit()
+    assign.update_score_cache()
+    check_score_cache(assign)
+
+
+def test_score_cache_backfill(tmpdir):
+    # the backfill is tracked per database, whatever the course is called
+    db_url = "sqlite:///" + str(tmpdir.join("gradebook.db"))
+    with Gradebook(db_url, course_id='scores') as gb:
+        gb.add_assignment('foo')
+        gb.add_notebook('p1', 'foo')
+        gb.add_grade_cell('test1', 'p1', 'foo', max_score=1, cell_type='code')
+        gb.add_student('hacker123')
+        gb.add_submission('foo', 'hacker123')
+        gb.db.query(api.SubmittedNotebookScore).delete()
+        gb.db.commit()
+
+    with Gradebook(db_url, course_id='scores', score_cache=True) as gb:
+        assert gb.db.query(api.SubmittedNotebookScore).count() == 1
+        check_score_cache(gb)
+
+
 def test_notebook_max_score(assignmentManyStudents):
     assign = assignmentManyStudents
     notebook = assign.find_notebook("p1", "foo")
@@ -1262,6 +1422,18 @@ def test_submission_max_score_multiple_notebooks(FiveNotebooks):
         assert n.max_score == 555
 
 
+def test_submission_max_task_score_multiple_assignments(gradebook):
+    for a in ['foo', 'bar']:
+        gradebook.add_assignment(a)
+        gradebook.add_notebook('p1', a)
+        gradebook.add_task_cell('task1', 'p1', a, cell_type='markdown', max_score=8)
+    gradebook.add_student('hacker123')
+    s = gradebook.add_submission('foo', 'hacker123')
+    assert s.max_task_score == 8
+    assert s.to_dict()['max_task_score'] == 8
+    assert gradebook.submission_dicts('foo')[0]['max_task_score'] == 8
+
+
 def test_notebook_submission_dicts_multiple_students(FiveStudents):
     assign = FiveStudents
     notebook = assign.find_notebook("n1", "a1")
@@ -0,0 +1,393 @@
+"""Checks that :meth:`Gradebook.submission_dicts` and
+:meth:`Gradebook.notebook_submission_dicts` return exactly what the
+per-score-subquery implementations they replaced returned, on a synthetic
+gradebook with many students. Run this module as a script to time both
+implementations on a larger gradebook::
+
+    python -m nbgrader.tests.api.test_gradebook_dicts 1000
+
+"""
+
+import random
+import sys
+import timeit
+
+import pytest
+from sqlalchemy import and_, exists, func, union_all
+
+from ...api import (
+    Assignment, Grade, GradeCell, Gradebook, Notebook, Student,
+    SubmittedAssignment, SubmittedNotebook, TaskCell)
+
+
+def legacy_submission_dicts(gb, assignment_id):
+    """Implementation of :meth:`Gradebook.submission_dicts` before the single
+    aggregation pass."""
+    # subquery the code scores
+    code_scores = gb.db.query(
+        SubmittedAssignment.id.label("id"),
+        func.sum(Grade.score).label("code_score"),
+        func.sum(GradeCell.max_score).label("max_code_score"),
+    ).select_from(SubmittedAssignment
+    ).join(SubmittedNotebook).join(Notebook).join(Assignment).join(Student).join(Grade).join(GradeCell)\
+     .filter(GradeCell.cell_type == "code")\
+     .group_by(SubmittedAssignment.id)\
+     .subquery()
+
+    # subquery for the written scores
+    written_scores = gb.db.query(
+        SubmittedAssignment.id.label("id"),
+        func.sum(Grade.score).label("written_score"),
+        func.sum(GradeCell.max_score).label("max_written_score"),
+    ).select_from(SubmittedAssignment
+    ).join(SubmittedNotebook).join(Notebook).join(Assignment).join(Student).join(Grade).join(GradeCell)\
+     .filter(GradeCell.cell_type == "markdown")\
+     .group_by(SubmittedAssignment.id)\
+     .subquery()
+
+    # subquery for the task scores
+    task_scores = gb.db.query(
+        SubmittedAssignment.id.label("id"),
+        func.sum(Grade.score).label("task_score"),
+        func.sum(TaskCell.max_score).label("max_task_score"),
+    ).select_from(SubmittedAssignment
+    ).join(SubmittedNotebook).join(Notebook).join(Assignment).join(Student).join(Grade).join(TaskCell)\
+     .filter(TaskCell.cell_type == "markdown")\
+     .group_by(SubmittedAssignment.id)\
+     .subquery()
+
+    # subquery for needing manual grading
+    manual_grade = gb.db.query(
+        SubmittedAssignment.id,
+        exists().where(Grade.needs_manual_grade).label("needs_manual_grade")
+    ).select_from(SubmittedAssignment
+    ).join(SubmittedNotebook).join(Assignment).join(Notebook)\
+     .filter(
+         SubmittedNotebook.assignment_id == SubmittedAssignment.id,
+         Grade.notebook_id == SubmittedNotebook.id,
+         Grade.needs_manual_grade)\
+     .group_by(SubmittedAssignment.id)\
+     .subquery()
+
+    all_scores = union_all(
+        gb.db.query(
+            SubmittedAssignment.id.label('id'),
+            func.sum(Grade.score).label("score"),
+            func.sum(GradeCell.max_score).label("max_score"),
+        ).select_from(SubmittedAssignment
+        ).join(SubmittedNotebook).join(Grade).join(GradeCell)
+        .filter(GradeCell.cell_type == "code")
+        .group_by(SubmittedAssignment.id),
+        # subquery for the written scores
+        gb.db.query(
+            SubmittedAssignment.id.label('id'),
+            func.sum(Grade.score).label("score"),
+            func.sum(GradeCell.max_score).label("max_score"),
+        ).select_from(SubmittedAssignment
+        ).join(SubmittedNotebook).join(Grade).join(GradeCell)\
+        .filter(GradeCell.cell_type == "markdown")\
+        .group_by(SubmittedAssignment.id),
+
+        gb.db.query(
+            SubmittedAssignment.id.label('id'),
+            func.sum(Grade.score).label("score"),
+            func.sum(TaskCell.max_score).label("max_score"),
+        ).select_from(SubmittedAssignment
+        ).join(SubmittedNotebook).join(Grade).join(TaskCell)\
+        .filter(TaskCell.cell_type == "markdown")\
+        .group_by(SubmittedAssignment.id)
+    ).subquery()
+
+    total_scores = gb.db.query(
+        func.sum(all_scores.c.score).label("score"),
+        func.sum(all_scores.c.max_score).label("max_score"),
+        all_scores.c.id.label("id"),
+    ).group_by(all_scores.c.id)\
+     .subquery()
+
+    # full query
+    _manual_grade = func.coalesce(manual_grade.c.needs_manual_grade, False)
+    assignments = gb.db.query(
+        SubmittedAssignment.id, Assignment.name,
+        SubmittedAssignment.timestamp, Student.first_name, Student.last_name,
+        Student.id,
+        func.coalesce(total_scores.c.score, 0.0),
+        func.coalesce(total_scores.c.max_score, 0.0),
+        func.coalesce(code_scores.c.code_score, 0.0),
+        func.coalesce(code_scores.c.max_code_score, 0.0),
+        func.coalesce(written_scores.c.written_score, 0.0),
+        func.coalesce(written_scores.c.max_written_score, 0.0),
+        func.coalesce(task_scores.c.task_score, 0.0),
+        func.coalesce(task_scores.c.max_task_score, 0.0),
+        _manual_grade
+    ).select_from(SubmittedAssignment
+    ).join(SubmittedNotebook).join(Assignment).join(Student).join(Grade)\
+     .outerjoin(code_scores, SubmittedAssignment.id == code_scores.c.id)\
+     .outerjoin(written_scores, SubmittedAssignment.id == written_scores.c.id)\
+     .outerjoin(task_scores, SubmittedAssignment.id == task_scores.c.id)\
+     .outerjoin(manual_grade, SubmittedAssignment.id == manual_grade.c.id)\
+     .outerjoin(total_scores, SubmittedAssignment.id == total_scores.c.id)\
+     .filter(and_(
+         Assignment.name == assignment_id,
+         Student.id == SubmittedAssignment.student_id,
+         SubmittedAssignment.id == SubmittedNotebook.assignment_id,
+         SubmittedNotebook.id == Grade.notebook_id,
+         SubmittedAssignment.id == total_scores.c.id))\
+     .group_by(
+         SubmittedAssignment.id, Assignment.name,
+         SubmittedAssignment.timestamp, Student.first_name, Student.last_name,
+         Student.id, code_scores.c.code_score, code_scores.c.max_code_score,
+         written_scores.c.written_score, written_scores.c.max_written_score,
+         task_scores.c.task_score, task_scores.c.max_task_score,
+         total_scores.c.score, total_scores.c.max_score,
+         _manual_grade)\
+     .all()
+
+    keys = [
+        "id", "name", "timestamp", "first_name", "last_name", "student",
+        "score", "max_score", "code_score", "max_code_score",
+        "written_score", "max_written_score",
+        "task_score", "max_task_score",
+        "needs_manual_grade"
+    ]
+    return [dict(zip(keys, x)) for x in assignments]
+
+
+def legacy_notebook_submission_dicts(gb, notebook_id, assignment_id):
+    """Implementation of :meth:`Gradebook.notebook_submission_dicts` before the single
+    aggregation pass."""
+    # subquery the code scores
+    code_scores = gb.db.query(
+        SubmittedNotebook.id,
+        func.sum(Grade.score).label("code_score"),
+        func.sum(GradeCell.max_score).label("max_code_score"),
+    ).select_from(SubmittedNotebook
+    ).join(SubmittedAssignment).join(Notebook).join(Assignment).join(Student).join(Grade).join(GradeCell)\
+     .filter(GradeCell.cell_type == "code")\
+     .group_by(SubmittedNotebook.id)\
+     .subquery()
+
+    # subquery for the written scores
+    written_scores = gb.db.query(
+        SubmittedNotebook.id,
+        func.sum(Grade.score).label("written_score"),
+        func.sum(GradeCell.max_score).label("max_written_score"),
+    ).select_from(SubmittedNotebook
+    ).join(SubmittedAssignment).join(Notebook).join(Assignment).join(Student).join(Grade).join(GradeCell)\
+     .filter(GradeCell.cell_type == "markdown")\
+     .group_by(SubmittedNotebook.id)\
+     .subquery()
+    # subquery for the written scores
+    task_scores = gb.db.query(
+        SubmittedNotebook.id,
+        func.coalesce(func.sum(Grade.score), 0.0).label("task_score"),
+        func.sum(TaskCell.max_score).label("max_task_score"),
+    ).select_from(SubmittedNotebook
+    ).join(SubmittedAssignment).join(Notebook).join(Assignment).join(Student).join(Grade).join(TaskCell)\
+     .filter(TaskCell.cell_type == "markdown")\
+     .group_by(SubmittedNotebook.id)\
+     .subquery()
+
+    max_scores = gb.db.query(
+        SubmittedNotebook.id,
+        func.sum(task_scores.c.max_task_score).label("mmmm"),
+    ).select_from(SubmittedNotebook
+    ).join(SubmittedAssignment).join(task_scores)\
+     .group_by(SubmittedNotebook.id)\
+     .subquery()
+
+    all_scores = union_all(
+        gb.db.query(
+            SubmittedNotebook.id.label('id'),
+            func.sum(Grade.score).label("score"),
+            func.sum(GradeCell.max_score).label("max_score"),
+        ).select_from(SubmittedNotebook
+        ).join(Grade).join(GradeCell)
+        .filter(GradeCell.cell_type == "code")
+        .group_by(SubmittedNotebook.id),
+        # subquery for the written scores
+        gb.db.query(
+            SubmittedNotebook.id.label('id'),
+            func.sum(Grade.score).label("score"),
+            func.sum(GradeCell.max_score).label("max_score"),
+        ).select_from(SubmittedNotebook
+        ).join(Grade).join(GradeCell)\
+        .filter(GradeCell.cell_type == "markdown")\
+        .group_by(SubmittedNotebook.id),
+
+        gb.db.query(
+            SubmittedNotebook.id.label('id'),
+            func.sum(Grade.score).label("score"),
+            func.sum(TaskCell.max_score).label("max_score"),
+        ).select_from(SubmittedNotebook
+        ).join(Grade).join(TaskCell)\
+        .filter(TaskCell.cell_type == "markdown")\
+        .group_by(SubmittedNotebook.id)
+    ).subquery()
+
+    total_scores = gb.db.query(
+        func.sum(all_scores.c.score).label("score"),
+        func.sum(all_scores.c.max_score).label("max_score"),
+        all_scores.c.id.label("id"),
+    )\
+        .group_by(all_scores.c.id)\
+        .subquery()
+
+    # subquery for needing manual grading
+
+    manual_grade = gb.db.query(
+        SubmittedNotebook.id,
+        exists().where(Grade.needs_manual_grade).label("needs_manual_grade")
+    ).select_from(SubmittedNotebook
+    ).join(SubmittedAssignment).join(Assignment).join(Notebook)\
+     .filter(
+         Grade.notebook_id == SubmittedNotebook.id,
+         Grade.needs_manual_grade)\
+     .group_by(SubmittedNotebook.id)\
+     .subquery()
+
+    # subquery for failed tests
+    failed_tests = gb.db.query(
+        SubmittedNotebook.id,
+        exists().where(Grade.failed_tests).label("failed_tests")
+    ).select_from(SubmittedNotebook
+    ).join(SubmittedAssignment).join(Assignment).join(Notebook)\
+     .filter(
+         Grade.notebook_id == SubmittedNotebook.id,
+         Grade.failed_tests)\
+     .group_by(SubmittedNotebook.id)\
+     .subquery()
+
+    # full query
+    _manual_grade = func.coalesce(manual_grade.c.needs_manual_grade, False)
+    _failed_tests = func.coalesce(failed_tests.c.failed_tests, False)
+    submissions = gb.db.query(
+        SubmittedNotebook.id, Notebook.name,
+        Student.id, Student.first_name, Student.last_name,
+        func.coalesce(total_scores.c.score, 0.0),
+        func.coalesce(total_scores.c.max_score, 0.0),
+        func.coalesce(code_scores.c.code_score, 0.0),
+        func.coalesce(code_scores.c.max_code_score, 0.0),
+        func.coalesce(written_scores.c.written_score, 0.0),
+        func.coalesce(written_scores.c.max_written_score, 0.0),
+        func.coalesce(task_scores.c.task_score, 0.0),
+        func.coalesce(task_scores.c.max_task_score, 0.0),
+        _manual_grade, _failed_tests, SubmittedNotebook.flagged
+    ).select_from(SubmittedNotebook
+    ).join(SubmittedAssignment).join(Notebook).join(Assignment).join(Student).join(Grade)\
+     .outerjoin(code_scores, SubmittedNotebook.id == code_scores.c.id)\
+     .outerjoin(written_scores, SubmittedNotebook.id == written_scores.c.id)\
+     .outerjoin(task_scores, SubmittedNotebook.id == task_scores.c.id)\
+     .outerjoin(total_scores, SubmittedNotebook.id == total_scores.c.id)\
+     .outerjoin(manual_grade, SubmittedNotebook.id == manual_grade.c.id)\
+     .outerjoin(failed_tests, SubmittedNotebook.id == failed_tests.c.id)\
+     .filter(and_(
+         Notebook.name == notebook_id,
+         Assignment.name == assignment_id,
+         Student.id == SubmittedAssignment.student_id,
+         SubmittedAssignment.id == SubmittedNotebook.assignment_id,
+         SubmittedNotebook.id == Grade.notebook_id,
+         SubmittedNotebook.id == total_scores.c.id,
+     )
+    ).group_by(
+         SubmittedNotebook.id, Notebook.name,
+         Student.id, Student.first_name, Student.last_name,
+         code_scores.c.code_score, code_scores.c.max_code_score,
+         written_scores.c.written_score, written_scores.c.max_written_score,
+         task_scores.c.task_score, task_scores.c.max_task_score,
+         total_scores.c.score, total_scores.c.max_score,
+         _manual_grade, _failed_tests, SubmittedNotebook.flagged)\
+     .all()
+
+    keys = [
+        "id", "name", "student", "first_name", "last_name",
+        "score", "max_score",
+        "code_score", "max_code_score",
+        "written_score", "max_written_score",
+        "task_score", "max_task_score",
+        "needs_manual_grade",
+        "failed_tests", "flagged"
+    ]
+    return [dict(zip(keys, x)) for x in submissions]
+
+
+def make_gradebook(gb, n_students, seed=0):
+    """Add two assignments with two notebooks each and ``n_students`` random
+    submissions to ``gb``. Scores are multiples of one half so that sums do
+    not depend on the order in which the database adds them up."""
+    rng = random.Random(seed)
+    for a in ["ps1", "ps2"]:
+        gb.add_assignment(a)
+        for n in ["p1", "p2"]:
+            gb.add_notebook(n, a)
+            for i in range(3):
+                gb.add_grade_cell("code{}".format(i), n, a, max_score=i + 1, cell_type="code")
+                gb.add_grade_cell("written{}".format(i), n, a, max_score=2 * i + 1, cell_type="markdown")
+                gb.add_solution_cell("written{}".format(i), n, a)
+            gb.add_task_cell("task", n, a, max_score=5, cell_type="markdown")
+
+    for s in range(n_students):
+        student_id = "s{:05d}".format(s)
+        gb.add_student(student_id, first_name="First{}".format(s), last_name="Last{}".format(s))
+        for a in ["ps1", "ps2"]:
+            if rng.random() < 0.1:
+                continue
+            submission = gb.add_submission(a, student_id)
+            submission.flagged = rng.random() < 0.1
+            for notebook in submission.notebooks:
+                for grade in notebook.grades:
+                    half_points = int(grade.max_score * 2)
+                    grade.auto_score = rng.choice([None, 0, rng.randint(0, half_points) / 2])
+                    grade.manual_score = rng.choice([None, None, rng.randint(0, half_points) / 2])
+                    grade.extra_credit = rng.choice([None, None, 0.5])
+                    grade.needs_manual_grade = rng.random() < 0.1
+                    grade.failed_tests = rng.random() < 0.05
+        gb.db.commit()
+    return gb
+
+
+def by_id(dicts):
+    return sorted(dicts, key=lambda x: x["id"])
+
+
+def check_dicts(gb):
+    for a in ["ps1", "ps2"]:
+        assert by_id(gb.submission_dicts(a)) == by_id(legacy_submission_dicts(gb, a))
+        for n in ["p1", "p2"]:
+            assert by_id(gb.notebook_submission_dicts(n, a)) == \
+                by_id(legacy_notebook_submission_dicts(gb, n, a))
+
+
+@pytest.mark.parametrize("score_cache", [False, True])
+def test_dicts_match_legacy(score_cache):
+    with Gradebook("sqlite:///:memory:", score_cache=score_cache) as gb:
+        make_gradebook(gb, 100)
+        check_dicts(gb)
+
+        # grading changes are picked up by both implementations
+        for grade in gb.db.query(Grade).filter(Grade.manual_score == None).limit(50):
+            grade.manual_score = 0.5
+            grade.needs_manual_grade = False
+        gb.db.commit()
+        check_dicts(gb)
+
+
+def main(n_students):
+    with Gradebook("sqlite:///:memory:") as gb:
+        make_gradebook(gb, n_students)
+        check_dicts(gb)
+        for name, new, old in [
+                ("submission_dicts",
+                 lambda: gb.submission_dicts("ps1"),
+                 lambda: legacy_submission_dicts(gb, "ps1")),
+                ("notebook_submission_dicts",
+                 lambda: gb.notebook_submission_dicts("p1", "ps1"),
+                 lambda: legacy_notebook_submission_dicts(gb, "p1", "ps1"))]:
+            t_new = min(timeit.repeat(new, number=1, repeat=5))
+            t_old = min(timeit.repeat(old, number=1, repeat=5))
+            print("{}: {:.4f}s (legacy {:.4f}s) for {} students".format(
+                name, t_new, t_old, n_students))
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1000)
@@ -591,6 +591,25 @@ class TestNbGraderAPI(BaseTestApp):
         }
         assert api.get_students() == [s1, s2]
 
+    def test_snapshot(self, api, course_dir):
+        timestamp = datetime.now()
+        self._empty_notebook(join(course_dir, "submitted", "foo", "ps1", "p1.ipynb"))
+        self._make_file(join(course_dir, "submitted", "foo", "ps1", "timestamp.txt"), contents=timestamp.isoformat())
+
+        with api.snapshot():
+            assert api.get_submitted_students("ps1") == {"foo"}
+            assert api.get_submitted_timestamp("ps1", "foo") == timestamp
+
+            # the course is not scanned again until the snapshot is released
+            self._empty_notebook(join(course_dir, "submitted", "bar", "ps1", "p1.ipynb"))
+            self._make_file(join(course_dir, "submitted", "foo", "ps1", "timestamp.txt"), contents=datetime.now().isoformat())
+            assert api.get_submitted_students("ps1") == {"foo"}
+            assert api.get_submitted_timestamp("ps1", "foo") == timestamp
+            assert {x["id"] for x in api.get_students()} == {"foo"}
+
+        assert api.get_submitted_students("ps1") == {"foo", "bar"}
+        assert api.get_submitted_timestamp("ps1", "foo") != timestamp
+
     def test_get_student_submissions(self, api, course_dir, db):
         assert api.get_student_submissions("foo") == []
 
@@ -10,9 +10,11 @@ from os.path import join
 from textwrap import dedent
 from nbformat import current_nbformat
 
+from ... import api
 from ...api import Gradebook, MissingEntry
 from ...utils import remove
 from ...nbgraderformat import reads
+from ...preprocessors.execute import _kernel_pools
 from .. import run_nbgrader
 from .base import BaseTestApp
 
@@ -94,6 +96,85 @@ class TestNbGraderAutograde(BaseTestApp):
             assert comment1.comment == None
             assert comment2.comment == None
 
+    def test_grade_parallel(self, db, course_dir):
+        """Can submissions be graded concurrently?"""
+        run_nbgrader(["db", "assignment", "add", "ps1", "--db", db, "--duedate", "2015-02-02 14:58:23.948203 America/Los_Angeles"])
+
+        self._copy_file(join("files", "submitted-unchanged.ipynb"), join(course_dir, "source", "ps1", "p1.ipynb"))
+        run_nbgrader(["generate_assignment", "ps1", "--db", db])
+
+        self._copy_file(join("files", "submitted-unchanged.ipynb"), join(course_dir, "submitted", "foo", "ps1", "p1.ipynb"))
+        self._copy_file(join("files", "submitted-changed.ipynb"), join(course_dir, "submitted", "bar", "ps1", "p1.ipynb"))
+        self._copy_file(join("files", "submitted-changed.ipynb"), join(course_dir, "submitted", "baz", "ps1", "p1.ipynb"))
+        run_nbgrader(["autograde", "ps1", "--db", db, "--jobs", "2"])
+
+        # the shared database connections don't outlive the command
+        assert api._engines == {}
+
+        for student in ["foo", "bar", "baz"]:
+            assert os.path.isfile(join(course_dir, "autograded", student, "ps1", "p1.ipynb"))
+
+        with Gradebook(db) as gb:
+            assert len(gb.students) == 3
+
+            notebook = gb.find_submission_notebook("p1", "ps1", "foo")
+            assert notebook.score == 1
+            assert notebook.needs_manual_grade == False
+
+            for student in ["bar", "baz"]:
+                notebook = gb.find_submission_notebook("p1", "ps1", student)
+                assert notebook.score == 2
+                assert notebook.needs_manual_grade == True
+
+    def test_grade_parallel_failure(self, db, course_dir):
+        """Is a failed submission cleaned up when grading concurrently?"""
+        run_nbgrader(["db", "assignment", "add", "ps1", "--db", db, "--duedate", "2015-02-02 14:58:23.948203 America/Los_Angeles"])
+
+        self._copy_file(join("files", "submitted-unchanged.ipynb"), join(course_dir, "source", "ps1", "p1.ipynb"))
+        run_nbgrader(["generate_assignment", "ps1", "--db", db])
+
+        self._copy_file(join("files", "submitted-unchanged.ipynb"), join(course_dir, "submitted", "foo", "ps1", "p1.ipynb"))
+        self._copy_file(join("files", "submitted-changed.ipynb"), join(course_dir, "submitted", "bar", "ps1", "p1.ipynb"))
+        self._make_file(join(course_dir, "submitted", "bar", "ps1", "timestamp.txt"), "not a timestamp")
+        run_nbgrader(["autograde", "ps1", "--db", db, "--jobs", "2"], retcode=1)
+
+        assert os.path.isfile(join(course_dir, "autograded", "foo", "ps1", "p1.ipynb"))
+        assert not os.path.exists(join(course_dir, "autograded", "bar", "ps1"))
+
+    def test_grade_parallel_worker_died(self, db, course_dir):
+        """Is only the submission that killed its worker process marked as failed?"""
+        run_nbgrader(["db", "assignment", "add", "ps1", "--db", db, "--duedate", "2015-02-02 14:58:23.948203 America/Los_Angeles"])
+
+        self._copy_file(join("files", "submitted-unchanged.ipynb"), join(course_dir, "source", "ps1", "p1.ipynb"))
+        run_nbgrader(["generate_assignment", "ps1", "--db", db])
+
+        # grade one submission ahead of time
+        self._copy_file(join("files", "submitted-changed.ipynb"), join(course_dir, "submitted", "baz", "ps1", "p1.ipynb"))
+        run_nbgrader(["autograde", "ps1", "--db", db])
+        assert os.path.isfile(join(course_dir, "autograded", "baz", "ps1", "p1.ipynb"))
+
+        with open("nbgrader_config.py", "a") as fh:
+            fh.write(dedent(
+                """
+                import os
+                def kill_worker(assignment, student, notebooks):
+                    if any(os.sep + "bar" + os.sep in x for x in notebooks):
+                        os._exit(1)
+                c.BaseConverter.pre_convert_hook = kill_worker
+                """
+            ))
+
+        self._copy_file(join("files", "submitted-unchanged.ipynb"), join(course_dir, "submitted", "foo", "ps1", "p1.ipynb"))
+        self._copy_file(join("files", "submitted-changed.ipynb"), join(course_dir, "submitted", "bar", "ps1", "p1.ipynb"))
+        self._copy_file(join("files", "submitted-changed.ipynb"), join(course_dir, "submitted", "qux", "ps1", "p1.ipynb"))
+        output = run_nbgrader(["autograde", "ps1", "--db", db, "--jobs", "2"], retcode=1)
+
+        assert not os.path.exists(join(course_dir, "autograded", "bar", "ps1"))
+        for student in ["baz", "foo", "qux"]:
+            assert os.path.isfile(join(course_dir, "autograded", student, "ps1", "p1.ipynb"))
+        assert "error processing assignment 'ps1' for student 'bar'" in output
+        for student in ["baz", "foo", "qux"]:
+            assert "for student '{}'".format(student) not in output
 
     def test_grade_autotest(self, db, course_dir):
         """Can files including autotest commands be graded?"""
@@ -646,6 +727,37 @@ class TestNbGraderAutograde(BaseTestApp):
             contents = fh.read()
         assert contents == "print('this is different!')\n"
 
+    def test_grade_staging_hardlink(self, db: str, course_dir: str) -> None:
+        """Are dependent files hardlinked rather than copied, if asked?"""
+        run_nbgrader(["db", "assignment", "add", "ps1", "--db", db, "--duedate",
+                      "2015-02-02 14:58:23.948203 America/Los_Angeles"])
+        run_nbgrader(["db", "student", "add", "foo", "--db", db])
+        with open("nbgrader_config.py", "a") as fh:
+            fh.write("""c.Autograde.exclude_overwriting = {"ps1": ["helper.py"]}\n""")
+            fh.write("""c.BaseConverter.staging = "hardlink"\n""")
+
+        self._copy_file(join("files", "submitted-unchanged.ipynb"), join(course_dir, "source", "ps1", "p1.ipynb"))
+        self._make_file(join(course_dir, "source", "ps1", "data.csv"), "some,data\n")
+        self._make_file(join(course_dir, "source", "ps1", "helper.py"), "print('hello!')\n")
+        run_nbgrader(["generate_assignment", "ps1", "--db", db])
+
+        self._copy_file(join("files", "submitted-unchanged.ipynb"), join(course_dir, "submitted", "foo", "ps1", "p1.ipynb"))
+        self._make_file(join(course_dir, "submitted", "foo", "ps1", "data.csv"), "some,other,data\n")
+        self._make_file(join(course_dir, "submitted", "foo", "ps1", "helper.py"), "print('this is different!')\n")
+        os.chmod(join(course_dir, "source", "ps1", "data.csv"), 0o644)
+        run_nbgrader(["autograde", "ps1", "--db", db])
+
+        # the master version of the data is linked, and the student's helper
+        # is linked from their submission
+        autograded = join(course_dir, "autograded", "foo", "ps1")
+        assert os.path.samefile(join(autograded, "data.csv"), join(course_dir, "source", "ps1", "data.csv"))
+        assert os.path.samefile(join(autograded, "helper.py"), join(course_dir, "submitted", "foo", "ps1", "helper.py"))
+
+        # the permissions of the linked files are left alone, while the
+        # notebooks are made read-only as usual
+        assert self._get_permissions(join(course_dir, "source", "ps1", "data.csv")) == "644"
+        assert self._get_permissions(join(autograded, "p1.ipynb")) == "444"
+
     def test_grade_overwrite_files_subdirs(self, db: str, course_dir: str) -> None:
         """Are dependent files properly linked and overwritten?"""
         run_nbgrader(["db", "assignment", "add", "ps1", "--db", db, "--duedate",
@@ -698,6 +810,28 @@ class TestNbGraderAutograde(BaseTestApp):
         assert os.path.isfile(join(course_dir, "autograded", "foo", "ps1", "side-effect.txt"))
         assert not os.path.isfile(join(course_dir, "submitted", "foo", "ps1", "side-effect.txt"))
 
+    def test_kernel_pool(self, db, course_dir):
+        """Are notebooks executed in their own directory when using pooled kernels?"""
+        run_nbgrader(["db", "assignment", "add", "ps1", "--db", db, "--duedate",
+                      "2015-02-02 14:58:23.948203 America/Los_Angeles"])
+
+        self._copy_file(join("files", "side-effects.ipynb"), join(course_dir, "source", "ps1", "p1.ipynb"))
+        run_nbgrader(["generate_assignment", "ps1", "--db", db])
+
+        self._copy_file(join("files", "side-effects.ipynb"), join(course_dir, "submitted", "foo", "ps1", "p1.ipynb"))
+        self._copy_file(join("files", "side-effects.ipynb"), join(course_dir, "submitted", "bar", "ps1", "p1.ipynb"))
+        run_nbgrader([
+            "autograde", "ps1", "--db", db,
+            "--Execute.kernel_pool_size=1",
+            "--Execute.kernel_pool_imports=json"])
+
+        # spare kernels don't outlive the command
+        assert len(_kernel_pools) == 0
+
+        for student in ["foo", "bar"]:
+            assert os.path.isfile(join(course_dir, "autograded", student, "ps1", "side-effect.txt"))
+            assert not os.path.isfile(join(course_dir, "submitted", student, "ps1", "side-effect.txt"))
+
     def test_skip_extra_notebooks(self, db, course_dir):
         run_nbgrader(["db", "assignment", "add", "ps1", "--db", db, "--duedate",
                       "2015-02-02 14:58:23.948203 America/Los_Angeles"])
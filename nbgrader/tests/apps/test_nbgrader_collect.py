@@ -1,5 +1,6 @@
 import datetime
 import os
+import shutil
 import time
 import pytest
 
@@ -9,6 +10,7 @@ from .. import run_nbgrader
 from .base import BaseTestApp
 from .conftest import notwindows
 from ...api import Gradebook
+from ...exchange.default import exchange as exchange_module
 from ...utils import parse_utc, get_username
 
 
@@ -127,6 +129,66 @@ class TestNbGraderCollect(BaseTestApp):
         # make sure collect succeeds
         self._collect("ps1", exchange)
 
+    def test_collect_parallel(self, exchange, course_dir, cache):
+        self._release_and_fetch("ps1", exchange, course_dir)
+        for student in ["foo", "bar", "baz"]:
+            self._submit("ps1", exchange, cache, flags=["--student={}".format(student)])
+
+        self._collect("ps1", exchange, flags=["--ExchangeCollect.copy_workers=2"])
+        for student in ["foo", "bar", "baz"]:
+            root = join(course_dir, "submitted", student, "ps1")
+            assert os.path.isfile(join(root, "p1.ipynb"))
+            assert os.path.isfile(join(root, "timestamp.txt"))
+            assert not os.path.exists(join(course_dir, "submitted", student, ".ps1.partial"))
+
+    def test_collect_resume(self, exchange, course_dir, cache, monkeypatch):
+        self._release_and_fetch("ps1", exchange, course_dir)
+        self._submit("ps1", exchange, cache)
+        filename, = os.listdir(join(exchange, "abc101", "inbound"))
+        src = join(exchange, "abc101", "inbound", filename)
+
+        # leave the copy of the submission half done, as if collect had been
+        # interrupted
+        staging = join(course_dir, "submitted", get_username(), ".ps1.partial")
+        os.makedirs(staging)
+        shutil.copy2(join(src, "p1.ipynb"), join(staging, "p1.ipynb"))
+        with open(staging + ".source", "w") as fh:
+            fh.write(filename)
+
+        copied = []
+        copy2 = shutil.copy2
+        def record_copy(src, dest, **kwargs):
+            copied.append(os.path.basename(src))
+            return copy2(src, dest, **kwargs)
+        monkeypatch.setattr(exchange_module.shutil, "copy2", record_copy)
+
+        self._collect("ps1", exchange)
+        root = join(course_dir, "submitted", get_username(), "ps1")
+        assert os.path.isfile(join(root, "p1.ipynb"))
+        assert os.path.isfile(join(root, "timestamp.txt"))
+        assert "p1.ipynb" not in copied
+        assert "timestamp.txt" in copied
+        assert not os.path.exists(staging)
+        assert not os.path.exists(staging + ".source")
+
+    def test_collect_discard_stale_copy(self, exchange, course_dir, cache):
+        self._release_and_fetch("ps1", exchange, course_dir)
+        self._submit("ps1", exchange, cache)
+
+        # an interrupted copy of another submission is started over
+        staging = join(course_dir, "submitted", get_username(), ".ps1.partial")
+        os.makedirs(staging)
+        with open(join(staging, "stale.txt"), "w") as fh:
+            fh.write("stale")
+        with open(staging + ".source", "w") as fh:
+            fh.write("{}+ps1+2020-01-01 00:00:00.000000 UTC+abcdef".format(get_username()))
+
+        self._collect("ps1", exchange)
+        root = join(course_dir, "submitted", get_username(), "ps1")
+        assert os.path.isfile(join(root, "p1.ipynb"))
+        assert not os.path.exists(join(root, "stale.txt"))
+        assert not os.path.exists(staging)
+
     def test_owner_check(self, exchange, course_dir, cache):
         self._release_and_fetch("ps1", exchange, course_dir)
         self._submit("ps1", exchange, cache, flags=["--student=foobar_student",])
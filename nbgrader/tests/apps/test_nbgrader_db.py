@@ -202,6 +202,20 @@ class TestNbGraderDb(BaseTestApp):
             assert student.first_name is None
             assert student.email is None
 
+        # check that nothing is imported if one of the rows is invalid
+        with open("students.csv", "w") as fh:
+            fh.write(dedent(
+                """
+                id,first_name
+                baz,abc
+                ,xyz
+                """
+            ).strip())
+
+        run_nbgrader(["db", "student", "import", "students.csv", "--db", db], retcode=1)
+        with Gradebook(db) as gb:
+            assert sorted(x.id for x in gb.students) == ["bar", "foo"]
+
 
     def test_student_import_csv_spaces(self, db, temp_cwd):
         with open("students.csv", "w") as fh:
@@ -1,6 +1,11 @@
+import csv
+import json
 import os
+import pytest
 
+from datetime import datetime
 from os.path import join
+from ...api import Gradebook
 from ...utils import remove
 from .. import run_nbgrader
 from .base import BaseTestApp
@@ -63,3 +68,139 @@ class TestNbGraderExport(BaseTestApp):
         with open("grades.csv", "r") as fh:
             contents = fh.readlines()
         assert len(contents) == 2
+
+    def test_export_scores(self, db):
+        with Gradebook(db) as gb:
+            gb.add_assignment("ps1", duedate=datetime(2015, 2, 2, 14, 58, 23))
+            gb.add_notebook("p1", "ps1")
+            gb.add_grade_cell("test1", "p1", "ps1", max_score=2, cell_type="code")
+            gb.add_grade_cell("test2", "p1", "ps1", max_score=3, cell_type="markdown")
+            gb.add_student("foo", first_name="Foo", last_name="A")
+            gb.add_student("bar", first_name="Bar", last_name="B")
+            sub = gb.add_submission("ps1", "bar", timestamp=datetime(2015, 2, 3, 10, 0, 0))
+            for grade in sub.notebooks[0].grades:
+                grade.manual_score = grade.max_score
+            sub.notebooks[0].late_submission_penalty = 1.0
+            gb.db.commit()
+
+        run_nbgrader(["export", "--db", db])
+        with open("grades.csv", "r") as fh:
+            rows = list(csv.DictReader(fh))
+
+        foo, bar = rows
+        assert foo["student_id"] == "foo"
+        assert foo["timestamp"] == ""
+        assert foo["raw_score"] == "0.0"
+        assert foo["score"] == "0.0"
+        assert foo["max_score"] == "5.0"
+        assert bar["student_id"] == "bar"
+        assert bar["duedate"] == "2015-02-02 14:58:23"
+        assert bar["timestamp"] == "2015-02-03 10:00:00"
+        assert bar["raw_score"] == "5.0"
+        assert bar["late_submission_penalty"] == "1.0"
+        assert bar["score"] == "4.0"
+        assert bar["max_score"] == "5.0"
+
+    def _add_scores(self, db):
+        with Gradebook(db) as gb:
+            gb.add_assignment("ps1", duedate=datetime(2015, 2, 2, 14, 58, 23))
+            gb.add_notebook("p1", "ps1")
+            gb.add_notebook("p2", "ps1")
+            gb.add_grade_cell("test1", "p1", "ps1", max_score=2, cell_type="code")
+            gb.add_grade_cell("test2", "p1", "ps1", max_score=3, cell_type="markdown")
+            gb.add_task_cell("task1", "p2", "ps1", max_score=1, cell_type="markdown")
+            gb.add_student("foo", first_name="Foo", last_name="A")
+            gb.add_student("bar", first_name="Bar", last_name="B")
+            sub = gb.add_submission("ps1", "bar", timestamp=datetime(2015, 2, 3, 10, 0, 0))
+            for notebook in sub.notebooks:
+                for grade in notebook.grades:
+                    if grade.cell.name == "test1":
+                        grade.auto_score = 0
+                    else:
+                        grade.manual_score = grade.max_score
+                    grade.needs_manual_grade = False
+            sub.notebooks[0].late_submission_penalty = 1.0
+            gb.add_submission("ps1", "foo", timestamp=datetime(2015, 2, 1, 10, 0, 0))
+            gb.db.commit()
+
+    def test_export_ndjson(self, db):
+        self._add_scores(db)
+        run_nbgrader([
+            "export", "--db", db, "--exporter=nbgrader.plugins.NdjsonExportPlugin",
+            "--TableExportPlugin.batch_size=2"])
+
+        tables = {}
+        for name in ["cells", "notebooks", "assignments"]:
+            with open(join("grades", "{}.ndjson".format(name)), "r") as fh:
+                tables[name] = [json.loads(line) for line in fh]
+
+        cells = tables["cells"]
+        assert len(cells) == 6
+        assert [(x["student_id"], x["notebook"], x["cell"]) for x in cells] == [
+            ("bar", "p1", "test1"), ("bar", "p1", "test2"), ("bar", "p2", "task1"),
+            ("foo", "p1", "test1"), ("foo", "p1", "test2"), ("foo", "p2", "task1")]
+        assert cells[0]["cell_kind"] == "GradeCell"
+        assert cells[0]["cell_type"] == "code"
+        assert cells[0]["auto_score"] == 0.0
+        assert cells[0]["score"] == 0.0
+        assert cells[0]["max_score"] == 2.0
+        assert cells[0]["failed_tests"] is True
+        assert cells[2]["cell_kind"] == "TaskCell"
+        assert cells[2]["score"] == 1.0
+        assert cells[2]["max_score"] == 1.0
+        assert cells[3]["auto_score"] is None
+        assert cells[3]["needs_manual_grade"] is True
+
+        notebooks = tables["notebooks"]
+        assert [(x["student_id"], x["notebook"]) for x in notebooks] == [
+            ("bar", "p1"), ("bar", "p2"), ("foo", "p1"), ("foo", "p2")]
+        assert notebooks[0]["duedate"] == "2015-02-02T14:58:23"
+        assert notebooks[0]["timestamp"] == "2015-02-03T10:00:00"
+        assert notebooks[0]["score"] == 3.0
+        assert notebooks[0]["max_score"] == 5.0
+        assert notebooks[0]["code_score"] == 0.0
+        assert notebooks[0]["written_score"] == 3.0
+        assert notebooks[0]["late_submission_penalty"] == 1.0
+        assert notebooks[0]["failed_tests"] is True
+        assert notebooks[1]["task_score"] == 1.0
+        assert notebooks[1]["max_task_score"] == 1.0
+        assert notebooks[1]["failed_tests"] is False
+
+        bar, foo = tables["assignments"]
+        assert bar["student_id"] == "bar"
+        assert bar["last_name"] == "B"
+        assert bar["raw_score"] == 4.0
+        assert bar["late_submission_penalty"] == 1.0
+        assert bar["score"] == 3.0
+        assert bar["max_score"] == 6.0
+        assert bar["needs_manual_grade"] is False
+        assert foo["student_id"] == "foo"
+        assert foo["raw_score"] == 0.0
+        assert foo["score"] == 0.0
+        assert foo["needs_manual_grade"] is True
+
+        run_nbgrader([
+            "export", "--db", db, "--exporter=nbgrader.plugins.NdjsonExportPlugin",
+            "--to", "bar_grades", "--student", "['bar']"])
+        with open(join("bar_grades", "assignments.ndjson"), "r") as fh:
+            assert [json.loads(line)["student_id"] for line in fh] == ["bar"]
+        with open(join("bar_grades", "cells.ndjson"), "r") as fh:
+            assert len(fh.readlines()) == 3
+
+    def test_export_arrow(self, db):
+        pa = pytest.importorskip("pyarrow")
+        self._add_scores(db)
+        run_nbgrader([
+            "export", "--db", db, "--exporter=nbgrader.plugins.ArrowExportPlugin",
+            "--ArrowExportPlugin.format=arrow", "--TableExportPlugin.batch_size=2"])
+
+        with pa.ipc.open_file(join("grades", "cells.arrow")) as reader:
+            assert reader.num_record_batches == 3
+            cells = reader.read_all().to_pylist()
+        assert len(cells) == 6
+        assert cells[0]["max_score"] == 2.0
+
+        with pa.ipc.open_file(join("grades", "assignments.arrow")) as reader:
+            bar, foo = reader.read_all().to_pylist()
+        assert bar["score"] == 3.0
+        assert bar["timestamp"] == datetime(2015, 2, 3, 10, 0, 0)
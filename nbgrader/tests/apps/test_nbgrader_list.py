@@ -7,6 +7,7 @@ from .. import run_nbgrader
 from .base import BaseTestApp
 from .conftest import notwindows
 
+from ...exchange.default import index
 from ...utils import get_username
 
 
@@ -499,3 +500,43 @@ class TestNbGraderList(BaseTestApp):
             [ListApp | INFO] abc101 {} ps1 {} (feedback already fetched)
             """.format(get_username(), timestamps[0], get_username(), timestamps[1])
         ).lstrip()
+
+    def test_list_index(self, exchange, cache, course_dir, monkeypatch):
+        self._release_full("ps1", exchange, cache, course_dir)
+        self._fetch("ps1", exchange, cache)
+        self._submit("ps1", exchange, cache)
+        self._make_feedback("ps1", exchange, cache, course_dir)
+
+        filename, = os.listdir(os.path.join(exchange, "abc101", "inbound"))
+        timestamp = filename.split("+")[2]
+        expected = dedent(
+            """
+            [ListApp | INFO] Submitted assignments:
+            [ListApp | INFO] abc101 {} ps1 {} (feedback ready to be fetched)
+            """.format(get_username(), timestamp)
+        ).lstrip()
+        assert self._list(exchange, cache, "ps1", flags=["--inbound"]) == expected
+        assert os.path.isfile(os.path.join(cache, "list_index.json"))
+
+        # nothing has changed, so the notebooks and feedback are not read again
+        def fail(*args, **kwargs):
+            raise AssertionError("exchange entry was read again")
+        monkeypatch.setattr(index, "notebook_hash", fail)
+        monkeypatch.setattr(index, "hash_file", fail)
+        assert self._list(exchange, cache, "ps1", flags=["--inbound"]) == expected
+
+    def test_list_index_shared(self, exchange, cache, course_dir):
+        self._release_full("ps1", exchange, cache, course_dir)
+        self._fetch("ps1", exchange, cache)
+        self._list(exchange, cache, "ps1")
+
+        # the index is only read again once another process has changed it
+        path = os.path.join(cache, "list_index.json")
+        shared = index.ExchangeIndex.load(path, None)
+        assert index.ExchangeIndex.load(path, None) is shared
+        self._list(exchange, cache, "ps1")
+        assert index.ExchangeIndex.load(path, None) is shared
+
+        with open(path, "w") as fh:
+            fh.write("{}")
+        assert index.ExchangeIndex.load(path, None) is not shared
@@ -248,4 +248,36 @@ class TestNbGraderSubmit(BaseTestApp):
         self._make_file(join("ps1", "large_file"), contents="x" * 2001)
         with pytest.raises(RuntimeError):
             self._submit("ps1", exchange, cache,
-                        flags=['--CourseDirectory.max_dir_size=3'])
\ No newline at end of file
+                        flags=['--CourseDirectory.max_dir_size=3'])
+    def test_submit_blob_store(self, exchange, cache, course_dir):
+        self._copy_file(join("files", "test.ipynb"), join(course_dir, "release", "ps1", "p1.ipynb"))
+        run_nbgrader([
+            "release_assignment", "ps1",
+            "--course", "abc101",
+            "--Exchange.cache={}".format(cache),
+            "--Exchange.root={}".format(exchange),
+            "--Exchange.blob_store=True"
+        ])
+        self._fetch("ps1", exchange, cache)
+        self._make_file(join("ps1", "data.csv"), contents="x,y\n1,2\n")
+        self._submit("ps1", exchange, cache, flags=["--Exchange.blob_store=True"])
+
+        filename, = os.listdir(join(exchange, "abc101", "inbound"))
+        inbound = join(exchange, "abc101", "inbound", filename)
+        cached, = os.listdir(join(cache, "abc101"))
+        cached = join(cache, "abc101", cached)
+
+        # the unchanged notebook is stored once, and shared with the release
+        released = os.stat(join(exchange, "abc101", "outbound", "ps1", "p1.ipynb"))
+        assert os.stat(join(inbound, "p1.ipynb")).st_ino == released.st_ino
+        assert os.stat(join(cached, "p1.ipynb")).st_ino == released.st_ino
+
+        # new files are stored once too
+        data = os.stat(join(inbound, "data.csv"))
+        assert os.stat(join(cached, "data.csv")).st_ino == data.st_ino
+        assert data.st_nlink == 3
+        with open(join(cached, "data.csv"), "r") as fh:
+            assert fh.read() == "x,y\n1,2\n"
+
+        # but the files written for each submission are not shared
+        assert os.stat(join(inbound, "timestamp.txt")).st_nlink == 1
@@ -2,6 +2,12 @@ import pytest
 import tempfile
 import os
 import shutil
+import sys
+
+
+notwindows = pytest.mark.skipif(
+    sys.platform == 'win32',
+    reason='This functionality of nbgrader is unsupported on Windows')
 
 
 @pytest.fixture
@@ -0,0 +1,98 @@
+import os
+import pytest
+
+from nbformat.v4 import new_notebook, new_code_cell
+from traitlets.config import Config
+
+from ...preprocessors import Execute
+from ...preprocessors.execute import shutdown_kernel_pools, _kernel_pools
+from .base import BaseTestPreprocessor
+from .conftest import notwindows
+
+
+class TestExecute(BaseTestPreprocessor):
+
+    def test_kernel_pool_imports(self):
+        nb = new_notebook(cells=[
+            new_code_cell("import sys\nprint('colorsys' in sys.modules)"),
+            new_code_cell("colorsys"),
+        ])
+        nb.metadata.kernelspec = {"name": "python3", "display_name": "Python 3", "language": "python"}
+
+        pp = Execute(kernel_pool_size=1, kernel_pool_imports=["colorsys"])
+        try:
+            nb, resources = pp.preprocess(nb, {})
+            assert len(_kernel_pools) == 1
+        finally:
+            shutdown_kernel_pools()
+        assert len(_kernel_pools) == 0
+
+        # the module was imported ahead of time...
+        output, = nb.cells[0].outputs
+        assert output.text == "True\n"
+
+        # ...but is not available without an import statement
+        output, = nb.cells[1].outputs
+        assert output.output_type == "error"
+        assert output.ename == "NameError"
+
+    def test_limit_output(self):
+        nb = new_notebook(cells=[
+            new_code_cell("for i in range(100000):\n    print(i)"),
+            new_code_cell("import sys\nfor i in range(100):\n    print(i)\n    print(i, file=sys.stderr)"),
+            new_code_cell("print('ok')"),
+        ])
+        nb.metadata.kernelspec = {"name": "python3", "display_name": "Python 3", "language": "python"}
+
+        config = Config()
+        config.LimitOutput.max_lines = 10
+        pp = Execute(limit_output=True, config=config)
+        nb, resources = pp.preprocess(nb, {})
+
+        output, = nb.cells[0].outputs
+        assert output.text.count("\n") == 9
+        assert output.text.endswith("... Output truncated ...")
+
+        # the errors are still there
+        assert "stderr" in [x.name for x in nb.cells[1].outputs]
+
+        # each cell has its own limit
+        output, = nb.cells[2].outputs
+        assert output.text == "ok\n"
+
+
+    @notwindows
+    def test_resource_limits(self):
+        nb = new_notebook(cells=[
+            new_code_cell("import resource\nprint(resource.getrlimit(resource.RLIMIT_NOFILE))"),
+            new_code_cell("x = bytearray(4 * 1024 ** 3)"),
+            new_code_cell("while True:\n    pass"),
+            new_code_cell("print('unreachable')"),
+        ])
+        nb.metadata.kernelspec = {"name": "python3", "display_name": "Python 3", "language": "python"}
+
+        pp = Execute(max_memory=2 * 1024 ** 3, max_cpu_time=5, max_open_files=100, timeout=60)
+        nb, resources = pp.preprocess(nb, {})
+
+        output, = nb.cells[0].outputs
+        assert output.text == "(100, 100)\n"
+
+        # code that needs too much memory gets an error...
+        output, = nb.cells[1].outputs
+        assert output.ename == "MemoryError"
+
+        # ...and code that takes too long kills the kernel, which fails the
+        # cells that are left
+        assert nb.cells[2].outputs[-1].ename == "DeadKernelError"
+        output, = nb.cells[3].outputs
+        assert output.ename == "DeadKernelError"
+
+    @pytest.mark.skipif(not os.path.exists("/proc/self/status"), reason="needs /proc")
+    def test_kernel_usage(self):
+        nb = new_notebook(cells=[new_code_cell("x = bytearray(100 * 1024 ** 2)")])
+        nb.metadata.kernelspec = {"name": "python3", "display_name": "Python 3", "language": "python"}
+
+        nb, resources = Execute().preprocess(nb, {})
+        usage = resources['nbgrader']['kernel_usage']
+        assert usage['max_memory'] > 100 * 1024 ** 2
+        assert usage['cpu_time'] > 0
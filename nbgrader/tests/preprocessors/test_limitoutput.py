@@ -2,6 +2,7 @@ import pytest
 import os
 
 from textwrap import dedent
+from nbformat.v4 import new_notebook, new_output
 from ...preprocessors import LimitOutput
 from .base import BaseTestPreprocessor
 from .. import create_code_cell, create_text_cell
@@ -36,3 +37,53 @@ class TestLimitOutput(BaseTestPreprocessor):
         cell, = nb.cells
         output, = cell.outputs
         assert len(output.traceback) == 100
+
+    def test_stream_bytes(self):
+        cell = create_code_cell()
+        cell.outputs = [
+            new_output("stream", name="stdout", text="x" * 1000),
+            new_output("stream", name="stdout", text="y" * 1000),
+            new_output("stream", name="stderr", text="z" * 1000),
+            new_output("error", ename="Error", evalue="", traceback=["e" * 1000]),
+        ]
+        nb = new_notebook(cells=[cell])
+
+        pp = LimitOutput(max_bytes=500)
+        nb, resources = pp.preprocess(nb, {})
+
+        # the first output is cut short and the others are dropped, except
+        # for the stderr output and the error that mean the cell failed
+        cell, = nb.cells
+        assert [x.output_type for x in cell.outputs] == ["stream", "stream", "error"]
+        assert cell.outputs[0].text.endswith("\n... Output truncated ...")
+        assert len(cell.outputs[0].text) <= 500
+        assert cell.outputs[1].name == "stderr"
+        assert cell.outputs[1].text == "... Output truncated ..."
+        assert cell.outputs[2].traceback == ["e" * 1000]
+
+    def test_rich_bytes(self):
+        cells = []
+        for i in range(3):
+            cell = create_code_cell()
+            cell.outputs = [
+                new_output("display_data", data={"image/png": "a" * 1000, "text/plain": "<Figure>"}),
+                new_output("execute_result", execution_count=1, data={"text/html": "b" * 1000, "text/plain": "1.5"}),
+            ]
+            cells.append(cell)
+        nb = new_notebook(cells=cells)
+
+        pp = LimitOutput(max_bytes=1500, max_notebook_bytes=2600)
+        nb, resources = pp.preprocess(nb, {})
+
+        # the rich outputs over the limit of the cell fall back on text
+        outputs = nb.cells[0].outputs
+        assert outputs[0].data == {"image/png": "a" * 1000, "text/plain": "<Figure>"}
+        assert outputs[1].data == {"text/plain": "1.5"}
+
+        # and so do the ones over the limit of the notebook
+        outputs = nb.cells[1].outputs
+        assert outputs[0].data == {"image/png": "a" * 1000, "text/plain": "<Figure>"}
+        assert outputs[1].data == {"text/plain": "1.5"}
+        outputs = nb.cells[2].outputs
+        assert outputs[0].data == {"text/plain": "<Figure>"}
+        assert outputs[1].data == {"text/plain": "1.5"}
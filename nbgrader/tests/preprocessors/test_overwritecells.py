@@ -1,6 +1,8 @@
 import pytest
 
 from nbformat.v4 import new_notebook, new_markdown_cell
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
 
 from ...preprocessors import SaveCells, OverwriteCells
 from ...api import Gradebook
@@ -265,3 +267,32 @@ class TestOverwriteCells(BaseTestPreprocessor):
         nb, resources = preprocessors[1].preprocess(nb, resources)
         result = [cell["metadata"]["nbgrader"]["grade_id"] if "nbgrader" in cell["metadata"] else "markdown" for cell in nb.cells]
         assert expected == result
+
+    def test_number_of_queries(self, preprocessors, resources):
+        """Does overwriting cells take the same number of queries for any number of cells?"""
+        def count_queries(n_cells):
+            notebook = "test{}".format(n_cells)
+            resources["nbgrader"]["notebook"] = notebook
+            nb = new_notebook()
+            for i in range(n_cells):
+                nb.cells.append(create_grade_and_solution_cell("hello", "markdown", "answer{}".format(i), 1))
+                nb.cells.append(create_grade_cell("hello", "code", "test{}".format(i), 1))
+                nb.cells.append(create_task_cell("hello", "markdown", "task{}".format(i), 1))
+                nb.cells.append(create_locked_cell("hello", "markdown", "locked{}".format(i)))
+            for cell in nb.cells:
+                cell.metadata.nbgrader["checksum"] = compute_checksum(cell)
+            nb, _ = preprocessors[0].preprocess(nb, resources)
+
+            statements = []
+
+            def record(conn, cursor, statement, *args):
+                statements.append(statement)
+
+            event.listen(Engine, "before_cursor_execute", record)
+            try:
+                preprocessors[1].preprocess(nb, resources)
+            finally:
+                event.remove(Engine, "before_cursor_execute", record)
+            return len(statements)
+
+        assert count_queries(1) == count_queries(20) == 3
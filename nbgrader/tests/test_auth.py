@@ -1,9 +1,14 @@
 import os
+import json
 import pytest
+import threading
 import requests_mock
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from traitlets.config import Config
 
 from ..auth import Authenticator, JupyterHubAuthPlugin
+from ..auth import base
+from ..auth.base import NoAuthPlugin
 from ..auth.jupyterhub import JupyterhubEnvironmentError, JupyterhubApiError
 from _pytest.fixtures import SubRequest
 
@@ -19,14 +24,104 @@ def env(request: SubRequest) -> dict:
     return os.environ
 
 
+@pytest.fixture(autouse=True)
+def clear_course_cache():
+    base._courses.clear()
+    yield
+    base._courses.clear()
+
+
 @pytest.fixture
 def jupyterhub_auth() -> Authenticator:
     config = Config()
     config.Authenticator.plugin_class = JupyterHubAuthPlugin
+    # the tests change the responses of the Hub between calls
+    config.JupyterHubAuthPlugin.cache_ttl = 0
+    config.Authenticator.cache_ttl = 0
     auth = Authenticator(config=config)
     return auth
 
 
+class StubHub(object):
+    """A minimal Hub API with groups, which records the requests it gets and
+    the connections they are made on."""
+
+    def __init__(self):
+        self.groups = {}
+        self.requests = []
+        self.connections = 0
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def setup(self):
+                super().setup()
+                stub.connections += 1
+
+            def log_message(self, *args):
+                pass
+
+            def _reply(self, status, body=None):
+                data = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _handle(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                body = json.loads(self.rfile.read(length) or "null")
+                path = self.path[len("/hub/api"):]
+                stub.requests.append((self.command, path))
+                parts = path.strip("/").split("/")
+
+                if self.headers["Authorization"] != "token abcd1234":
+                    self._reply(403)
+                elif self.command == "GET" and parts == ["groups"]:
+                    self._reply(200, [
+                        {"name": k, "users": sorted(v)} for k, v in stub.groups.items()])
+                elif self.command == "GET" and parts[0] == "users":
+                    groups = [k for k, v in stub.groups.items() if parts[1] in v]
+                    self._reply(200, {"name": parts[1], "groups": groups})
+                elif self.command == "POST" and len(parts) == 2:
+                    if parts[1] in stub.groups:
+                        self._reply(409)
+                    else:
+                        stub.groups[parts[1]] = set()
+                        self._reply(201, {"name": parts[1]})
+                elif self.command == "POST" and parts[2:] == ["users"]:
+                    stub.groups[parts[1]].update(body["users"])
+                    self._reply(200, {"name": parts[1]})
+                elif self.command == "DELETE" and parts[2:] == ["users"]:
+                    stub.groups[parts[1]].difference_update(body["users"])
+                    self._reply(200, {"name": parts[1]})
+                else:
+                    self._reply(404)
+
+            do_GET = do_POST = do_DELETE = _handle
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = "http://127.0.0.1:{}/hub/api".format(self.server.server_port)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def stub_hub(env):
+    hub = StubHub()
+    env['JUPYTERHUB_API_URL'] = hub.url
+    env['JUPYTERHUB_API_TOKEN'] = 'abcd1234'
+    env['JUPYTERHUB_USER'] = 'foo'
+    yield hub
+    hub.stop()
+
+
 def _mock_api_call(method, path, status_code=None, json=None):
     hub_api_url = 'http://127.0.0.1:8081/hub/api'
     url = hub_api_url + path
@@ -192,3 +287,100 @@ def test_jupyterhub_remove_student_from_course_success(env, jupyterhub_auth, cap
         _mock_api_call(m.delete, '/groups/nbgrader-course123/users')
         jupyterhub_auth.remove_student_from_course('foo', 'course123')
         assert 'ERROR' not in [rec.levelname for rec in caplog.records]
+
+
+def test_jupyterhub_add_students_to_course(stub_hub):
+    config = Config()
+    config.Authenticator.plugin_class = JupyterHubAuthPlugin
+    auth = Authenticator(config=config)
+
+    auth.add_students_to_course(['foo', 'bar', 'baz'], 'course123')
+    assert stub_hub.groups == {'nbgrader-course123': {'foo', 'bar', 'baz'}}
+    assert stub_hub.requests == [
+        ('GET', '/groups'),
+        ('POST', '/groups/nbgrader-course123'),
+        ('POST', '/groups/nbgrader-course123/users'),
+    ]
+
+    # the groups are cached, so adding more students is one request
+    del stub_hub.requests[:]
+    auth.add_student_to_course('qux', 'course123')
+    auth.add_students_to_course(['quux'], 'course456')
+    assert stub_hub.requests == [
+        ('POST', '/groups/nbgrader-course123/users'),
+        ('POST', '/groups/nbgrader-course456'),
+        ('POST', '/groups/nbgrader-course456/users'),
+    ]
+
+    # and all of the requests are made on the same connection
+    assert stub_hub.connections == 1
+
+
+def test_jupyterhub_student_courses_cached(stub_hub):
+    config = Config()
+    config.Authenticator.plugin_class = JupyterHubAuthPlugin
+    auth = Authenticator(config=config)
+    stub_hub.groups = {'nbgrader-course123': {'foo'}}
+
+    assert auth.get_student_courses('foo') == ['course123']
+    assert auth.has_access('foo', 'course123')
+    assert stub_hub.requests == [('GET', '/users/foo')]
+
+    # the cached courses follow the students added and removed
+    auth.add_student_to_course('foo', 'course456')
+    assert sorted(auth.get_student_courses('foo')) == ['course123', 'course456']
+    auth.remove_student_from_course('foo', 'course123')
+    assert auth.get_student_courses('foo') == ['course456']
+    assert [x for x in stub_hub.requests if x[1].startswith('/users')] == [('GET', '/users/foo')]
+
+    # but are queried again once they expire
+    auth.cache_ttl = 0
+    auth.plugin.cache_ttl = 0
+    stub_hub.groups['nbgrader-course789'] = {'foo'}
+    assert sorted(auth.get_student_courses('foo')) == ['course456', 'course789']
+
+
+class CountingAuthPlugin(NoAuthPlugin):
+
+    calls = []
+
+    def get_student_courses(self, student_id):
+        self.calls.append(student_id)
+        return ['course123']
+
+
+def test_authenticator_cache():
+    config = Config()
+    config.Authenticator.plugin_class = CountingAuthPlugin
+    config.Authenticator.cache_size = 2
+    CountingAuthPlugin.calls = []
+
+    # the courses are shared by the authenticators of the process
+    assert Authenticator(config=config).get_student_courses('foo') == ['course123']
+    auth = Authenticator(config=config)
+    assert auth.get_student_courses('foo') == ['course123']
+    assert auth.has_access('foo', 'course123')
+    assert not auth.has_access('foo', 'course456')
+    assert CountingAuthPlugin.calls == ['foo']
+
+    # the least recently used students are dropped
+    auth.get_student_courses('bar')
+    auth.get_student_courses('foo')
+    auth.get_student_courses('baz')
+    auth.get_student_courses('foo')
+    auth.get_student_courses('bar')
+    assert CountingAuthPlugin.calls == ['foo', 'bar', 'baz', 'bar']
+
+    # changing the courses of a student forgets them
+    auth.add_student_to_course('foo', 'course456')
+    auth.get_student_courses('foo')
+    auth.remove_student_from_course('foo', 'course456')
+    auth.get_student_courses('foo')
+    auth.add_students_to_course(['foo'], 'course456')
+    auth.get_student_courses('foo')
+    assert CountingAuthPlugin.calls == ['foo', 'bar', 'baz', 'bar', 'foo', 'foo', 'foo']
+
+    # and they expire
+    auth.cache_ttl = 0
+    auth.get_student_courses('bar')
+    assert CountingAuthPlugin.calls[-1] == 'bar'
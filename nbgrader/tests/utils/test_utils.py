@@ -2,6 +2,7 @@
 
 import os
 import pytest
+import hashlib
 import tempfile
 import shutil
 import zipfile
@@ -439,6 +440,51 @@ def test_unzip_tree(temp_cwd):
     assert os.path.isdir(os.path.join("data", "baz", "bar"))
     assert os.path.isfile(os.path.join("data", "baz", "bar", "foo.txt"))
 
+@notwindows
+@pytest.mark.parametrize("strategy", ["copy", "reflink", "hardlink", "symlink"])
+def test_stage_file(temp_cwd, strategy):
+    with open("foo.txt", "w") as fh:
+        fh.write("foo")
+    os.chmod("foo.txt", 0o640)
+
+    used = utils.stage_file("foo.txt", "bar.txt", strategy)
+    with open("bar.txt", "r") as fh:
+        assert fh.read() == "foo"
+    assert os.stat("bar.txt").st_mode & 0o777 == 0o640
+
+    if strategy == "reflink":
+        # reflinks are only supported by some filesystems
+        assert used in ("reflink", "copy")
+    else:
+        assert used == strategy
+    assert os.path.samefile("foo.txt", "bar.txt") == (used in ("hardlink", "symlink"))
+    assert os.path.islink("bar.txt") == (used == "symlink")
+
+
+def test_stage_file_fallback(temp_cwd):
+    with open("foo.txt", "w") as fh:
+        fh.write("foo")
+    with open("bar.txt", "w") as fh:
+        fh.write("bar")
+
+    # the link cannot be made because the destination exists, so the file
+    # is copied over it instead
+    assert utils.stage_file("foo.txt", "bar.txt", "hardlink") == "copy"
+    with open("bar.txt", "r") as fh:
+        assert fh.read() == "foo"
+    assert not os.path.samefile("foo.txt", "bar.txt")
+
+
+def test_hash_file(temp_cwd):
+    data = os.urandom(10000)
+    with open("foo.bin", "wb") as fh:
+        fh.write(data)
+
+    assert utils.hash_file("foo.bin").hexdigest() == hashlib.md5(data).hexdigest()
+    m = utils.hash_file("foo.bin", hashlib.sha256(), chunk_size=1000)
+    assert m.hexdigest() == hashlib.sha256(data).hexdigest()
+
+
 @notwindows
 def test_get_username():
     assert utils.get_username() == os.environ["USER"]
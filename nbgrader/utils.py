@@ -1,5 +1,6 @@
 import os
 import io
+import errno
 import hashlib
 import dateutil.parser
 import glob
@@ -319,26 +320,50 @@ def ignore_patterns(exclude=None, include=None, max_file_size=None, log=None):
     def ignore_patterns(directory, filelist):
         ignored = []
         for filename in filelist:
-            rationale = None
             fullname = os.path.join(directory, filename)
-            if exclude and any(fnmatch.fnmatch(filename, glob) for glob in exclude):
-                if log:
-                    log.debug("Ignoring excluded file '{}' (see config option CourseDirectory.ignore)".format(fullname))
+            if is_ignored_entry(fullname, lambda: os.path.isfile(fullname),
+                                lambda: os.path.getsize(fullname), exclude=exclude,
+                                include=include, max_file_size=max_file_size, log=log):
                 ignored.append(filename)
-            else:
-                if os.path.isfile(fullname):
-                    if include and not any(fnmatch.fnmatch(filename, glob) for glob in include):
-                        if log:
-                            log.debug("Ignoring non included file '{}' (see config option CourseDirectory.include)".format(fullname))
-                        ignored.append(filename)
-                    elif max_file_size and os.path.getsize(fullname) > 1000*max_file_size:
-                        if log:
-                            log.warning("Ignoring file too large '{}' (see config option CourseDirectory.max_file_size)".format(fullname))
-                        ignored.append(filename)
         return ignored
     return ignore_patterns
 
 
+def is_ignored_entry(fullname, is_file, get_size, exclude=None, include=None,
+                     max_file_size=None, log=None):
+    """
+    Whether the file or directory ``fullname`` is ignored by the rules of
+    :func:`~nbgrader.utils.ignore_patterns`.
+
+    Arguments
+    ---------
+    fullname: str
+        The path of the file or directory
+    is_file: callable
+        Returns whether ``fullname`` is a file; only called if needed
+    get_size: callable
+        Returns the size of the file, in bytes; only called if needed
+    exclude, include, max_file_size, log:
+        As for :func:`~nbgrader.utils.ignore_patterns`
+
+    """
+    filename = os.path.basename(fullname)
+    if exclude and any(fnmatch.fnmatch(filename, glob) for glob in exclude):
+        if log:
+            log.debug("Ignoring excluded file '{}' (see config option CourseDirectory.ignore)".format(fullname))
+        return True
+    if is_file():
+        if include and not any(fnmatch.fnmatch(filename, glob) for glob in include):
+            if log:
+                log.debug("Ignoring non included file '{}' (see config option CourseDirectory.include)".format(fullname))
+            return True
+        elif max_file_size and get_size() > 1000*max_file_size:
+            if log:
+                log.warning("Ignoring file too large '{}' (see config option CourseDirectory.max_file_size)".format(fullname))
+            return True
+    return False
+
+
 def find_all_files(path: str, exclude: List[str] = None) -> List[str]:
     """Recursively finds all filenames rooted at `path`, optionally excluding
     some based on filename globs."""
@@ -416,6 +441,58 @@ def rmtree(path: str) -> None:
     shutil.rmtree(path)
 
 
+def reflink(src: str, dest: str) -> None:
+    """Make dest a copy-on-write clone of the file src, which shares its data
+    blocks with src until either of them is modified. This is only supported
+    on Linux, by filesystems such as btrfs and XFS; an :class:`OSError` is
+    raised if the clone cannot be made."""
+    if not sys.platform.startswith("linux"):
+        raise OSError(errno.EOPNOTSUPP, "reflinks are not supported on {}".format(sys.platform))
+
+    import fcntl
+    FICLONE = 0x40049409
+    with open(src, "rb") as fsrc:
+        with open(dest, "wb") as fdest:
+            try:
+                fcntl.ioctl(fdest.fileno(), FICLONE, fsrc.fileno())
+            except OSError:
+                fdest.close()
+                os.remove(dest)
+                raise
+
+
+def stage_file(src: str, dest: str, strategy: str = "copy", log: Logger = None) -> str:
+    """Make dest a copy of the file src, using one of the strategies:
+
+    * ``"copy"``: copy the contents and access mode of src
+    * ``"reflink"``: make a copy-on-write clone of src (see :func:`reflink`)
+    * ``"hardlink"``: make dest a hardlink to src
+    * ``"symlink"``: make dest a symlink to the absolute path of src
+
+    If the strategy is not supported by the filesystem, the file is copied
+    instead. Returns the strategy that was used.
+
+    """
+    if strategy != "copy":
+        try:
+            if strategy == "reflink":
+                reflink(src, dest)
+                shutil.copymode(src, dest)
+            elif strategy == "hardlink":
+                os.link(src, dest)
+            elif strategy == "symlink":
+                os.symlink(os.path.abspath(src), dest)
+            else:
+                raise ValueError("Unknown staging strategy: {}".format(strategy))
+            return strategy
+        except OSError as e:
+            if log:
+                log.debug("Could not %s %s -> %s, copying it instead: %s", strategy, src, dest, e)
+
+    shutil.copy(src, dest)
+    return "copy"
+
+
 def remove(path: str) -> None:
     # for windows, we need to make sure that the file is writeable,
     # otherwise remove will fail
@@ -563,6 +640,18 @@ def capture_log(app, fmt="[%(levelname)s] %(message)s"):
     return result
 
 
+def hash_file(path, m=None, chunk_size=1024 * 1024):
+    """Update the hash object ``m`` (a new MD5 hash by default) with the
+    contents of the file at ``path``, which is read in chunks of
+    ``chunk_size`` bytes rather than all at once, and return it."""
+    if m is None:
+        m = hashlib.md5()
+    with open(path, 'rb') as fh:
+        for chunk in iter(lambda: fh.read(chunk_size), b''):
+            m.update(chunk)
+    return m
+
+
 def notebook_hash(path=None, unique_key=None, secret=None, notebook_id=None):
     # Ensure right options for only one hash method is given,
     # path (or path and unique key) for legacy hashing
@@ -577,7 +666,7 @@ def notebook_hash(path=None, unique_key=None, secret=None, notebook_id=None):
         m.update(to_bytes(notebook_id))
         return m.hexdigest()
     # legacy
-    m.update(open(path, 'rb').read())
+    hash_file(path, m)
     if unique_key:
         m.update(to_bytes(unique_key))
     return m.hexdigest()